@@ -5,15 +5,20 @@ from django.contrib.admin.models import LogEntry, DELETION
 from django.utils.html import escape
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import User
+from utils.pagination import EstimatedCountPaginator
+from .models import User, UserImport
 
 
 class LogEntryAdmin(admin.ModelAdmin):
     date_hierarchy = 'action_time'
 
-    list_filter = ['user', 'content_type', 'action_flag']
+    # Filtering by user rendered every staff user into the sidebar; search by object instead.
+    list_filter = ['content_type', 'action_flag']
     search_fields = ['object_repr', 'change_message']
     list_display = ['action_time', 'user', 'content_type', 'object_link', 'action_flag']
+    list_select_related = ['user', 'content_type']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def has_add_permission(self, request):
         return False
@@ -95,8 +100,17 @@ class CustomUserAdmin(UserAdmin):
     )
     search_fields = ("email",)
     ordering = ("-date_created",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
+class UserImportAdmin(admin.ModelAdmin):
+    list_display = ("id", "source", "created_by", "last_row", "users_created", "rows_failed", "completed", "date_updated")
+    list_filter = ("completed",)
+    list_select_related = ("created_by",)
+    readonly_fields = ("source", "created_by", "last_row", "users_created", "rows_failed", "errors", "completed")
+
 
 admin.site.register(User, CustomUserAdmin)
+admin.site.register(UserImport, UserImportAdmin)
 admin.site.register(LogEntry, LogEntryAdmin)
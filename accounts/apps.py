@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class AccountsConfig(AppConfig):
@@ -7,3 +8,6 @@ class AccountsConfig(AppConfig):
 
     def ready(self):
         import accounts.signals
+        from .indexes import create_trigram_indexes
+
+        post_migrate.connect(create_trigram_indexes, sender=self)
@@ -0,0 +1,53 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from rest_framework import status
+from utils.async_views import AsyncAPIView
+from .serializers import NewOTPRequestSerializer
+from .utils import async_send_email, build_otp_email, issue_otp
+
+User = get_user_model()
+
+
+class AsyncResendOTPAPIView(AsyncAPIView):
+    """
+    Async variant of ResendOTPAPIView, meant to be served under ASGI (uvicorn). The user lookup uses\n
+    the async ORM, the OTP update (a transaction) runs through sync_to_async and the e-mail API call\n
+    is awaited, so the worker keeps serving other requests while the e-mail is on its way.
+    """
+
+    serializer_class = NewOTPRequestSerializer
+    authentication_required = False
+
+    async def post(self, request, *args, **kwargs):
+        validated_data, error_response = await self.get_validated_data(request)
+        if error_response:
+            return error_response
+        try:
+            user = await User.objects.aget(email=validated_data["email"])
+        except User.DoesNotExist:
+            return self.error_response("E-mail doesn't exist", status.HTTP_404_NOT_FOUND)
+        if user.is_active:
+            return self.error_response(
+                "You are not allowed to perform this operation, as your account has been verified",
+                status.HTTP_400_BAD_REQUEST,
+            )
+
+        otp = await sync_to_async(issue_otp)(user)
+
+        sent_email = await async_send_email(
+            **build_otp_email(user, otp, "otp_resend.html", "Verify your email address.")
+        )
+        if sent_email != "Success":
+            return self.error_response(
+                "An error occurred while sending the OTP email. Please try again later.",
+                status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        return JsonResponse(
+            {
+                "status": status.HTTP_200_OK,
+                "Success": True,
+                "message": "Enter the 4-digit OTP that has been sent to your email address. Please check your inbox or spam folder.",
+            },
+            status=status.HTTP_200_OK,
+        )
@@ -0,0 +1,215 @@
+"""
+Bulk onboarding of users from a CSV file with full_name and email columns, and optionally
+phone_number and account_type. Each batch of rows is validated, inserted with bulk_create and
+recorded on its UserImport in one database transaction; its welcome e-mails then go out in one
+call. bulk_create sends no model signals, so the OTPs the signals would set are allocated here.
+"""
+
+import csv
+import itertools
+import logging
+import os
+import random
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.template.loader import render_to_string
+from banking.models import Account
+from utils.background import run_in_background, stage_upload
+from utils.tools import generate_account_number
+from .models import User, UserImport
+from .serializers import UserImportRowSerializer
+from .utils import MESSAGE_VERSIONS_LIMIT, REGISTRATION_ATTEMPTS, send_bulk_email
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = {"full_name", "email"}
+
+# Every OTP GenerateOTP can produce: four digits from 1 to 9.
+ALL_OTPS = ["".join(digits) for digits in itertools.product("123456789", repeat=4)]
+
+
+def open_csv(path):
+    # utf-8-sig drops the byte order mark spreadsheet programs put at the start of the file.
+    return open(path, newline="", encoding="utf-8-sig")
+
+
+def read_rows(csv_file, after_row=0):
+    """(row number, row) pairs of the CSV file, numbered from 1 after the header, from after_row on."""
+    reader = csv.DictReader(csv_file)
+    missing = REQUIRED_COLUMNS - {name.strip() for name in reader.fieldnames or ()}
+    if missing:
+        raise ValueError(f"The CSV file has no {', '.join(sorted(missing))} column")
+    return itertools.islice(enumerate(reader, start=1), after_row, None)
+
+
+def validate_rows(rows):
+    """Splits rows into (row number, validated data) pairs and row errors."""
+    valid, errors = [], []
+    for number, row in rows:
+        # Extra cells come in under None and missing ones as None; blank cells count as missing.
+        data = {name.strip(): value.strip() for name, value in row.items() if name and value and value.strip()}
+        serializer = UserImportRowSerializer(data=data)
+        if serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+        else:
+            messages = {field: [str(error) for error in field_errors] for field, field_errors in serializer.errors.items()}
+            errors.append({"row": number, "email": data.get("email"), "errors": messages})
+    return valid, errors
+
+
+def free_otps(count):
+    """Up to `count` distinct OTPs no user holds, in one query."""
+    taken = set(User.objects.filter(otp__isnull=False).values_list("otp", flat=True))
+    free = [otp for otp in ALL_OTPS if otp not in taken]
+    return random.sample(free, min(count, len(free)))
+
+
+def free_account_numbers(count):
+    """`count` distinct account numbers no account has, checked a batch at a time."""
+    numbers = set()
+    while len(numbers) < count:
+        candidates = {int(generate_account_number()) for _ in range(count - len(numbers))} - numbers
+        numbers |= candidates - set(Account.objects.filter(account_number__in=candidates).values_list("account_number", flat=True))
+    return list(numbers)
+
+
+def build_users(valid):
+    """Unsaved users and accounts for the validated rows, and errors for the rows that can't have one."""
+    emails = {User.objects.normalize_email(data["email"]) for _, data in valid}
+    seen = set(User.objects.filter(email__in=emails).values_list("email", flat=True))
+    rows, errors = [], []
+    for number, data in valid:
+        email = User.objects.normalize_email(data["email"])
+        if email in seen:
+            errors.append({"row": number, "email": email, "errors": {"email": ["User with this email already exists"]}})
+        else:
+            seen.add(email)
+            rows.append((number, email, data))
+
+    otps = free_otps(len(rows))
+    if len(otps) < len(rows):
+        # With 6561 OTPs, only so many users can await verification at once.
+        for number, email, _ in rows[len(otps):]:
+            errors.append(
+                {"row": number, "email": email, "errors": {"otp": ["No verification OTP is free; import this row again later"]}}
+            )
+        rows = rows[: len(otps)]
+
+    users, accounts = [], []
+    for (number, email, data), otp, account_number in zip(rows, otps, free_account_numbers(len(rows))):
+        user = User(
+            email=email,
+            # Title-cased like names registered through the API.
+            full_name=" ".join(word.capitalize() for word in data["full_name"].split()),
+            phone_number=data.get("phone_number"),
+            otp=otp,
+            is_active=False,
+            password=make_password(None),
+        )
+        users.append(user)
+        accounts.append(
+            Account(user=user, account_number=account_number, account_type=data["account_type"], current_balance=0)
+        )
+    return users, accounts, errors
+
+
+def import_batch(user_import, rows):
+    """
+    Validates and inserts one batch of rows and advances the import past them, in one database
+    transaction. Emails and OTPs are unique, so a registration committing in between fails the
+    inserts; the batch is then checked again against the database and retried.
+    """
+    last_row = rows[-1][0]
+    valid, invalid = validate_rows(rows)
+    for _ in range(REGISTRATION_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                # Serializes processes resuming the same import.
+                user_import = UserImport.objects.select_for_update().get(pk=user_import.pk)
+                if user_import.last_row >= last_row:
+                    return user_import
+                users, accounts, errors = build_users(valid)
+                # The users get their snowflake ids here; bulk creating the accounts then points them at them.
+                User.objects.bulk_create(users)
+                Account.objects.bulk_create(accounts)
+
+                errors = sorted(invalid + errors, key=lambda error: error["row"])
+                room = max(settings.USER_IMPORT_MAX_ERRORS - len(user_import.errors), 0)
+                user_import.errors += errors[:room]
+                user_import.rows_failed += len(errors)
+                user_import.users_created += len(users)
+                user_import.last_row = last_row
+                user_import.save()
+                transaction.on_commit(lambda: send_welcome_emails(users))
+            return user_import
+        except IntegrityError:
+            continue
+    raise IntegrityError(f"Rows up to {last_row} still clashed with other users after {REGISTRATION_ATTEMPTS} attempts")
+
+
+def send_welcome_emails(users):
+    """The welcome OTP e-mails of an imported batch, MESSAGE_VERSIONS_LIMIT per API call."""
+    # Rendered once; the e-mail API fills in each recipient's name and OTP.
+    html_content = render_to_string("welcome_email.html", {"full_name": "{{ params.full_name }}", "otp": "{{ params.otp }}"})
+    for start in range(0, len(users), MESSAGE_VERSIONS_LIMIT):
+        chunk = users[start : start + MESSAGE_VERSIONS_LIMIT]
+        sent_email = send_bulk_email(
+            versions=[
+                {
+                    "to": [{"email": user.email, "name": user.full_name}],
+                    "params": {"full_name": user.full_name, "otp": user.otp},
+                }
+                for user in chunk
+            ],
+            subject="Welcome! Verify your email address.",
+            sender={"name": "Longman Technologies", "email": os.getenv("EMAIL_SENDER")},
+            reply_to={"email": os.getenv("REPLY_TO_EMAIL")},
+            html_content=html_content,
+        )
+        if sent_email != "Success":
+            # The users are kept; they can request a new OTP.
+            logger.warning("Could not send the welcome OTP emails of %s imported users", len(chunk))
+
+
+def run_import(user_import, batch_size=None):
+    """Imports the rows of the import's file after its last_row, batch by batch, and marks it completed."""
+    batch_size = batch_size or settings.USER_IMPORT_BATCH_SIZE
+    with open_csv(user_import.source) as csv_file:
+        rows = read_rows(csv_file, user_import.last_row)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            user_import = import_batch(user_import, batch)
+    user_import.completed = True
+    user_import.save(update_fields=["completed", "date_updated"])
+    return user_import
+
+
+def start_import(uploaded_file, created_by):
+    """
+    Stages an uploaded CSV file and imports it in the background pool. Raises ValueError if its
+    header lacks a required column. If the process stops midway, `manage.py import_users --resume`
+    continues the import from the staged file.
+    """
+    staged_path = stage_upload(uploaded_file)
+    try:
+        with open_csv(staged_path) as csv_file:
+            read_rows(csv_file)
+    except ValueError:
+        # Also a file that isn't UTF-8 text: UnicodeDecodeError is a ValueError.
+        os.remove(staged_path)
+        raise
+    user_import = UserImport.objects.create(source=staged_path, created_by=created_by)
+    transaction.on_commit(lambda: run_in_background(import_staged_file, user_import.pk))
+    return user_import
+
+
+def import_staged_file(user_import_id):
+    try:
+        user_import = run_import(UserImport.objects.get(pk=user_import_id))
+    except Exception:
+        logger.exception("User import %s stopped; resume it with manage.py import_users --resume", user_import_id)
+        return
+    os.remove(user_import.source)
@@ -0,0 +1,33 @@
+import logging
+from django.db import DatabaseError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Trigram indexes for the admin users search. icontains compiles to
+# UPPER("column"::text) LIKE UPPER(%s), so the indexed expression has to be exactly that.
+TRIGRAM_INDEXES = {
+    "users_email_trgm_idx": "email",
+    "users_full_name_trgm_idx": "full_name",
+    "users_phone_number_trgm_idx": "phone_number",
+}
+
+
+def create_trigram_indexes(using="default", **kwargs):
+    """
+    post_migrate handler creating the pg_trgm GIN indexes. They are PostgreSQL-only, so they
+    are not declared on the model; other databases fall back to a plain scan.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for name, column in TRIGRAM_INDEXES.items():
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {name} ON "Users" '
+                    f'USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+                )
+    except DatabaseError as e:
+        # Usually a role without permission to create the extension; search still works, just unindexed.
+        logger.warning("Could not create the users trigram indexes: %s", e)
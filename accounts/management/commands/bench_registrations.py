@@ -0,0 +1,79 @@
+import statistics
+import threading
+import time
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+import accounts.signals
+from utils.background import get_executor
+
+User = get_user_model()
+
+EMAIL_PREFIX = "bench-registration-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Register users through the user-registration endpoint and report registrations per second, "
+        "latency and queries per registration. E-mail delivery is replaced by a sleep of --email-latency "
+        "seconds, so nothing is sent. The registered users are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=500)
+        parser.add_argument("--email-latency", type=float, default=0.3, help="Seconds a simulated e-mail takes")
+
+    def handle(self, *args, **kwargs):
+        count = kwargs["count"]
+        delivered = []
+        lock = threading.Lock()
+
+        def send_email(**email):
+            time.sleep(kwargs["email_latency"])
+            with lock:
+                delivered.append(email["to"][0]["email"])
+            return "Success"
+
+        url = reverse("user-registration")
+        client = Client()
+        # Lets the test client's "testserver" host through ALLOWED_HOSTS.
+        setup_test_environment()
+        try:
+            with mock.patch.object(accounts.signals, "send_email", send_email):
+                with CaptureQueriesContext(connection) as queries:
+                    self.register(client, url, "warmup")
+                self.stdout.write(f"Queries per registration: {len(queries)}")
+
+                latencies = []
+                started = time.perf_counter()
+                for i in range(count):
+                    request_started = time.perf_counter()
+                    self.register(client, url, i)
+                    latencies.append(time.perf_counter() - request_started)
+                elapsed = time.perf_counter() - started
+
+                duplicate = self.register(client, url, 0, expected=400)
+                # Welcome e-mails go out from the background pool after the response; wait for them.
+                get_executor().shutdown(wait=True)
+            self.stdout.write(
+                f"{count} registrations in {elapsed:.1f}s ({count / elapsed:.0f}/s), "
+                f"latency mean {statistics.mean(latencies) * 1000:.1f}ms, "
+                f"p95 {statistics.quantiles(latencies, n=20)[-1] * 1000:.1f}ms"
+            )
+            self.stdout.write(f"Duplicate email: {duplicate.json()['message']}")
+            self.stdout.write(f"Welcome e-mails delivered: {len(delivered)} of {count + 1}")
+        finally:
+            teardown_test_environment()
+            User.objects.filter(email__startswith=EMAIL_PREFIX).delete()
+
+    def register(self, client, url, suffix, expected=201):
+        response = client.post(
+            url, {"full_name": "Bench Registration", "email": f"{EMAIL_PREFIX}{suffix}@example.com"}
+        )
+        if response.status_code != expected:
+            raise CommandError(f"Registration returned {response.status_code}: {response.content[:200]}")
+        return response
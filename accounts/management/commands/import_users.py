@@ -0,0 +1,50 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from accounts.bulk_import import open_csv, read_rows, run_import
+from accounts.models import UserImport
+from utils.tools import use_batch_worker_ids
+
+
+class Command(BaseCommand):
+    help = (
+        "Onboard users from a CSV file with full_name and email columns, and optionally phone_number and "
+        "account_type. Each user gets an account and a welcome OTP e-mail. Rows are committed in batches; "
+        "an interrupted import, including one uploaded through the API, continues with --resume <import id>."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?")
+        parser.add_argument("--resume", type=int, help="Id of the import to continue")
+        parser.add_argument("--batch-size", type=int)
+
+    def handle(self, *args, **kwargs):
+        use_batch_worker_ids()
+        if kwargs["resume"]:
+            try:
+                user_import = UserImport.objects.get(pk=kwargs["resume"])
+            except UserImport.DoesNotExist:
+                raise CommandError(f"There is no import {kwargs['resume']}")
+            if user_import.completed:
+                raise CommandError(f"Import {user_import.pk} is already complete")
+        elif kwargs["path"]:
+            try:
+                with open_csv(kwargs["path"]) as csv_file:
+                    read_rows(csv_file)
+            except (OSError, ValueError) as e:
+                raise CommandError(e)
+            user_import = UserImport.objects.create(source=kwargs["path"])
+        else:
+            raise CommandError("Give the path of a CSV file, or --resume with an import id")
+
+        started = time.perf_counter()
+        first_row = user_import.last_row
+        user_import = run_import(user_import, kwargs["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Import {user_import.pk}: rows {first_row + 1}-{user_import.last_row} processed, "
+                f"{user_import.users_created} users created, {user_import.rows_failed} rows failed, "
+                f"{time.perf_counter() - started:.1f}s"
+            )
+        )
+        for error in user_import.errors:
+            self.stdout.write(f"Row {error['row']} ({error['email']}): {error['errors']}")
@@ -17,6 +17,7 @@ class User(AbstractBaseUser, PermissionsMixin, BaseModel):
     otp = models.CharField(null=True, unique=True, max_length=4)
     pin = models.CharField(null=True, max_length=255)
     profile_picture = models.ImageField(null=True, upload_to=profile_image_path)
+    profile_picture_thumbnail = models.ImageField(null=True, editable=False, upload_to=profile_image_path)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     date_created = models.DateTimeField(auto_now_add=True)
@@ -30,6 +31,7 @@ class User(AbstractBaseUser, PermissionsMixin, BaseModel):
 
     class Meta:
         db_table = "Users"
+        indexes = [models.Index(fields=["date_created"], name="user_date_created_idx")]
         abstract = False
 
     def calculate_age(self):
@@ -46,4 +48,27 @@ class User(AbstractBaseUser, PermissionsMixin, BaseModel):
         if self.full_name and not self.is_superuser: 
             return f"{self.id} - {self.full_name}"
         else:
-            return f"{self.full_name} - Admin"
\ No newline at end of file
+            return f"{self.full_name} - Admin"
+
+class UserImport(BaseModel):
+    """
+    A bulk import of users from a CSV file and its progress: the last row processed is advanced
+    in the same database transaction as the users of that batch, so an interrupted import resumes
+    after it.
+    """
+    source = models.CharField(max_length=255)
+    created_by = models.ForeignKey(User, null=True, on_delete=models.SET_NULL, related_name="user_imports")
+    last_row = models.PositiveIntegerField(default=0)
+    users_created = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list)
+    completed = models.BooleanField(default=False)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "User Imports"
+        abstract = False
+
+    def __str__(self) -> str:
+        return f"{self.id} - {self.source}"
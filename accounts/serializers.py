@@ -1,7 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from banking.constants import ACCOUNT_TYPE
 from banking.models import Account
 from filetype import guess
+from utils.values import Many, ValuesSerializer
+from .models import UserImport
+from .utils import update_profile_picture
 import re
 
 User = get_user_model()
@@ -16,6 +20,14 @@ class UserRegistrationSerializer(serializers.Serializer):
             raise serializers.ValidationError("Only alphabetical characters and spaces are allowed for the full name.")
         return value
 
+class UserImportRowSerializer(UserRegistrationSerializer):
+    """One row of a bulk user import's CSV file."""
+    phone_number = serializers.CharField(max_length=20, required=False)
+    account_type = serializers.ChoiceField(choices=ACCOUNT_TYPE, default="SAVINGS")
+
+class UserImportUploadSerializer(serializers.Serializer):
+    file = serializers.FileField()
+
 class OTPVerificationSerializer(serializers.Serializer):
     otp = serializers.CharField()
 
@@ -76,7 +88,17 @@ class DeliberatePasswordChangeSerializer(serializers.Serializer):
         return data
 
 
-class UserProfileUpdateSerializer(serializers.ModelSerializer):
+class ProfilePictureUpdateMixin:
+    def update(self, instance, validated_data):
+        # The picture is normalized and stored off the request thread; see update_profile_picture.
+        profile_picture = validated_data.pop("profile_picture", None)
+        instance = super().update(instance, validated_data)
+        if profile_picture:
+            update_profile_picture(instance, profile_picture)
+        return instance
+
+
+class UserProfileUpdateSerializer(ProfilePictureUpdateMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = (
@@ -84,7 +106,9 @@ class UserProfileUpdateSerializer(serializers.ModelSerializer):
             "phone_number",
             "address",
             "profile_picture",
+            "profile_picture_thumbnail",
         )
+        read_only_fields = ("profile_picture_thumbnail",)
 
     def validate_phone_number(self, value): 
         if not value.startswith("+234") or(value.startswith("+234") and len(value) > 15):
@@ -113,7 +137,7 @@ class UserAccountSerializer(serializers.ModelSerializer):
         model = Account
         fields = ["account_number"]
 
-class UserDetailSerializer(serializers.ModelSerializer):
+class UserDetailSerializer(ProfilePictureUpdateMixin, serializers.ModelSerializer):
     accounts = UserAccountSerializer(many=True, read_only=True)
     class Meta:
         model = User
@@ -126,9 +150,33 @@ class UserDetailSerializer(serializers.ModelSerializer):
             "phone_number",
             "address",
             "profile_picture",
+            "profile_picture_thumbnail",
             "is_staff",
             "is_active",
             "date_created",
             "date_updated"
         ]
-        extra_kwargs = {"id": {"read_only": True}}
+        extra_kwargs = {"id": {"read_only": True}, "profile_picture_thumbnail": {"read_only": True}}
+
+class UserAccountValuesSerializer(ValuesSerializer):
+    serializer_class = UserAccountSerializer
+
+class UserDetailValuesSerializer(ValuesSerializer):
+    """values()-driven UserDetailSerializer for the admin user list's fast rendering mode."""
+    serializer_class = UserDetailSerializer
+    relations = {"accounts": Many(UserAccountValuesSerializer)}
+
+class UserImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserImport
+        fields = [
+            "id",
+            "source",
+            "last_row",
+            "users_created",
+            "rows_failed",
+            "errors",
+            "completed",
+            "date_created",
+            "date_updated",
+        ]
@@ -1,49 +1,43 @@
+import logging
 from .models import User
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.template.loader import render_to_string
 from rest_framework import status
-from .utils import send_email, GenerateOTP
+from .utils import send_email, GenerateOTP, build_otp_email
 from banking.models import Transaction
+from utils.background import run_in_background
 import os
 
-@receiver(post_save, sender=User)
-def send_welcome_email(sender, instance, created, **kwargs):
+logger = logging.getLogger(__name__)
+
+@receiver(pre_save, sender=User)
+def set_registration_otp(sender, instance, **kwargs):
     """
-    This function sends an OTP email to a newly created user.
-    If sending the email fails, it deletes the user and adds an error message to the response data.
+    Gives a newly registered user their verification OTP before the row is inserted, so that
+    registering is a single write. A clash with another user's OTP fails the insert on the unique
+    constraint, and register_user retries with a fresh one.
     """
-    if created and not (instance.is_staff or instance.is_superuser):
+    if instance._state.adding and instance.otp is None and not (instance.is_staff or instance.is_superuser):
+        instance.otp = GenerateOTP(length=4)
 
-        otp = GenerateOTP(length=4)
-        instance.otp = otp
-        instance.save()  
 
-        subject = "Welcome! Verify your email address."
-        context = {'full_name': instance.full_name, 'otp' : otp}
+@receiver(post_save, sender=User)
+def send_welcome_email(sender, instance, created, **kwargs):
+    """
+    This function sends an OTP email to a newly created user, from the background pool once the user
+    has been committed. If sending the email fails the user is kept, and can request a new OTP.
+    """
+    if created and instance.otp and not (instance.is_staff or instance.is_superuser):
+        transaction.on_commit(lambda: run_in_background(deliver_welcome_email, instance))
 
-        message = render_to_string('welcome_email.html', context)
 
-        sender_name = "Longman Technologies"
-        sender_email = os.getenv("EMAIL_SENDER")
-        reply_to_email = os.getenv("REPLY_TO_EMAIL")
-        to = [{"email": instance.email, "name": instance.full_name}]
+def deliver_welcome_email(user):
+    email = build_otp_email(user, user.otp, "welcome_email.html", "Welcome! Verify your email address.")
+    if send_email(**email) != "Success":
+        logger.warning("Could not send the welcome OTP email to user %s", user.pk)
 
-        sent_email = send_email(
-            to=to,
-            subject=subject,
-            sender={"name": sender_name, "email": sender_email},
-            reply_to={"email": reply_to_email},
-            html_content=message,
-        )
-        if not sent_email == "Success":
-            instance.delete()
-            response_data = {
-                "status": status.HTTP_500_INTERNAL_SERVER_ERROR,
-                "Success": False,
-                "message": "An error occurred while sending the OTP email. Please try registering again.",
-            }
-            return response_data
 
 @receiver(post_save, sender=Transaction)
 def send_welcome_bonus_alert(sender, instance, created, **kwargs):
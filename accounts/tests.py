@@ -0,0 +1,227 @@
+import csv
+import io
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from banking.models import Account
+from . import bulk_import
+from .bulk_import import import_batch, read_rows, run_import
+from .models import User, UserImport
+from .utils import register_user
+
+
+# The admin pages link static files, which have no manifest until collectstatic has run.
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class UserAdminQueryCountTests(TestCase):
+    """The user admin's list and change pages run a fixed number of queries, however many users they show."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser(email="admin@example.com", full_name="Admin")
+        for i in range(12):
+            cls.user = User.objects.create_user(email=f"customer{i}@example.com", full_name=f"Customer {i}")
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def test_changelist(self):
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse("admin:accounts_user_changelist"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_change_page(self):
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse("admin:accounts_user_change", args=[self.user.pk]))
+        self.assertEqual(response.status_code, 200)
+
+
+class RegistrationTests(TransactionTestCase):
+    def setUp(self):
+        # The welcome e-mail is sent from the background pool on commit.
+        patcher = mock.patch("accounts.signals.run_in_background")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_duplicate_email_returns_none(self):
+        first = register_user("customer@example.com", "Customer")
+
+        self.assertIsNone(register_user("customer@example.com", "Someone Else"))
+        self.assertEqual(User.objects.get().pk, first.pk)
+
+    def test_otp_clash_is_retried_with_a_free_otp(self):
+        User.objects.create_user(email="waiting@example.com", full_name="Waiting", otp="1111")
+
+        with mock.patch("accounts.signals.GenerateOTP", return_value="1111"), mock.patch(
+            "accounts.utils.free_otp", return_value="2222"
+        ) as free_otp:
+            user = register_user("customer@example.com", "Customer")
+
+        free_otp.assert_called_once()
+        self.assertEqual(user.otp, "2222")
+        self.assertFalse(user.is_active)
+
+    def test_concurrent_registrations_of_one_email(self):
+        barrier = Barrier(2)
+
+        def register(full_name):
+            try:
+                barrier.wait()
+                return register_user("customer@example.com", full_name)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(register, ["First", "Second"]))
+
+        self.assertEqual(sum(result is None for result in results), 1)
+        self.assertEqual(User.objects.filter(email="customer@example.com").count(), 1)
+
+
+class ResendOTPTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="customer@example.com", full_name="Customer", otp="1234", is_active=False)
+        User.objects.create_user(email="waiting@example.com", full_name="Waiting", otp="1111", is_active=False)
+
+    def test_taken_otp_is_retried(self):
+        # The first OTP was free when checked, but another user got it before the update.
+        with mock.patch("accounts.utils.free_otp", side_effect=["1111", "2222"]), mock.patch(
+            "accounts.views.send_email", return_value="Success"
+        ) as send_email:
+            response = APIClient().post("/api/v1/auth/otp-resend", {"email": "customer@example.com"})
+
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.otp, "2222")
+        self.assertIn("2222", send_email.call_args.kwargs["html_content"])
+
+    async def test_taken_otp_is_retried_async(self):
+        with mock.patch("accounts.utils.free_otp", side_effect=["1111", "2222"]), mock.patch(
+            "accounts.async_views.async_send_email", return_value="Success"
+        ):
+            response = await AsyncClient().post(
+                "/api/v1/auth/otp-resend/async", {"email": "customer@example.com"}, content_type="application/json"
+            )
+
+        self.assertEqual(response.status_code, 200)
+        await self.user.arefresh_from_db()
+        self.assertEqual(self.user.otp, "2222")
+
+
+class UserImportTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(UPLOAD_STAGING_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write_csv(self, rows):
+        path = os.path.join(self.directory, "users.csv")
+        with open(path, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["full_name", "email", "account_type"])
+            writer.writerows(rows)
+        return path
+
+    def customers(self, count):
+        return [[f"Customer {chr(65 + i)}", f"customer{i}@example.com", "SAVINGS"] for i in range(count)]
+
+    def test_interrupted_import_resumes_after_its_last_batch(self):
+        user_import = UserImport.objects.create(source=self.write_csv(self.customers(7)))
+        batches = []
+
+        def stop_at_third_batch(user_import, rows):
+            batches.append([number for number, _ in rows])
+            if len(batches) == 3:
+                raise RuntimeError("The worker was stopped")
+            return import_batch(user_import, rows)
+
+        with mock.patch.object(bulk_import, "import_batch", side_effect=stop_at_third_batch):
+            with self.assertRaisesMessage(RuntimeError, "The worker was stopped"):
+                run_import(user_import, batch_size=3)
+
+        user_import.refresh_from_db()
+        self.assertEqual(batches, [[1, 2, 3], [4, 5, 6], [7]])
+        self.assertEqual((user_import.last_row, user_import.users_created, user_import.completed), (6, 6, False))
+
+        call_command("import_users", resume=user_import.pk, batch_size=3, stdout=io.StringIO())
+
+        user_import.refresh_from_db()
+        self.assertEqual((user_import.last_row, user_import.users_created, user_import.completed), (7, 7, True))
+        self.assertEqual(User.objects.count(), 7)
+        self.assertEqual(Account.objects.count(), 7)
+
+    def test_committed_batch_is_not_imported_twice(self):
+        user_import = UserImport.objects.create(source=self.write_csv(self.customers(3)))
+        with open(user_import.source, newline="") as csv_file:
+            rows = list(read_rows(csv_file))
+        import_batch(user_import, rows)
+
+        # A second process resuming from a stale checkpoint finds the batch done.
+        import_batch(UserImport(pk=user_import.pk, source=user_import.source), rows)
+
+        user_import.refresh_from_db()
+        self.assertEqual((user_import.last_row, user_import.users_created), (3, 3))
+        self.assertEqual(User.objects.count(), 3)
+
+    def test_failed_rows_are_recorded_and_the_rest_imported(self):
+        User.objects.create_user(email="registered@example.com", full_name="Registered")
+        path = self.write_csv([
+            ["Customer A", "customer0@example.com", "SAVINGS"],
+            ["Customer B", "not an email", "SAVINGS"],
+            ["", "customer2@example.com", "SAVINGS"],
+            ["Customer D", "customer3@example.com", "PIGGY BANK"],
+            ["Customer E", "registered@example.com", "SAVINGS"],
+            ["Customer F", "customer5@example.com", "CURRENT"],
+        ])
+
+        user_import = run_import(UserImport.objects.create(source=path), batch_size=4)
+
+        self.assertEqual((user_import.users_created, user_import.rows_failed, user_import.last_row), (2, 4, 6))
+        self.assertEqual([(error["row"], sorted(error["errors"])) for error in user_import.errors], [
+            (2, ["email"]), (3, ["full_name"]), (4, ["account_type"]), (5, ["email"]),
+        ])
+        self.assertEqual(Account.objects.get(user__email="customer5@example.com").account_type, "CURRENT")
+
+    def test_duplicate_emails_within_a_batch(self):
+        path = self.write_csv([
+            ["Customer A", "customer@example.com", "SAVINGS"],
+            ["Customer B", "other@example.com", "SAVINGS"],
+            ["Customer A Again", "customer@EXAMPLE.com", "CURRENT"],
+        ])
+
+        user_import = run_import(UserImport.objects.create(source=path))
+
+        self.assertEqual((user_import.users_created, user_import.rows_failed), (2, 1))
+        self.assertEqual(user_import.errors, [
+            {"row": 3, "email": "customer@example.com", "errors": {"email": ["User with this email already exists"]}},
+        ])
+        self.assertEqual(User.objects.get(email="customer@example.com").full_name, "Customer A")
+
+    def test_import_through_the_api(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser(email="admin@example.com", full_name="Admin"))
+        upload = SimpleUploadedFile("users.csv", b"full_name,email\nCustomer A,customer@example.com\nCustomer B,bad\n")
+
+        # The import runs in the request's thread, once its on_commit callbacks run.
+        with mock.patch.object(bulk_import, "run_in_background", side_effect=lambda fn, *args: fn(*args)), mock.patch.object(
+            bulk_import, "send_bulk_email", return_value="Success"
+        ), self.captureOnCommitCallbacks(execute=True):
+            response = client.post("/api/v1/admin/users/imports", {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, 202)
+
+        response = client.get(f"/api/v1/admin/users/imports/{response.data['data']['id']}")
+        data = response.data["data"]
+        self.assertEqual((data["users_created"], data["rows_failed"], data["completed"]), (1, 1, True))
+        self.assertEqual(data["errors"][0]["row"], 2)
+        # The staged file is removed once the import is complete.
+        self.assertEqual(os.listdir(self.directory), [])
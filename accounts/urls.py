@@ -14,10 +14,12 @@ from .views import (
     UserProfileUpdateAPIView,
 )
 from rest_framework_simplejwt.views import TokenRefreshView
+from .async_views import AsyncResendOTPAPIView
 
 urlpatterns = [
     path("user-registration", UserRegistrationAPIView.as_view(), name="user-registration"),
     path("otp-resend", ResendOTPAPIView.as_view(), name="otp-resend"),
+    path("otp-resend/async", AsyncResendOTPAPIView.as_view(), name="otp-resend-async"),
     path("otp-verification", OTPVerificationAPIView.as_view(), name="otp-verification"),
     path("password-setup", PasswordSetUpAPIView.as_view(), name="create-password"),
     path("pin-setup", TransactionPinCreateAPIView.as_view(), name="pin-create"),
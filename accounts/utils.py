@@ -1,8 +1,19 @@
+import functools
+import logging
 import random
 import string
-from sib_api_v3_sdk.rest import ApiException
+from django.db import IntegrityError, transaction
+from django.template.loader import render_to_string
 import os
-import sib_api_v3_sdk
+from utils.background import run_in_background, stage_upload
+from utils.images import normalize_image
+from utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# EMAIL_API_HOST can point at a stand-in for the e-mail API, e.g. in a load test.
+EMAIL_API_HOST = os.getenv("EMAIL_API_HOST", "https://api.sendinblue.com/v3")
+EMAIL_API_URL = f"{EMAIL_API_HOST}/smtp/email"
 
 
 def GenerateOTP(length: int):
@@ -15,13 +26,100 @@ def GenerateOTP(length: int):
     return otp[:length]
 
 
+# Inserts tried by register_user before giving up; each retry follows an OTP clash.
+REGISTRATION_ATTEMPTS = 5
+
+# Random OTPs checked at once by free_otp.
+OTP_CANDIDATES = 50
+
+
+def free_otp():
+    """
+    A 4-digit OTP no user currently holds: OTP_CANDIDATES random ones are checked in one query.
+    With only 6561 possible OTPs, guessing blindly fails often once many users await verification.
+    """
+    from .models import User
+
+    candidates = {GenerateOTP(length=4) for _ in range(OTP_CANDIDATES)}
+    free = candidates - set(User.objects.filter(otp__in=candidates).values_list("otp", flat=True))
+    return random.choice(sorted(free)) if free else GenerateOTP(length=4)
+
+
+def register_user(email, full_name):
+    """
+    Creates an inactive user in a single INSERT; the set_registration_otp signal fills in the OTP
+    beforehand. Returns None if the email is already registered. The unique constraints decide
+    races between concurrent registrations, so nothing is looked up first. After an OTP clash the
+    insert is retried with an OTP from free_otp().
+    """
+    from .models import User
+
+    extra_fields = {}
+    for _ in range(REGISTRATION_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return User.objects.create_user(email=email, full_name=full_name, is_active=False, **extra_fields)
+        except IntegrityError:
+            if User.objects.filter(email=User.objects.normalize_email(email)).exists():
+                return None
+            extra_fields["otp"] = free_otp()
+    raise IntegrityError(f"No free OTP found in {REGISTRATION_ATTEMPTS} attempts")
+
+
+def issue_otp(user):
+    """
+    Gives an unverified user a new OTP from free_otp() and returns it. Like register_user, an OTP
+    taken by a concurrent registration or resend in the meantime fails on the unique constraint,
+    and another one is tried.
+    """
+    for _ in range(REGISTRATION_ATTEMPTS):
+        user.otp = free_otp()
+        try:
+            with transaction.atomic():
+                user.save(update_fields=["otp"])
+            return user.otp
+        except IntegrityError:
+            continue
+    raise IntegrityError(f"No free OTP found in {REGISTRATION_ATTEMPTS} attempts")
+
+
 def profile_image_path(instance, filename):
     return f"profiles/{instance.full_name}/{filename}"
 
 
+def update_profile_picture(user, uploaded_file):
+    """Normalizes a new profile picture and generates its thumbnail in the background pool."""
+    staged_path = stage_upload(uploaded_file)
+    transaction.on_commit(
+        lambda: run_in_background(push_profile_picture, user.pk, staged_path, uploaded_file.name)
+    )
+
+
+def push_profile_picture(user_id, staged_path, name):
+    from .models import User
+
+    try:
+        user = User.objects.get(pk=user_id)
+        with open(staged_path, "rb") as staged_file:
+            image, thumbnail = normalize_image(staged_file, name)
+        user.profile_picture.save(image.name, image, save=False)
+        user.profile_picture_thumbnail.save(thumbnail.name, thumbnail, save=False)
+        User.objects.filter(pk=user_id).update(
+            profile_picture=user.profile_picture.name,
+            profile_picture_thumbnail=user.profile_picture_thumbnail.name,
+        )
+    finally:
+        os.remove(staged_path)
+
+
 def send_email(to, reply_to, html_content, sender, subject):
+    # Imported here so workers that never send e-mail don't pay for loading the SDK.
+    import sib_api_v3_sdk
+    from sib_api_v3_sdk.rest import ApiException
+
     try:
         configuration = sib_api_v3_sdk.Configuration()
+        configuration.host = EMAIL_API_HOST
         configuration.api_key["api-key"] = os.getenv("EMAIL_API_KEY")
         api_instance = sib_api_v3_sdk.TransactionalEmailsApi(
             sib_api_v3_sdk.ApiClient(configuration)
@@ -33,12 +131,110 @@ def send_email(to, reply_to, html_content, sender, subject):
             sender=sender,
             subject=subject,
         )
-        api_response = api_instance.send_transac_email(send_smtp_email)
+        with timed("email"):
+            api_response = api_instance.send_transac_email(send_smtp_email)
 
-        print("Email sent successfully:", api_response)
+        logger.info("Sent email %r", subject, extra={"recipients": len(to), "message_id": api_response.message_id})
 
         return "Success"
 
     except ApiException as e:
-        print("Exception when calling SMTPApi->send_transac_email:", e)
+        logger.warning("Could not send email %r: %s %s", subject, e.status, e.reason, extra={"response": e.body})
         return "Fail"
+
+
+# Most message versions the e-mail API accepts in one call.
+MESSAGE_VERSIONS_LIMIT = 1000
+
+
+def send_bulk_email(versions, reply_to, html_content, sender, subject):
+    """
+    Sends one e-mail per entry of `versions` ({"to": [...], "params": {...}}) in a single API call.
+    `html_content` is shared by all of them; the API fills in its {{ params.* }} placeholders.
+    """
+    import sib_api_v3_sdk
+    from sib_api_v3_sdk.rest import ApiException
+
+    try:
+        configuration = sib_api_v3_sdk.Configuration()
+        configuration.host = EMAIL_API_HOST
+        configuration.api_key["api-key"] = os.getenv("EMAIL_API_KEY")
+        api_instance = sib_api_v3_sdk.TransactionalEmailsApi(
+            sib_api_v3_sdk.ApiClient(configuration)
+        )
+        send_smtp_email = sib_api_v3_sdk.SendSmtpEmail(
+            message_versions=[
+                sib_api_v3_sdk.SendSmtpEmailMessageVersions(to=version["to"], params=version["params"])
+                for version in versions
+            ],
+            reply_to=reply_to,
+            html_content=html_content,
+            sender=sender,
+            subject=subject,
+        )
+        with timed("email"):
+            api_instance.send_transac_email(send_smtp_email)
+
+        logger.info("Sent email %r", subject, extra={"recipients": len(versions)})
+
+        return "Success"
+
+    except ApiException as e:
+        logger.warning("Could not send email %r: %s %s", subject, e.status, e.reason, extra={"response": e.body})
+        return "Fail"
+
+
+@functools.cache
+def email_ssl_context():
+    """
+    The TLS context of async_send_email's clients. Loading the CA bundle costs tens of milliseconds
+    of CPU, which would otherwise be paid by every e-mail sent.
+    """
+    import httpx
+
+    return httpx.create_ssl_context()
+
+
+async def async_send_email(to, reply_to, html_content, sender, subject, attachment=None):
+    """Non-blocking counterpart of send_email for async views, talking to the same e-mail API over httpx."""
+    payload = {
+        "to": to,
+        "replyTo": reply_to,
+        "htmlContent": html_content,
+        "sender": sender,
+        "subject": subject,
+    }
+    if attachment:
+        payload["attachment"] = attachment
+
+    import httpx
+
+    try:
+        with timed("email"):
+            async with httpx.AsyncClient(timeout=10, verify=email_ssl_context()) as client:
+                response = await client.post(
+                    EMAIL_API_URL,
+                    json=payload,
+                    headers={"api-key": os.getenv("EMAIL_API_KEY", ""), "accept": "application/json"},
+                )
+                response.raise_for_status()
+
+        logger.info("Sent email %r", subject, extra={"recipients": len(to), "message_id": response.json().get("messageId")})
+
+        return "Success"
+
+    except httpx.HTTPError as e:
+        logger.warning("Could not send email %r: %s", subject, e)
+        return "Fail"
+
+
+def build_otp_email(user, otp, template_name, subject):
+    """Returns an OTP e-mail for the given user, as send_email kwargs."""
+    context = {"full_name": user.full_name, "otp": otp}
+    return {
+        "to": [{"email": user.email, "name": user.full_name}],
+        "subject": subject,
+        "sender": {"name": "Longman Technologies", "email": os.getenv("EMAIL_SENDER")},
+        "reply_to": {"email": os.getenv("REPLY_TO_EMAIL")},
+        "html_content": render_to_string(template_name, context),
+    }
@@ -1,5 +1,7 @@
+from decimal import Decimal
 from datetime import timedelta
 from django.utils import timezone
+from django.db import transaction as db_transaction
 from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.hashers import make_password
 from django.template.loader import render_to_string
@@ -12,7 +14,7 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.exceptions import MethodNotAllowed
-from .utils import GenerateOTP, send_email
+from .utils import GenerateOTP, send_email, build_otp_email, issue_otp, register_user
 from .serializers import (
     UserRegistrationSerializer,
     OTPVerificationSerializer,
@@ -24,7 +26,9 @@ from .serializers import (
     UserProfileUpdateSerializer,
     UserDetailSerializer,
 )
+from banking.events import record_credit_events
 from banking.models import Account, Transaction, Ledger
+from utils.uploads import ImageUploadGuardMixin
 import os
 
 
@@ -86,7 +90,9 @@ class UserRegistrationAPIView(generics.GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         email = serializer.validated_data["email"]
-        if User.objects.filter(email=email).exists():
+        full_name = serializer.validated_data["full_name"]
+        full_name_title = ' '.join(word.capitalize() for word in full_name.split())
+        if register_user(email, full_name_title) is None:
             return Response(
                 {
                     "status": status.HTTP_400_BAD_REQUEST,
@@ -95,13 +101,6 @@ class UserRegistrationAPIView(generics.GenericAPIView):
                 },
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        full_name = serializer.validated_data["full_name"]
-        full_name_title = ' '.join(word.capitalize() for word in full_name.split())
-        User.objects.create_user(
-            email=email,
-            full_name=full_name_title,
-            is_active=False
-        )
         serializer.validated_data["full_name"] = full_name_title
         response_data = {
             "status": status.HTTP_201_CREATED,
@@ -182,26 +181,10 @@ class ResendOTPAPIView(generics.GenericAPIView):
             }
             return Response(response_data, status=status.HTTP_404_NOT_FOUND)
 
-        otp = GenerateOTP(length=4)
+        otp = issue_otp(user)
 
-        user.otp = otp
-        user.save()
-        
-        subject = "Verify your email address."
-        context = {'full_name': user.full_name, 'otp': otp}
-        
-        message = render_to_string('otp_resend.html', context)
-        
-        sender_name = "Longman Technologies"
-        sender_email = os.getenv("EMAIL_SENDER")
-        reply_to_email = os.getenv("REPLY_TO_EMAIL")
-        to = [{"email": user.email, "name": user.full_name}]
         sent_email = send_email(
-            to=to,
-            subject=subject,
-            sender={"name": sender_name, "email": sender_email},
-            reply_to={"email": reply_to_email},
-            html_content=message,
+            **build_otp_email(user, otp, "otp_resend.html", "Verify your email address.")
         )
         
         if sent_email == "Success":
@@ -384,24 +367,34 @@ class PasswordSetUpAPIView(generics.GenericAPIView):
         user.last_login = timezone.now()
         user.save()
 
-        account = Account.objects.create(
-            user=user, current_balance=20000.00, account_type="SAVINGS"
-        )
+        # The bonus and its stream events are committed together (transactional outbox).
+        with db_transaction.atomic():
+            # Users onboarded by a bulk import already have an account, opened empty.
+            account = Account.objects.select_for_update().filter(user=user).order_by("date_created").first()
+            if account is None:
+                account = Account.objects.create(
+                    user=user, current_balance=20000.00, account_type="SAVINGS"
+                )
+            else:
+                account.current_balance += Decimal("20000.00")
+                account.save(update_fields=["current_balance"])
+
+            transaction = Transaction.objects.create(
+                transaction_type="CREDIT",
+                transaction_mode="AUTO CREDIT",
+                from_account=None,  
+                to_account=account,
+                amount=20000.00,
+                description="Welcome! Enjoy your welcome bonus!",
+            )
 
-        transaction = Transaction.objects.create(
-            transaction_type="CREDIT",
-            transaction_mode="AUTO CREDIT",
-            from_account=None,  
-            to_account=account,
-            amount=20000.00,
-            description="Welcome! Enjoy your welcome bonus!",
-        )
+            Ledger.objects.create(
+                account=account,
+                transaction = transaction,
+                balance_after_transaction = account.current_balance 
+            )
 
-        Ledger.objects.create(
-            account=account,
-            transaction = transaction,
-            balance_after_transaction = account.current_balance 
-        )
+            record_credit_events(transaction, account)
 
         refresh = RefreshToken.for_user(user)
         access_token = str(refresh.access_token)
@@ -885,7 +878,7 @@ class DeliberatePasswordResetAPIView(generics.GenericAPIView):
             status=status.HTTP_200_OK,
         )
 
-class UserProfileUpdateAPIView(generics.RetrieveUpdateAPIView):
+class UserProfileUpdateAPIView(ImageUploadGuardMixin, generics.RetrieveUpdateAPIView):
     """
     This view allows a user to update their information.
     """
@@ -893,6 +886,7 @@ class UserProfileUpdateAPIView(generics.RetrieveUpdateAPIView):
     serializer_class = UserProfileUpdateSerializer
     authentication_classes = [JWTAuthentication]
     parser_classes = [FormParser, MultiPartParser, JSONParser]
+    max_upload_file_size = 2 * 1024 * 1024
 
     def get_object(self):
         return self.request.user
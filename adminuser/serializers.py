@@ -0,0 +1,7 @@
+from rest_framework import serializers
+from utils.profiling import PROFILE_KINDS
+
+
+class ProfileTokenSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=PROFILE_KINDS)
+    path = serializers.CharField(required=False, default="", allow_blank=True)
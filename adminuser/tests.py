@@ -1,3 +1,49 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from django.test import AsyncClient, TestCase, override_settings
+from accounts.models import User
+from utils.profiling import PROFILE_HEADER, make_profile_token
 
-# Create your tests here.
+
+class ProfilingMiddlewareTests(TestCase):
+    url = "/api/v1/admin/profiles"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email="admin@example.com", full_name="Admin")
+
+    def setUp(self):
+        profiles_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profiles_dir)
+        # The middleware is set up with the test client's handler, after these settings apply.
+        settings_override = override_settings(PROFILING_SECRET="profiling-secret", PROFILES_DIR=profiles_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.profiles_dir = profiles_dir
+
+    def headers(self, token):
+        return {"headers": {PROFILE_HEADER: token}}
+
+    def report(self, response):
+        with open(os.path.join(self.profiles_dir, f"{response['X-Profile-Id']}.txt")) as report_file:
+            return report_file.read()
+
+    def test_request_is_profiled(self):
+        response = self.client.get(self.url, **self.headers(make_profile_token("cpu", self.admin)))
+
+        self.assertIn("dispatch", self.report(response))
+
+    async def test_request_is_profiled_under_asgi(self):
+        token = make_profile_token("cpu", self.admin, path=self.url)
+
+        response = await AsyncClient().get(self.url, **self.headers(token))
+
+        # The sync view ran in the profiled thread.
+        self.assertIn("dispatch", self.report(response))
+
+    async def test_other_requests_pass_through_under_asgi(self):
+        for headers in ({}, self.headers("forged"), self.headers(make_profile_token("cpu", self.admin, path="/other"))):
+            response = await AsyncClient().get(self.url, **headers)
+            self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(os.listdir(self.profiles_dir), [])
@@ -1,7 +1,28 @@
 from django.urls import path
-from .views import AdminUserRUDAPIView, UsersListAPIView
+from .views import (
+    AdminUserRUDAPIView,
+    LedgerExportAPIView,
+    MemorySnapshotCreateAPIView,
+    MessageSearchAPIView,
+    ProfileDownloadAPIView,
+    ProfileListAPIView,
+    ProfileTokenCreateAPIView,
+    TransactionExportAPIView,
+    UserImportCreateAPIView,
+    UserImportRetrieveAPIView,
+    UsersListAPIView,
+)
 
 urlpatterns = [
     path("users/<int:id>", AdminUserRUDAPIView.as_view(), name="user-admin-rud"),
     path("users", UsersListAPIView.as_view(), name="users-list"),
+    path("users/imports", UserImportCreateAPIView.as_view(), name="user-import-create"),
+    path("users/imports/<int:id>", UserImportRetrieveAPIView.as_view(), name="user-import-detail"),
+    path("exports/transactions", TransactionExportAPIView.as_view(), name="transactions-export"),
+    path("exports/ledger", LedgerExportAPIView.as_view(), name="ledger-export"),
+    path("messages/search", MessageSearchAPIView.as_view(), name="messages-search"),
+    path("profiles", ProfileListAPIView.as_view(), name="profiles-list"),
+    path("profiles/tokens", ProfileTokenCreateAPIView.as_view(), name="profile-token-create"),
+    path("profiles/snapshots", MemorySnapshotCreateAPIView.as_view(), name="memory-snapshot-create"),
+    path("profiles/<str:profile_id>", ProfileDownloadAPIView.as_view(), name="profile-download"),
 ]
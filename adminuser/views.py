@@ -1,11 +1,34 @@
+import os
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.http import FileResponse
 from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.parsers import FormParser, MultiPartParser, JSONParser
 from drf_spectacular.utils import extend_schema, OpenApiParameter
-from accounts.serializers import UserDetailSerializer
+from accounts.bulk_import import start_import
+from accounts.models import UserImport
+from accounts.serializers import (
+    UserDetailSerializer,
+    UserDetailValuesSerializer,
+    UserImportSerializer,
+    UserImportUploadSerializer,
+)
+from banking.exports import EXPORT_PARAMETERS, export_ledger, export_transactions
+from banking.models import Account, Ledger, Transaction
+from messaging.models import CustomerMessage
+from messaging.search import search_messages
+from messaging.serializers import MessageSearchResultSerializer
+from .serializers import ProfileTokenSerializer
+from utils.db_router import ReplicaReadMixin
+from utils.exports import EXPORT_FORMATS, export_response, get_export_format, is_asgi, iter_chunks
+from utils.pagination import DateCreatedCursorPagination
+from utils.profiling import PROFILE_HEADER, list_profiles, make_profile_token, profile_file_path, snapshot_memory
+from utils.values import SPARSE_FIELDSET_PARAMETERS, ValuesListMixin
 
 # Create your views here.
 
@@ -15,7 +38,11 @@ User = get_user_model()
     description=  """
     This endpoint allows an admin to fetch a list of all the users in the database, in descending order.\n 
     To speed up the database query, a query parameter ('page') can be appended to the url and the value\n 
-    can be set to any page number, commonly starting from one.
+    can be set to any page number, commonly starting from one.\n
+    Users can be filtered by email, full_name, phone_number (partial, case-insensitive matches) and\n
+    account_number (exact), or searched across all of them with 'search'.\n
+    'pagination=cursor' switches to keyset pagination: follow the 'next' and 'previous' links.\n
+    'export=csv' or 'export=jsonl' streams every matching user as a file instead.
     """,
     responses={
         200: UserDetailSerializer(many=True),
@@ -25,25 +52,81 @@ User = get_user_model()
     methods=["GET"],
     parameters=[
         OpenApiParameter(name="page", description="Page number", required=False, type=int),
+        OpenApiParameter(name="email", description="Part of the email address", required=False, type=str),
+        OpenApiParameter(name="full_name", description="Part of the name", required=False, type=str),
+        OpenApiParameter(name="phone_number", description="Part of the phone number", required=False, type=str),
+        OpenApiParameter(name="account_number", description="Account number", required=False, type=int),
+        OpenApiParameter(
+            name="search", description="Matches email, name, phone number or account number", required=False, type=str
+        ),
+        OpenApiParameter(
+            name="pagination", description="'cursor' for keyset pagination", required=False, type=str, enum=["cursor"]
+        ),
+        OpenApiParameter(name="cursor", description="Cursor from a 'next' or 'previous' link", required=False, type=str),
+        OpenApiParameter(
+            name="export", description="Download the users as csv or jsonl", required=False, type=str,
+            enum=list(EXPORT_FORMATS),
+        ),
+        *SPARSE_FIELDSET_PARAMETERS,
     ],
     )
-class UsersListAPIView(generics.ListAPIView):
+class UsersListAPIView(ReplicaReadMixin, ValuesListMixin, generics.ListAPIView):
     """
     This view allows an admin to fetch a list of all the users in the database, in descending order.\n 
     To speed up the database query, a query parameter ('page') can be appended to the url and the value\n 
     can be set to any page number, commonly starting from one.
     """
     
-    queryset = User.objects.all().order_by("-date_created")
+    queryset = User.objects.prefetch_related("accounts").order_by("-date_created")
     permission_classes = [IsAdminUser]
     serializer_class = UserDetailSerializer
+    values_serializer_class = UserDetailValuesSerializer
     pagination_class = PageNumberPagination
+    cursor_pagination_class = DateCreatedCursorPagination
+    # Partial matches, served by the trigram indexes from accounts.indexes on PostgreSQL.
+    search_fields = ("email", "full_name", "phone_number")
+    export_fields = (
+        "id", "full_name", "email", "phone_number", "date_of_birth", "address", "is_active", "date_created"
+    )
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        for field in self.search_fields:
+            if params.get(field):
+                queryset = queryset.filter(**{f"{field}__icontains": params[field]})
+        if params.get("account_number"):
+            queryset = queryset.filter(id__in=self.account_owners(params["account_number"], "account_number"))
+        search = params.get("search", "").strip()
+        if search:
+            condition = Q()
+            for field in self.search_fields:
+                condition |= Q(**{f"{field}__icontains": search})
+            if search.isdigit() and len(search) <= 18:
+                condition |= Q(id__in=self.account_owners(search, "search"))
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def account_owners(self, account_number, param):
+        # A subquery rather than a join on accounts, so users with several accounts aren't repeated.
+        if not account_number.isdigit() or len(account_number) > 18:
+            raise ValidationError({param: ["Enter a valid account number."]})
+        return Account.objects.filter(account_number=int(account_number)).values("user_id")
+
+    def use_cursor_pagination(self):
+        return self.request.query_params.get("pagination") == "cursor"
+
+    def get_extra_columns(self):
+        # The cursor is read off the last row of the page, so its ordering column must be selected.
+        return ("date_created",) if self.use_cursor_pagination() else ()
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        paginator = self.pagination_class()
+        if request.query_params.get("export"):
+            return self.export(get_export_format(request.query_params))
+        queryset = self.get_list_queryset()
+        paginator = self.cursor_pagination_class() if self.use_cursor_pagination() else self.pagination_class()
         paginated_queryset = paginator.paginate_queryset(queryset, request, view=self)
-        serializer = self.get_serializer(paginated_queryset, many=True)
+        serializer = self.get_list_serializer(paginated_queryset)
         response_data = {
             'status' : status.HTTP_200_OK,
             'success' : True,
@@ -51,6 +134,27 @@ class UsersListAPIView(generics.ListAPIView):
             }
         return paginator.get_paginated_response(response_data)
 
+    def export(self, export_format):
+        users = self.get_queryset().prefetch_related(None).values_list(*self.export_fields)
+        # Pinned while the router can still see the request; the rows are read after the view returns.
+        users = users.using(users.db)
+
+        def rows():
+            for chunk in iter_chunks(users):
+                account_numbers = {}
+                for user_id, account_number in Account.objects.using(users.db).filter(
+                    user_id__in=[user[0] for user in chunk]
+                ).values_list("user_id", "account_number"):
+                    account_numbers.setdefault(user_id, []).append(str(account_number))
+                for user in chunk:
+                    yield (*user, " ".join(account_numbers.get(user[0], [])))
+
+        header = (*self.export_fields, "account_numbers")
+        return export_response(
+            "users", export_format, header, rows(),
+            compress=self.request.query_params.get("compress") == "gzip", asynchronous=is_asgi(self.request),
+        )
+
 @extend_schema(
     description= """
     This endpoint authorizes only an admin to perform Read, Update, and Delete operations\n
@@ -110,4 +214,369 @@ class AdminUserRUDAPIView(generics.RetrieveUpdateDestroyAPIView):
             'success' : True,
             'message': 'User deleted successfully',
         }
-        return Response(response_data, status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        return Response(response_data, status=status.HTTP_204_NO_CONTENT)
+
+EXPORT_DESCRIPTION = """
+    Streams every {rows} in the date range as a CSV (default) or JSONL file, oldest first.\n
+    Both dates are optional and inclusive (YYYY-MM-DD); 'account_number' limits the export to one account\n
+    and 'compress=gzip' returns a gzipped file.
+    """
+
+ACCOUNT_NUMBER_PARAMETER = OpenApiParameter(
+    name="account_number", description="Only this account", required=False, type=int
+)
+
+
+class AccountExportMixin:
+    def filter_account(self, queryset, *lookups):
+        account_number = self.request.query_params.get("account_number")
+        if not account_number:
+            return queryset
+        if not account_number.isdigit() or len(account_number) > 18:
+            raise ValidationError({"account_number": ["Enter a valid account number."]})
+        condition = Q()
+        for lookup in lookups:
+            condition |= Q(**{lookup: int(account_number)})
+        return queryset.filter(condition)
+
+
+@extend_schema(
+    description=EXPORT_DESCRIPTION.format(rows="transaction"),
+    parameters=[*EXPORT_PARAMETERS, ACCOUNT_NUMBER_PARAMETER],
+    responses={
+        (200, "text/csv"): {"type": "string"},
+        (200, "application/x-ndjson"): {"type": "string"},
+        400: {"description": "Invalid parameter"},
+        401: {"description": "Unauthorized"},
+    },
+    methods=["GET"],
+)
+class TransactionExportAPIView(ReplicaReadMixin, AccountExportMixin, generics.GenericAPIView):
+    """
+    This view allows an admin to download the transactions of every account, or of one account,
+    for any date range as a CSV or JSONL file.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.filter_account(
+            Transaction.objects.all(), "from_account__account_number", "to_account__account_number"
+        )
+        return export_transactions(queryset, request)
+
+
+@extend_schema(
+    description=EXPORT_DESCRIPTION.format(rows="ledger entry, with the balance after each transaction,"),
+    parameters=[*EXPORT_PARAMETERS, ACCOUNT_NUMBER_PARAMETER],
+    responses={
+        (200, "text/csv"): {"type": "string"},
+        (200, "application/x-ndjson"): {"type": "string"},
+        400: {"description": "Invalid parameter"},
+        401: {"description": "Unauthorized"},
+    },
+    methods=["GET"],
+)
+class LedgerExportAPIView(ReplicaReadMixin, AccountExportMixin, generics.GenericAPIView):
+    """
+    This view allows an admin to download the ledger entries of every account, or of one account,
+    for any date range as a CSV or JSONL file.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.filter_account(Ledger.objects.all(), "account__account_number")
+        return export_ledger(queryset, request)
+
+
+@extend_schema(
+    description="""
+    This endpoint allows an admin to search customers' messages, best match first.\n
+    The 'q' query parameter takes words or phrases as typed into a search engine: "quoted phrases",\n
+    'or' between alternatives, and a leading '-' to exclude a word. Results are paginated with 'page'.
+    """,
+    parameters=[
+        OpenApiParameter(name="q", description="Search terms", required=True, type=str),
+        OpenApiParameter(name="page", description="Page number", required=False, type=int),
+    ],
+    responses={
+        200: MessageSearchResultSerializer(many=True),
+        400: {"description": "Missing search terms"},
+        401: {"description": "Unauthorized"},
+    },
+    methods=["GET"],
+)
+class MessageSearchAPIView(ReplicaReadMixin, generics.ListAPIView):
+    """
+    This view allows an admin to run a ranked full-text search over customers' messages.
+    """
+
+    permission_classes = [IsAdminUser]
+    serializer_class = MessageSearchResultSerializer
+    pagination_class = PageNumberPagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": ["Enter something to search for."]})
+        queryset = CustomerMessage.objects.select_related("user").prefetch_related("pictures")
+        return search_messages(queryset, query)
+
+    def list(self, request, *args, **kwargs):
+        paginator = self.pagination_class()
+        paginated_queryset = paginator.paginate_queryset(self.get_queryset(), request, view=self)
+        serializer = self.get_serializer(paginated_queryset, many=True)
+        response_data = {
+            'status' : status.HTTP_200_OK,
+            'success' : True,
+            'data' : serializer.data
+            }
+        return paginator.get_paginated_response(response_data)
+
+
+@extend_schema(
+    description= """
+    This endpoint allows an admin to onboard users in bulk, e.g. an employer's staff, from a CSV file\n
+    with full_name and email columns, and optionally phone_number and account_type.\n
+    The file is imported in the background: every valid row gets an inactive user, an account\n
+    and a welcome OTP e-mail. Follow the import's progress and row errors at users/imports/<id>.
+    """,
+    request={"multipart/form-data": UserImportUploadSerializer},
+    responses={
+        202: UserImportSerializer,
+        400: {"description": "Bad request"},
+        401: {"description": "Unauthorized"},
+    },
+    methods=["POST"],
+)
+class UserImportCreateAPIView(generics.GenericAPIView):
+    """
+    This view allows an admin to onboard users in bulk from a CSV file, imported in the background.
+    """
+    permission_classes = [IsAdminUser]
+    serializer_class = UserImportUploadSerializer
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            user_import = start_import(serializer.validated_data["file"], request.user)
+        except ValueError as e:
+            return Response(
+                {
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'success': False,
+                    'message': str(e),
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        response_data = {
+            'status': status.HTTP_202_ACCEPTED,
+            'success': True,
+            'message': 'Import started',
+            'data': UserImportSerializer(user_import).data,
+        }
+        return Response(response_data, status=status.HTTP_202_ACCEPTED)
+
+
+@extend_schema(
+    description= """
+    This endpoint allows an admin to follow a bulk user import: the rows processed so far,\n
+    the users created, and the rows that failed with their errors.
+    """,
+    responses={
+        200: UserImportSerializer,
+        401: {"description": "Unauthorized"},
+        404: {"description": "Not found"},
+    },
+    methods=["GET"],
+)
+class UserImportRetrieveAPIView(generics.RetrieveAPIView):
+    """
+    This view allows an admin to follow a bulk user import and see its row errors.
+    """
+    queryset = UserImport.objects.all()
+    serializer_class = UserImportSerializer
+    permission_classes = [IsAdminUser]
+    lookup_field = 'id'
+
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_object())
+        response_data = {
+            'status': status.HTTP_200_OK,
+            'success': True,
+            'data': serializer.data
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+def profiling_off_response():
+    return Response(
+        {
+            'status': status.HTTP_404_NOT_FOUND,
+            'success': False,
+            'message': 'Profiling is off',
+        },
+        status=status.HTTP_404_NOT_FOUND,
+    )
+
+
+@extend_schema(
+    description= """
+    This endpoint allows an admin to profile one request made to a live worker, e.g. a slow ledger PDF\n
+    or a big page of users. It returns a value for the X-Profile header, valid for a few minutes:\n
+    requests sent with it run under cProfile ('cpu') or tracemalloc ('memory'), limited to 'path'\n
+    if given. Their responses name the stored profile in the X-Profile-Id header.
+    """,
+    request=ProfileTokenSerializer,
+    responses={
+        201: {"description": "Header to send"},
+        400: {"description": "Bad request"},
+        401: {"description": "Unauthorized"},
+        404: {"description": "Profiling is off"},
+    },
+    methods=["POST"],
+)
+class ProfileTokenCreateAPIView(generics.GenericAPIView):
+    """
+    This view allows an admin to get a signed X-Profile header for profiling requests.
+    """
+    permission_classes = [IsAdminUser]
+    serializer_class = ProfileTokenSerializer
+
+    def post(self, request, *args, **kwargs):
+        if not settings.PROFILING_SECRET:
+            return profiling_off_response()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        response_data = {
+            'status': status.HTTP_201_CREATED,
+            'success': True,
+            'data': {
+                'header': PROFILE_HEADER,
+                'value': make_profile_token(user=request.user, **serializer.validated_data),
+                'expires_in': settings.PROFILING_TOKEN_SECONDS,
+            },
+        }
+        return Response(response_data, status=status.HTTP_201_CREATED)
+
+
+@extend_schema(
+    description= """
+    This endpoint allows an admin to snapshot the memory of the worker serving the request: its peak RSS,\n
+    the largest allocation sites and what grew since its previous snapshot. Memory is only traced from\n
+    a worker's first snapshot on (or from its start with PROFILING_TRACE_MEMORY), so that first call\n
+    only starts tracing and returns 202. The report names the worker's process id.
+    """,
+    request=None,
+    responses={
+        201: {"description": "Snapshot taken"},
+        202: {"description": "Tracing started"},
+        401: {"description": "Unauthorized"},
+        404: {"description": "Profiling is off"},
+        409: {"description": "Another profile is running"},
+    },
+    methods=["POST"],
+)
+class MemorySnapshotCreateAPIView(generics.GenericAPIView):
+    """
+    This view allows an admin to snapshot a worker's memory allocations.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        if not settings.PROFILING_SECRET:
+            return profiling_off_response()
+        try:
+            profile = snapshot_memory(request.user)
+        except RuntimeError as e:
+            return Response(
+                {
+                    'status': status.HTTP_409_CONFLICT,
+                    'success': False,
+                    'message': str(e),
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+        if profile is None:
+            response_data = {
+                'status': status.HTTP_202_ACCEPTED,
+                'success': True,
+                'message': 'Started tracing memory, take another snapshot later',
+            }
+            return Response(response_data, status=status.HTTP_202_ACCEPTED)
+        response_data = {
+            'status': status.HTTP_201_CREATED,
+            'success': True,
+            'data': profile,
+        }
+        return Response(response_data, status=status.HTTP_201_CREATED)
+
+
+@extend_schema(
+    description= """
+    This endpoint allows an admin to list the stored profiles and memory snapshots, newest first.
+    """,
+    responses={
+        200: {"description": "Profiles"},
+        401: {"description": "Unauthorized"},
+        404: {"description": "Profiling is off"},
+    },
+    methods=["GET"],
+)
+class ProfileListAPIView(generics.GenericAPIView):
+    """
+    This view allows an admin to list the stored profiles.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        if not settings.PROFILING_SECRET:
+            return profiling_off_response()
+        response_data = {
+            'status': status.HTTP_200_OK,
+            'success': True,
+            'data': list_profiles(),
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    description= """
+    This endpoint allows an admin to download a stored profile: its text report, or with 'file=raw'\n
+    the profile itself, a pstats file for cProfile viewers or a tracemalloc snapshot dump.
+    """,
+    parameters=[
+        OpenApiParameter(
+            name="file", description="'report' (default) or 'raw'", required=False, type=str, enum=["report", "raw"]
+        ),
+    ],
+    responses={
+        (200, "application/octet-stream"): {"type": "string", "format": "binary"},
+        401: {"description": "Unauthorized"},
+        404: {"description": "Not found"},
+    },
+    methods=["GET"],
+)
+class ProfileDownloadAPIView(generics.GenericAPIView):
+    """
+    This view allows an admin to download a stored profile's report or raw data.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, profile_id, *args, **kwargs):
+        if not settings.PROFILING_SECRET:
+            return profiling_off_response()
+        path = profile_file_path(profile_id, request.query_params.get("file", "report"))
+        if path is None or not os.path.exists(path):
+            return Response(
+                {
+                    'status': status.HTTP_404_NOT_FOUND,
+                    'success': False,
+                    'message': 'Profile not found',
+                },
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return FileResponse(open(path, "rb"), as_attachment=True, filename=os.path.basename(path))
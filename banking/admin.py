@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Account, Transaction, Ledger
+from utils.pagination import EstimatedCountPaginator
+from .models import Account, Transaction, Ledger, InterestAccrual, StandingOrder, TransferCounter, OutboxEvent
 
 
 @admin.register(Account)
@@ -11,8 +12,13 @@ class AccountAdmin(admin.ModelAdmin):
         "current_balance",
         "date_created",
     )
-    list_filter = ("account_type", "date_created")
+    list_filter = ("account_type",)
+    list_select_related = ("user",)
     search_fields = ("account_number", "user__full_name", "user__email")
+    autocomplete_fields = ("user",)
+    date_hierarchy = "date_created"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Transaction)
@@ -26,12 +32,17 @@ class TransactionAdmin(admin.ModelAdmin):
         "description",
         "timestamp",
     )
-    list_filter = ("transaction_type", "timestamp")
+    list_filter = ("transaction_type",)
+    list_select_related = ("from_account__user", "to_account__user")
     search_fields = (
         "transaction_id",
         "from_account__account_number",
         "to_account__account_number",
     )
+    autocomplete_fields = ("from_account", "to_account")
+    date_hierarchy = "timestamp"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Ledger)
@@ -42,5 +53,74 @@ class LedgerAdmin(admin.ModelAdmin):
         "balance_after_transaction",
         
     )
-    list_filter = ("account",)
-    search_fields = ("transaction__transaction_id",)
+    # Transaction.__str__ reads the user of whichever side the transaction was on.
+    list_select_related = (
+        "account__user",
+        "transaction__from_account__user",
+        "transaction__to_account__user",
+    )
+    search_fields = ("transaction__transaction_id", "account__account_number")
+    raw_id_fields = ("account", "transaction")
+    date_hierarchy = "transaction__timestamp"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(InterestAccrual)
+class InterestAccrualAdmin(admin.ModelAdmin):
+    list_display = (
+        "accrual_date",
+        "partition",
+        "partitions",
+        "accounts_credited",
+        "interest_paid",
+        "completed",
+        "date_updated",
+    )
+    list_filter = ("completed",)
+    date_hierarchy = "accrual_date"
+    readonly_fields = ("last_account_id", "accounts_credited", "interest_paid", "date_updated")
+
+
+@admin.register(StandingOrder)
+class StandingOrderAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "user",
+        "to_account_number",
+        "amount",
+        "frequency",
+        "status",
+        "next_run_at",
+        "attempts",
+    )
+    list_filter = ("status", "frequency")
+    list_select_related = ("user",)
+    search_fields = ("to_account_number", "user__email")
+    autocomplete_fields = ("user",)
+    readonly_fields = ("occurrence", "attempts", "last_error", "last_run_at", "claim_token", "claimed_until")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(TransferCounter)
+class TransferCounterAdmin(admin.ModelAdmin):
+    list_display = ("account", "window_start", "amount", "count")
+    list_select_related = ("account__user",)
+    search_fields = ("account__account_number",)
+    raw_id_fields = ("account",)
+    date_hierarchy = "window_start"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "event_type", "date_created")
+    list_filter = ("event_type",)
+    list_select_related = ("user",)
+    search_fields = ("user__email",)
+    raw_id_fields = ("user",)
+    date_hierarchy = "date_created"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,109 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import check_password
+from django.http import JsonResponse
+from rest_framework import status
+from accounts.utils import async_send_email
+from utils.async_views import AsyncAPIView
+from utils.db_router import is_pinned_to_primary, replica_configured, use_replica
+from .operations import transfer_funds
+from .serializers import TransferSerializer
+from .utils import (
+    generate_ledger_pdf,
+    build_transfer_alert_emails,
+    get_statement_ledger_entries,
+    build_statement_email,
+)
+
+
+class AsyncTransferAPIView(AsyncAPIView):
+    """
+    Async variant of TransferAPIView. The transfer itself runs in a thread through sync_to_async,\n
+    since it needs a database transaction with row locks; the debit and credit alerts are then\n
+    sent concurrently without blocking the worker.
+    """
+
+    serializer_class = TransferSerializer
+
+    async def post(self, request, *args, **kwargs):
+        validated_data, error_response = await self.get_validated_data(request)
+        if error_response:
+            return error_response
+
+        # PIN hashing is CPU-bound, so keep it off the event loop.
+        if not await sync_to_async(check_password, thread_sensitive=False)(validated_data["pin"], request.user.pin):
+            return JsonResponse(
+                {"status": status.HTTP_400_BAD_REQUEST, "success": False, "error": "Incorrect PIN"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        amount = validated_data["amount"]
+        description = validated_data.get("description", "")
+        try:
+            debit_transaction, credit_transaction, emails, recipient_name = await sync_to_async(
+                self.perform_transfer
+            )(
+                request.user.id,
+                validated_data["to_account_number"],
+                amount,
+                description,
+                validated_data.get("from_account_number"),
+            )
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        await asyncio.gather(*(async_send_email(**email) for email in emails))
+
+        return JsonResponse(
+            {
+                "status": status.HTTP_200_OK,
+                "Success": True,
+                "message": f"Your transfer of {amount} to {recipient_name} is successful.",
+                "transaction_id": debit_transaction.transaction_id,
+            }
+        )
+
+    def perform_transfer(self, user_id, to_account_number, amount, description, from_account_number):
+        debit_transaction, credit_transaction = transfer_funds(
+            user_id, to_account_number, amount, description, from_account_number
+        )
+        emails = build_transfer_alert_emails(debit_transaction, credit_transaction, amount, description)
+        return debit_transaction, credit_transaction, emails, credit_transaction.to_account.user.full_name
+
+
+class AsyncStatementOfAccountView(AsyncAPIView):
+    """
+    Async variant of StatementOfAccountPDFView. The ledger query and PDF rendering run in a thread,\n
+    and the e-mail carrying the statement is awaited, so slow e-mail deliveries don't hold a worker.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            email = await sync_to_async(self.prepare_statement_email)(
+                request.user, request.GET.get("start_date"), request.GET.get("end_date")
+            )
+        except ValueError:
+            return JsonResponse({"error": "Invalid date format provided."}, status=status.HTTP_400_BAD_REQUEST)
+
+        await async_send_email(**email)
+        return JsonResponse(
+            {
+                "status": status.HTTP_200_OK,
+                "success": True,
+                "message": "Requested account statement on its way to your registered email. Kindly check your inbox.",
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    def prepare_statement_email(self, user, start_date, end_date):
+        if replica_configured() and not is_pinned_to_primary(user.pk):
+            with use_replica():
+                return self.build_email(user, start_date, end_date)
+        return self.build_email(user, start_date, end_date)
+
+    def build_email(self, user, start_date, end_date):
+        ledger_entries, start_date, end_date, start_date_str, end_date_str = get_statement_ledger_entries(
+            user.accounts.all(), start_date, end_date
+        )
+        pdf = generate_ledger_pdf(ledger_entries, user, start_date, end_date)
+        return build_statement_email(user, pdf, start_date_str, end_date_str)
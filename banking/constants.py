@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 ACCOUNT_TYPE = [
     ("SAVINGS", "Savings"), ("CURRENT", "Current"), ("FIXED DEPOSIT", "Fixed Deposit")
     ]
@@ -7,3 +9,37 @@ TRANSACTION_TYPE = [
 TRANSACTION_MODE = [
     ("MOBILE APP TRANSFER", "Mobile App Transfer"), ("USSD TRANSFER", "Ussd Transfer"), ("AUTO CREDIT", "Auto Credit")
 ]
+
+# Annual interest rates by account type; types not listed earn no interest.
+INTEREST_RATES = {
+    "SAVINGS": Decimal("0.0400"),
+    "FIXED DEPOSIT": Decimal("0.0900"),
+}
+# Daily interest is balance * rate / INTEREST_DAY_COUNT (actual/365).
+INTEREST_DAY_COUNT = 365
+
+STANDING_ORDER_FREQUENCY = [
+    ("DAILY", "Daily"), ("WEEKLY", "Weekly"), ("MONTHLY", "Monthly")
+]
+STANDING_ORDER_STATUS = [
+    ("ACTIVE", "Active"), ("PAUSED", "Paused"), ("CANCELLED", "Cancelled"), ("COMPLETED", "Completed")
+]
+# A failed payment is retried after 5, 10, 20... minutes; after the last attempt that payment is
+# skipped and the order moves on to its next date.
+STANDING_ORDER_MAX_ATTEMPTS = 4
+STANDING_ORDER_RETRY_SECONDS = 300
+# How long an executor owns the orders it claimed before another executor may take them over.
+STANDING_ORDER_CLAIM_SECONDS = 300
+
+# Outgoing transfer limits by account type. Amounts and counts are per rolling 24 hours, made of
+# the current and the previous 23 clock hours; hourly_count caps transfers within the current hour.
+TRANSFER_LIMITS = {
+    "SAVINGS": {"daily_amount": Decimal("1000000.00"), "daily_count": 50, "hourly_count": 10},
+    "CURRENT": {"daily_amount": Decimal("10000000.00"), "daily_count": 500, "hourly_count": 100},
+    "FIXED DEPOSIT": {"daily_amount": Decimal("100000.00"), "daily_count": 5, "hourly_count": 2},
+}
+TRANSFER_LIMIT_WINDOW_HOURS = 24
+
+OUTBOX_EVENT_TYPE = [
+    ("transaction", "Transaction"), ("balance", "Balance")
+]
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from utils.events import Event, EventBackend
+from utils.tools import snowflake
+from .models import OutboxEvent
+
+
+def transaction_payload(transaction, account, counterparty):
+    return {
+        "transaction_id": int(transaction.transaction_id),
+        "transaction_type": transaction.transaction_type,
+        "transaction_mode": transaction.transaction_mode,
+        "amount": f"{transaction.amount:.2f}",
+        "description": transaction.description,
+        "timestamp": transaction.timestamp,
+        "account_number": account.account_number,
+        "counterparty": (
+            {"account_number": counterparty.account_number, "full_name": counterparty.user.full_name}
+            if counterparty is not None
+            else None
+        ),
+    }
+
+
+def account_events(transaction, account, counterparty=None):
+    """The transaction and balance events of one side of a transaction, for the account's owner."""
+    return [
+        OutboxEvent(
+            user_id=account.user_id,
+            event_type="transaction",
+            payload=transaction_payload(transaction, account, counterparty),
+        ),
+        OutboxEvent(
+            user_id=account.user_id,
+            event_type="balance",
+            payload={"account_number": account.account_number, "current_balance": f"{account.current_balance:.2f}"},
+        ),
+    ]
+
+
+def record_transfer_events(debit_transaction, credit_transaction, from_account, to_account):
+    """Writes the events of a transfer for both parties; call it inside the transfer's database transaction."""
+    OutboxEvent.objects.bulk_create(
+        account_events(debit_transaction, from_account, to_account)
+        + account_events(credit_transaction, to_account, from_account)
+    )
+
+
+def record_credit_events(credit_transaction, account):
+    """Writes the events of a credit with no sender, e.g. the welcome bonus."""
+    OutboxEvent.objects.bulk_create(account_events(credit_transaction, account))
+
+
+def to_event(outbox_event):
+    return Event(
+        outbox_event.id,
+        outbox_event.user_id,
+        outbox_event.event_type,
+        json.dumps(outbox_event.payload, cls=DjangoJSONEncoder),
+    )
+
+
+class OutboxPollingBackend(EventBackend):
+    """
+    Reads new events straight from the outbox table every EVENT_POLL_SECONDS: one query per
+    process however many streams it holds, and no other infrastructure. The query only asks for
+    the events of users with an open stream, and is skipped while there are none. Snowflake ids
+    are taken before commit, so an event can commit after one with a higher id; each poll
+    therefore looks back EVENT_POLL_LOOKBACK_SECONDS and skips the events it already delivered.
+    A transfer whose commit takes longer than that reaches open streams only after they reconnect.
+    """
+
+    async def listen(self, deliver, subscribed):
+        # Not thread-sensitive: polling outlives the request that started it, so it runs on the
+        # shared executor, whose threads keep their database connections between polls.
+        fetch = sync_to_async(self.fetch, thread_sensitive=False)
+        delivered = set()
+        while True:
+            user_ids = subscribed()
+            if user_ids:
+                floor = snowflake.first_id_at(time.time() - settings.EVENT_POLL_LOOKBACK_SECONDS)
+                delivered = {event_id for event_id in delivered if event_id > floor}
+                for event in await fetch(floor, user_ids):
+                    if event.id not in delivered:
+                        delivered.add(event.id)
+                        deliver(event)
+            await asyncio.sleep(settings.EVENT_POLL_SECONDS)
+
+    def fetch(self, floor, user_ids):
+        events = OutboxEvent.objects.filter(id__gt=floor, user_id__in=user_ids).order_by("id")
+        return [to_event(outbox_event) for outbox_event in events]
@@ -0,0 +1,84 @@
+from datetime import datetime, time, timedelta
+from django.utils.dateparse import parse_date
+from django.utils.timezone import make_aware
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework.exceptions import ValidationError
+from utils.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_response, get_export_format, is_asgi
+
+# (column in the export, ORM lookup)
+TRANSACTION_EXPORT_FIELDS = (
+    ("transaction_id", "transaction_id"),
+    ("timestamp", "timestamp"),
+    ("transaction_type", "transaction_type"),
+    ("transaction_mode", "transaction_mode"),
+    ("amount", "amount"),
+    ("from_account", "from_account__account_number"),
+    ("to_account", "to_account__account_number"),
+    ("description", "description"),
+)
+
+LEDGER_EXPORT_FIELDS = (
+    ("transaction_id", "transaction__transaction_id"),
+    ("timestamp", "transaction__timestamp"),
+    ("account_number", "account__account_number"),
+    ("transaction_type", "transaction__transaction_type"),
+    ("transaction_mode", "transaction__transaction_mode"),
+    ("amount", "transaction__amount"),
+    ("balance_after_transaction", "balance_after_transaction"),
+    ("description", "transaction__description"),
+)
+
+EXPORT_PARAMETERS = [
+    OpenApiParameter(
+        name="export", description="File format, csv (default) or jsonl", required=False, type=str,
+        enum=list(EXPORT_FORMATS),
+    ),
+    OpenApiParameter(name="start_date", description="First day included, YYYY-MM-DD", required=False, type=str),
+    OpenApiParameter(name="end_date", description="Last day included, YYYY-MM-DD", required=False, type=str),
+    OpenApiParameter(name="compress", description="'gzip' to download a .gz file", required=False, type=str, enum=["gzip"]),
+]
+
+
+def filter_date_range(queryset, lookup, params):
+    """
+    Narrows queryset to the days between the optional start_date and end_date (YYYY-MM-DD) params.
+    The bounds are compared as datetimes, so the timestamp index is used.
+    """
+    for param, suffix, offset in (("start_date", "gte", 0), ("end_date", "lt", 1)):
+        value = params.get(param)
+        if not value:
+            continue
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValidationError({param: ["Enter a date in YYYY-MM-DD format."]})
+        bound = make_aware(datetime.combine(day + timedelta(days=offset), time.min))
+        queryset = queryset.filter(**{f"{lookup}__{suffix}": bound})
+    return queryset
+
+
+def export_queryset(name, queryset, fields, request):
+    """Streams `queryset` as the export the request's params ask for, one row per object with the `fields` columns."""
+    params = request.query_params
+    export_format = get_export_format(params)
+    header = [column for column, _ in fields]
+    rows = queryset.values_list(*[lookup for _, lookup in fields])
+    # Pinned here, while the router can still see the request (see export_response).
+    rows = rows.using(rows.db).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return export_response(
+        name, export_format, header, rows, compress=params.get("compress") == "gzip", asynchronous=is_asgi(request)
+    )
+
+
+def export_transactions(queryset, request, name="transactions"):
+    queryset = filter_date_range(queryset, "timestamp", request.query_params).order_by("timestamp", "id")
+    return export_queryset(name, queryset, TRANSACTION_EXPORT_FIELDS, request)
+
+
+def export_ledger(queryset, request, name="ledger"):
+    queryset = filter_date_range(queryset, "transaction__timestamp", request.query_params).order_by(
+        "transaction__timestamp", "id"
+    )
+    return export_queryset(name, queryset, LEDGER_EXPORT_FIELDS, request)
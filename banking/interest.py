@@ -0,0 +1,155 @@
+import logging
+import time
+from decimal import ROUND_HALF_EVEN, Decimal
+from django.db import OperationalError, connection, transaction
+from django.db.models.functions import Mod
+from .constants import INTEREST_DAY_COUNT, INTEREST_RATES
+from .models import Account, InterestAccrual, Ledger, Transaction
+from .summary import invalidate_account_summaries
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+
+# Accounts locked, credited and committed together.
+ACCRUAL_CHUNK_SIZE = 2000
+# Times a chunk is retried after PostgreSQL aborted it to break a deadlock or a serialization
+# failure, waiting ACCRUAL_RETRY_SECONDS longer each time.
+ACCRUAL_CHUNK_RETRIES = 5
+ACCRUAL_RETRY_SECONDS = 0.2
+# SQLSTATEs of transactions that were aborted only because of concurrent ones.
+RETRYABLE_PGCODES = {"40001", "40P01"}
+
+
+def daily_interest(balances, rates):
+    """One day's interest for each balance at the matching annual rate, rounded to the cent."""
+    return [
+        (balance * rate / INTEREST_DAY_COUNT).quantize(CENT, rounding=ROUND_HALF_EVEN) if balance > 0 else ZERO
+        for balance, rate in zip(balances, rates)
+    ]
+
+
+def update_balances(accounts):
+    """
+    Writes the accounts' current_balance. On PostgreSQL that is one UPDATE ... FROM (VALUES ...)
+    statement, which is much cheaper to build than bulk_update's CASE WHEN per row.
+    """
+    if connection.vendor != "postgresql":
+        Account.objects.bulk_update(accounts, ["current_balance"])
+        return
+    if not accounts:
+        return
+    table = connection.ops.quote_name(Account._meta.db_table)
+    values = ", ".join(["(%s, %s::numeric)"] * len(accounts))
+    params = [value for account in accounts for value in (account.id, account.current_balance)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET current_balance = v.balance FROM (VALUES {values}) AS v(id, balance) "
+            f"WHERE {table}.id = v.id",
+            params,
+        )
+
+
+def get_checkpoint(accrual_date, partition=0, partitions=1):
+    """
+    The InterestAccrual row tracking this day and partition, created on the first run. A day is
+    split into a fixed number of partitions: resuming it with a different count would credit some
+    accounts twice, so that raises ValueError.
+    """
+    if not 0 <= partition < partitions:
+        raise ValueError("The partition must be between 0 and the number of partitions minus one")
+    other = InterestAccrual.objects.filter(accrual_date=accrual_date).exclude(partitions=partitions).first()
+    if other is not None:
+        raise ValueError(
+            f"Interest for {accrual_date} was started with {other.partitions} partition(s); resume it with the same count"
+        )
+    checkpoint, _ = InterestAccrual.objects.get_or_create(
+        accrual_date=accrual_date, partition=partition, defaults={"partitions": partitions}
+    )
+    return checkpoint
+
+
+def accounts_to_credit(checkpoint):
+    accounts = Account.objects.filter(account_type__in=INTEREST_RATES, id__gt=checkpoint.last_account_id)
+    if checkpoint.partitions > 1:
+        # Account numbers are random, so they split evenly; snowflake ids end in a mostly-zero sequence.
+        accounts = accounts.alias(bucket=Mod("account_number", checkpoint.partitions)).filter(
+            bucket=checkpoint.partition
+        )
+    return accounts.order_by("id")
+
+
+def accrue_chunk(checkpoint, chunk_size=ACCRUAL_CHUNK_SIZE):
+    """
+    Credits the next `chunk_size` accounts of the checkpoint's partition in one database transaction
+    and advances the checkpoint with them. Returns the refreshed checkpoint and the accounts processed.
+    """
+    with transaction.atomic():
+        # Serializes processes that were given the same partition.
+        checkpoint = InterestAccrual.objects.select_for_update().get(pk=checkpoint.pk)
+        if checkpoint.completed:
+            return checkpoint, 0
+        accounts = list(
+            accounts_to_credit(checkpoint)
+            .select_for_update()
+            .only("id", "user_id", "account_type", "current_balance")[:chunk_size]
+        )
+        interest = daily_interest(
+            [account.current_balance for account in accounts],
+            [INTEREST_RATES[account.account_type] for account in accounts],
+        )
+        credited = [(account, amount) for account, amount in zip(accounts, interest) if amount > 0]
+        description = f"Interest for {checkpoint.accrual_date:%Y-%m-%d}"
+        transactions = Transaction.objects.bulk_create(
+            Transaction(
+                transaction_type="CREDIT",
+                transaction_mode="AUTO CREDIT",
+                to_account=account,
+                amount=amount,
+                description=description,
+            )
+            for account, amount in credited
+        )
+        for account, amount in credited:
+            account.current_balance += amount
+        update_balances([account for account, _ in credited])
+        Ledger.objects.bulk_create(
+            Ledger(account=account, transaction=credit, balance_after_transaction=account.current_balance)
+            for (account, _), credit in zip(credited, transactions)
+        )
+
+        if accounts:
+            checkpoint.last_account_id = accounts[-1].id
+        checkpoint.accounts_credited += len(credited)
+        checkpoint.interest_paid += sum((amount for _, amount in credited), ZERO)
+        checkpoint.completed = len(accounts) < chunk_size
+        checkpoint.save()
+        credited_users = [account.user_id for account, _ in credited]
+        transaction.on_commit(lambda: invalidate_account_summaries(*credited_users), robust=True)
+    return checkpoint, len(accounts)
+
+
+def accrue_interest(accrual_date, partition=0, partitions=1, chunk_size=ACCRUAL_CHUNK_SIZE, progress=None):
+    """
+    Credits one day's interest to every SAVINGS and FIXED DEPOSIT account in the partition, as
+    AUTO CREDIT transactions. Safe to re-run: it resumes after the last committed chunk and does
+    nothing once the partition is complete. `progress(checkpoint, processed)` is called per chunk.
+    """
+    checkpoint = get_checkpoint(accrual_date, partition, partitions)
+    retries = 0
+    while not checkpoint.completed:
+        try:
+            checkpoint, processed = accrue_chunk(checkpoint, chunk_size)
+        except OperationalError as e:
+            # The chunk was rolled back whole, so it is simply run again.
+            if getattr(e.__cause__, "pgcode", None) not in RETRYABLE_PGCODES or retries >= ACCRUAL_CHUNK_RETRIES:
+                raise
+            retries += 1
+            logger.warning("Retrying an interest chunk of %s (%s): %s", accrual_date, checkpoint, e)
+            time.sleep(ACCRUAL_RETRY_SECONDS * retries)
+            continue
+        retries = 0
+        if progress is not None:
+            progress(checkpoint, processed)
+    return checkpoint
@@ -0,0 +1,51 @@
+from datetime import timedelta
+from django.db.models import F
+from django.utils import timezone
+from .constants import TRANSFER_LIMIT_WINDOW_HOURS, TRANSFER_LIMITS
+from .models import TransferCounter
+
+
+def window_start(when):
+    """The start of the clock hour `when` falls in; counters are kept per hour."""
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+def check_transfer_limits(account, amount, now=None):
+    """
+    Raises ValueError when sending `amount` from `account` would break a TRANSFER_LIMITS rule for
+    its type, and otherwise adds the transfer to the account's counter for the current hour.
+    Costs one read of at most TRANSFER_LIMIT_WINDOW_HOURS rows and one write, however long the
+    account's history. Call it with `account` locked (select_for_update) inside the transfer's
+    transaction: the lock keeps concurrent transfers from the account from racing on the counters,
+    and a transfer that fails afterwards rolls its count back.
+    """
+    limits = TRANSFER_LIMITS.get(account.account_type)
+    if limits is None:
+        return
+    current = window_start(now or timezone.now())
+    counters = list(
+        TransferCounter.objects.filter(
+            account=account, window_start__gt=current - timedelta(hours=TRANSFER_LIMIT_WINDOW_HOURS)
+        ).values_list("window_start", "amount", "count")
+    )
+    daily_amount = sum((counter_amount for _, counter_amount, _ in counters), amount)
+    daily_count = sum(count for _, _, count in counters) + 1
+    hourly_count = sum(count for start, _, count in counters if start == current) + 1
+
+    if daily_amount > limits["daily_amount"]:
+        raise ValueError(f"This transfer would exceed your daily transfer limit of {limits['daily_amount']}")
+    if daily_count > limits["daily_count"]:
+        raise ValueError(f"You have reached your limit of {limits['daily_count']} transfers a day")
+    if hourly_count > limits["hourly_count"]:
+        raise ValueError(f"You have reached your limit of {limits['hourly_count']} transfers an hour, try again later")
+
+    if any(start == current for start, _, _ in counters):
+        TransferCounter.objects.filter(account=account, window_start=current).update(
+            amount=F("amount") + amount, count=F("count") + 1
+        )
+        return
+    TransferCounter.objects.create(account=account, window_start=current, amount=amount, count=1)
+    # At most once an hour per account: drop counters that have left the window, keeping the table small.
+    TransferCounter.objects.filter(
+        account=account, window_start__lte=current - timedelta(hours=TRANSFER_LIMIT_WINDOW_HOURS)
+    ).delete()
@@ -0,0 +1,53 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from banking.interest import ACCRUAL_CHUNK_SIZE, accrue_interest
+from utils.tools import use_batch_worker_ids
+
+
+class Command(BaseCommand):
+    help = (
+        "Credit one day's interest to SAVINGS and FIXED DEPOSIT accounts. Re-running resumes after the "
+        "last committed chunk. To split the work across processes, start one per partition with the same "
+        "--partitions, e.g. for i in 0 1 2 3; do manage.py accrue_interest --partitions 4 --partition $i & done"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Day to accrue, YYYY-MM-DD (default: today)")
+        parser.add_argument("--partition", type=int, default=0)
+        parser.add_argument("--partitions", type=int, default=1)
+        parser.add_argument("--chunk-size", type=int, default=ACCRUAL_CHUNK_SIZE)
+
+    def handle(self, *args, **kwargs):
+        accrual_date = parse_date(kwargs["date"]) if kwargs["date"] else timezone.localdate()
+        if accrual_date is None:
+            raise CommandError("--date must be in YYYY-MM-DD format")
+
+        use_batch_worker_ids()
+
+        started = time.perf_counter()
+        processed = 0
+
+        def progress(checkpoint, chunk):
+            nonlocal processed
+            processed += chunk
+            if chunk:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{processed} accounts processed, {checkpoint.accounts_credited} credited "
+                    f"({processed / elapsed:.0f} accounts/s)"
+                )
+
+        try:
+            checkpoint = accrue_interest(
+                accrual_date, kwargs["partition"], kwargs["partitions"], kwargs["chunk_size"], progress
+            )
+        except ValueError as e:
+            raise CommandError(e)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Interest for {accrual_date} ({checkpoint}): {checkpoint.accounts_credited} accounts credited "
+                f"{checkpoint.interest_paid} in total, {time.perf_counter() - started:.1f}s"
+            )
+        )
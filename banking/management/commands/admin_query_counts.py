@@ -0,0 +1,98 @@
+import time
+from decimal import Decimal
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from banking.models import Account, Ledger, Transaction
+from messaging.models import CustomerMessage
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Render every admin changelist as a superuser and report its query count and time. "
+        "A changelist whose query count exceeds --max-queries issues queries per row. "
+        "With --seed, rows are created first and everything is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0, help="Transactions (and ledger rows) to create first")
+        parser.add_argument("--max-queries", type=int, default=10, help="Queries allowed per changelist")
+
+    def handle(self, *args, **kwargs):
+        failures = []
+        try:
+            with transaction.atomic():
+                if kwargs["seed"]:
+                    self.seed(kwargs["seed"])
+                failures = self.check_changelists(kwargs["max_queries"])
+                raise Rollback
+        except Rollback:
+            pass
+        if failures:
+            raise CommandError(f"Over the query budget: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All changelists within the query budget"))
+
+    def check_changelists(self, max_queries):
+        superuser = User.objects.create_superuser(
+            email="admin-query-counts@example.com", password=None, full_name="Admin Query Counts"
+        )
+        client = Client()
+        client.force_login(superuser)
+        failures = []
+        # Instruments template rendering, so response.context holds the changelist.
+        setup_test_environment()
+        try:
+            for model in admin.site._registry:
+                url = reverse(f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist")
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    elapsed = time.perf_counter() - started
+                rows = len(response.context["cl"].result_list) if response.status_code == 200 else 0
+                line = f"{url}: {response.status_code}, {rows} rows, {len(queries)} queries, {elapsed * 1000:.0f}ms"
+                if response.status_code != 200 or len(queries) > max_queries:
+                    failures.append(url)
+                    self.stdout.write(self.style.ERROR(line))
+                else:
+                    self.stdout.write(line)
+        finally:
+            teardown_test_environment()
+        return failures
+
+    def seed(self, count):
+        users = User.objects.bulk_create(
+            User(full_name=f"Seed User {i}", email=f"seed-{i}@example.com") for i in range(max(count // 10, 2))
+        )
+        # Sequential account numbers; the random default would collide on a large seed.
+        accounts = Account.objects.bulk_create(
+            Account(user=user, account_number=9_000_000_000 + i, current_balance=Decimal("1000.00"))
+            for i, user in enumerate(users)
+        )
+        transactions = Transaction.objects.bulk_create(
+            Transaction(
+                transaction_id=9_000_000_000_000_000 + i,
+                transaction_type="DEBIT",
+                from_account=accounts[i % len(accounts)],
+                to_account=accounts[(i + 1) % len(accounts)],
+                amount=Decimal("1.00"),
+            )
+            for i in range(count)
+        )
+        Ledger.objects.bulk_create(
+            Ledger(account=t.from_account, transaction=t, balance_after_transaction=Decimal("999.00"))
+            for t in transactions
+        )
+        CustomerMessage.objects.bulk_create(
+            CustomerMessage(user=users[i % len(users)], message=f"Seed message {i}") for i in range(count // 10)
+        )
+        self.stdout.write(f"Seeded {len(users)} users, {len(transactions)} transactions and ledger rows")
@@ -0,0 +1,40 @@
+import statistics
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from banking.models import Account
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark AccountInfoAPIView-style tiny queries under the configured DB_CONN_MODE. "
+        "Each iteration is treated as one request: query, then end-of-request connection handling."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=500, help="Number of simulated requests")
+
+    def handle(self, *args, **kwargs):
+        iterations = kwargs["iterations"]
+        account_number = Account.objects.values_list("account_number", flat=True).first()
+        close_old_connections()
+
+        durations = []
+        setup_times = []
+        for _ in range(iterations):
+            connection.connection_setup_time = 0.0
+            started = time.perf_counter()
+            Account.objects.filter(account_number=account_number).select_related("user").first()
+            durations.append(time.perf_counter() - started)
+            setup_times.append(getattr(connection, "connection_setup_time", 0.0))
+            close_old_connections()
+
+        durations.sort()
+        self.stdout.write(f"Mode: {settings.DB_CONN_MODE} ({iterations} requests)")
+        self.stdout.write(f"Mean request: {statistics.mean(durations) * 1000:.2f}ms")
+        self.stdout.write(f"p50 request: {durations[len(durations) // 2] * 1000:.2f}ms")
+        self.stdout.write(f"p95 request: {durations[int(len(durations) * 0.95)] * 1000:.2f}ms")
+        self.stdout.write(
+            self.style.SUCCESS(f"Mean connection setup: {statistics.mean(setup_times) * 1000:.2f}ms")
+        )
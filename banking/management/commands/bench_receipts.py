@@ -0,0 +1,56 @@
+import tempfile
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from banking.models import Account, Transaction
+from banking.receipts import ReceiptCache, render_receipt
+from accounts.models import User
+
+
+class Command(BaseCommand):
+    help = "Measure receipt rendering throughput, cold (render) versus cached (on-disk hit)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200, help="Number of receipts to render")
+
+    def handle(self, *args, **kwargs):
+        iterations = kwargs["iterations"]
+        transaction = (
+            Transaction.objects.select_related("from_account__user", "to_account__user").first()
+            or self.sample_transaction()
+        )
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            data = render_receipt(transaction)
+        render_elapsed = time.perf_counter() - started
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ReceiptCache(directory, max_entries=iterations)
+            for i in range(iterations):
+                cache.set(i, data)
+            started = time.perf_counter()
+            for i in range(iterations):
+                cache.get(i)
+            cached_elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"Receipt size: {len(data) / 1024:.1f} KiB")
+        self.stdout.write(f"Render: {iterations / render_elapsed:.1f} receipts/s ({render_elapsed / iterations * 1000:.2f}ms each)")
+        self.stdout.write(
+            self.style.SUCCESS(f"Cached: {iterations / cached_elapsed:.1f} receipts/s ({cached_elapsed / iterations * 1000:.3f}ms each)")
+        )
+
+    def sample_transaction(self):
+        sender = Account(user=User(full_name="Ada Obi"), account_number=2412345678, current_balance=Decimal("0"))
+        recipient = Account(user=User(full_name="Tunde Bello"), account_number=2487654321, current_balance=Decimal("0"))
+        return Transaction(
+            transaction_id=2412345678901234,
+            transaction_type="DEBIT",
+            transaction_mode="MOBILE APP TRANSFER",
+            from_account=sender,
+            to_account=recipient,
+            amount=Decimal("125000.50"),
+            description="Rent for June",
+            timestamp=timezone.now(),
+        )
@@ -0,0 +1,79 @@
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from accounts.serializers import UserDetailSerializer, UserDetailValuesSerializer
+from banking.models import Transaction
+from banking.serializers import TransactionSerializer, TransactionValuesSerializer
+from messaging.models import CustomerMessage
+from messaging.serializers import CustomerMessageSerializer, CustomerMessageValuesSerializer
+from utils.renderers import ORJSONRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the per-row cost of the ModelSerializer + JSONRenderer path with the values()-driven "
+        "serializers + ORJSONRenderer used by FAST_LIST_RENDERING, and check both produce the same JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=500, help="Rows per list")
+        parser.add_argument("--iterations", type=int, default=20)
+
+    def handle(self, *args, **kwargs):
+        rows, iterations = kwargs["rows"], kwargs["iterations"]
+        context = {"request": Request(APIRequestFactory().get("/"))}
+        cases = [
+            (
+                "transactions",
+                Transaction.objects.select_related("from_account__user", "to_account__user").order_by("-timestamp"),
+                TransactionSerializer,
+                TransactionValuesSerializer,
+            ),
+            (
+                "users",
+                get_user_model().objects.prefetch_related("accounts").order_by("-date_created"),
+                UserDetailSerializer,
+                UserDetailValuesSerializer,
+            ),
+            (
+                "messages",
+                CustomerMessage.objects.prefetch_related("pictures"),
+                CustomerMessageSerializer,
+                CustomerMessageValuesSerializer,
+            ),
+        ]
+        for name, queryset, serializer_class, values_serializer_class in cases:
+            count = queryset[:rows].count()
+            if not count:
+                self.stdout.write(f"{name}: no rows, skipped")
+                continue
+
+            def model_path():
+                data = serializer_class(list(queryset[:rows]), many=True, context=context).data
+                return JSONRenderer().render(data)
+
+            def values_path():
+                page = values_serializer_class.prepare(queryset)[:rows]
+                data = values_serializer_class(page, many=True, context=context).data
+                return ORJSONRenderer().render(data)
+
+            identical = model_path() == values_path()
+            model_time = self.time(model_path, iterations) / count
+            values_time = self.time(values_path, iterations) / count
+            self.stdout.write(
+                f"{name} ({count} rows): ModelSerializer {model_time * 1e6:.1f}us/row, "
+                f"values() {values_time * 1e6:.1f}us/row, {model_time / values_time:.1f}x faster"
+            )
+            if identical:
+                self.stdout.write(self.style.SUCCESS("  output identical"))
+            else:
+                self.stdout.write(self.style.ERROR("  output differs"))
+
+    def time(self, fn, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        return (time.perf_counter() - started) / iterations
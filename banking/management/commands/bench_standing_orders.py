@@ -0,0 +1,163 @@
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from django.utils import timezone
+from banking.models import Account, StandingOrder, Transaction
+
+User = get_user_model()
+
+EMAIL_PREFIX = "bench-standing-order-"
+DESCRIPTION = "Standing order benchmark"
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed due standing orders, execute them with several run_standing_orders processes at once, "
+        "and check every order was paid exactly once. Runs once per --executors count, seeding afresh "
+        "each time; the seeded users are deleted after each run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=100000)
+        parser.add_argument(
+            "--executors", type=int, nargs="+", default=[1, 2, 4],
+            help="run_standing_orders processes; several counts are benchmarked one after the other",
+        )
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded rows")
+
+    def handle(self, *args, **kwargs):
+        orders = kwargs["orders"]
+        if orders < 1:
+            raise CommandError("--orders must be at least 1")
+        if kwargs["keep"] and len(kwargs["executors"]) > 1:
+            raise CommandError("--keep needs a single --executors count")
+        if User.objects.filter(email__startswith=EMAIL_PREFIX).exists():
+            raise CommandError(f"Rows from an earlier run are still there; delete users whose email starts with {EMAIL_PREFIX}")
+        self.stdout.write(f"{os.cpu_count()} CPUs")
+        if max(kwargs["executors"]) > os.cpu_count():
+            # Each executor is busy on the CPU for most of an order; the database needs its share too.
+            self.stdout.write(
+                self.style.WARNING("More executors than CPUs: they will compete for the CPUs rather than add throughput")
+            )
+        for executors in kwargs["executors"]:
+            self.bench(orders, executors, kwargs["batch_size"], kwargs["keep"])
+
+    def bench(self, orders, executors, batch_size, keep):
+        try:
+            self.seed(orders)
+            balance_before = self.total_balance()
+
+            cpu_before = executors_cpu_seconds(), machine_cpu_seconds()
+            started = time.perf_counter()
+            processes = [
+                subprocess.Popen(
+                    [
+                        sys.executable, "-m", "django", "run_standing_orders",
+                        "--no-alerts", "--batch-size", str(batch_size),
+                    ],
+                    cwd=settings.BASE_DIR,
+                )
+                for _ in range(executors)
+            ]
+            for process in processes:
+                process.wait()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{orders} orders executed by {executors} processes in {elapsed:.1f}s ({orders / elapsed:.0f} orders/s)"
+            )
+            self.report_cpu(cpu_before, elapsed)
+            self.check_results(orders, balance_before)
+        finally:
+            if not keep:
+                User.objects.filter(email__startswith=EMAIL_PREFIX).delete()
+
+    def report_cpu(self, cpu_before, elapsed):
+        """
+        How busy the executors and the whole machine (the database too, when it runs here) were.
+        Throughput only grows with the executors while there are idle CPUs for them.
+        """
+        executors_cpu, machine_cpu = executors_cpu_seconds() - cpu_before[0], None
+        if cpu_before[1] is not None:
+            machine_cpu = machine_cpu_seconds() - cpu_before[1]
+        line = f"Executors used {executors_cpu:.1f} CPU seconds ({executors_cpu / elapsed:.2f} CPUs)"
+        if machine_cpu is not None:
+            line += f"; the machine used {machine_cpu / elapsed:.2f} of its {os.cpu_count()} CPUs"
+        self.stdout.write(line)
+
+    def seed(self, orders):
+        started = time.perf_counter()
+        users = User.objects.bulk_create(
+            (User(full_name=f"Standing Order {i}", email=f"{EMAIL_PREFIX}{i}@example.com") for i in range(2 * orders)),
+            batch_size=5000,
+        )
+        # Sequential account numbers; the random default would collide on a large seed.
+        accounts = Account.objects.bulk_create(
+            (
+                Account(user=user, account_number=8_000_000_000 + i, current_balance=Decimal("1000.00"))
+                for i, user in enumerate(users)
+            ),
+            batch_size=5000,
+        )
+        first_run_at = timezone.now() - timedelta(minutes=1)
+        # User 2i pays account 2i + 1, whose owner has no order: no two orders lock the same account,
+        # so concurrent executors never wait on each other's transfers.
+        StandingOrder.objects.bulk_create(
+            (
+                StandingOrder(
+                    user=users[2 * i],
+                    to_account_number=accounts[2 * i + 1].account_number,
+                    amount=Decimal("10.00"),
+                    description=DESCRIPTION,
+                    frequency="DAILY",
+                    first_run_at=first_run_at,
+                    next_run_at=first_run_at,
+                )
+                for i in range(orders)
+            ),
+            batch_size=5000,
+        )
+        self.stdout.write(f"Seeded {orders} due orders in {time.perf_counter() - started:.1f}s")
+
+    def total_balance(self):
+        return Account.objects.filter(user__email__startswith=EMAIL_PREFIX).aggregate(total=Sum("current_balance"))["total"]
+
+    def check_results(self, orders, balance_before):
+        seeded = StandingOrder.objects.filter(user__email__startswith=EMAIL_PREFIX)
+        paid_once = seeded.filter(occurrence=1, attempts=0).count()
+        transactions = Transaction.objects.filter(description=DESCRIPTION).count()
+        problems = []
+        if paid_once != orders:
+            problems.append(f"{orders - paid_once} orders not paid exactly once")
+        if transactions != 2 * orders:
+            problems.append(f"{transactions} transactions instead of {2 * orders}")
+        if self.total_balance() != balance_before:
+            problems.append("balances don't add up")
+        if problems:
+            raise CommandError("; ".join(problems))
+        self.stdout.write(self.style.SUCCESS("Every order was paid exactly once"))
+
+
+def executors_cpu_seconds():
+    """CPU time used by this process's finished children, i.e. the executors."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def machine_cpu_seconds():
+    """CPU time the whole machine spent busy, from /proc/stat; None where there is no such file."""
+    try:
+        with open("/proc/stat") as stat:
+            fields = [int(field) for field in stat.readline().split()[1:]]
+    except OSError:
+        return None
+    # user nice system idle iowait irq softirq steal ...: everything but idle and iowait.
+    return (sum(fields[:8]) - fields[3] - fields[4]) / os.sysconf("SC_CLK_TCK")
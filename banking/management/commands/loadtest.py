@@ -0,0 +1,171 @@
+import asyncio
+import json
+import statistics
+import time
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import psutil
+except ImportError:  # psutil is optional; without it --server-pid is unavailable.
+    psutil = None
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent requests at a running server and report throughput and latency, and with "
+        "--server-pid the memory of the server and its workers. Compare gunicorn sync workers "
+        "(gunicorn controller.wsgi) with uvicorn workers (gunicorn controller.asgi -k uvicorn.workers.UvicornWorker) "
+        "at equal memory: the sync server needs a worker per request in flight, so give it as many more "
+        "workers as the uvicorn server's memory affords. "
+        "With --idle-streams, it instead holds that many event streams (api/v1/events) open and reports "
+        "the server's memory per stream."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="Full URL to hit, e.g. http://127.0.0.1:8000/api/v1/funds-transfer/async")
+        parser.add_argument("--method", default="GET")
+        parser.add_argument("--requests", type=int, default=1000, help="Total number of requests")
+        parser.add_argument("--concurrency", type=int, default=50, help="Requests in flight at once")
+        parser.add_argument("--token", help="JWT access token sent as a Bearer token")
+        parser.add_argument("--data", help="JSON request body")
+        parser.add_argument("--idle-streams", type=int, default=0, help="Event streams to open and hold")
+        parser.add_argument("--hold", type=float, default=30, help="Seconds to hold the streams open")
+        parser.add_argument(
+            "--server-pid", type=int,
+            help="Server (e.g. gunicorn master) whose memory, with its workers', is sampled (needs psutil)",
+        )
+
+    def handle(self, *args, **kwargs):
+        if kwargs["server_pid"] and psutil is None:
+            raise CommandError("--server-pid needs psutil")
+        if kwargs["idle_streams"]:
+            return self.handle_idle_streams(**kwargs)
+        server = psutil.Process(kwargs["server_pid"]) if kwargs["server_pid"] else None
+        latencies, errors, elapsed, peak = asyncio.run(self.run(server=server, **kwargs))
+        latencies.sort()
+        completed = len(latencies)
+        self.stdout.write(f"Requests: {completed + errors} ({errors} failed) in {elapsed:.2f}s")
+        self.stdout.write(f"Throughput: {(completed + errors) / elapsed:.1f} req/s")
+        if latencies:
+            self.stdout.write(f"Mean latency: {statistics.mean(latencies) * 1000:.1f}ms")
+            for percentile in (50, 95, 99):
+                index = min(completed - 1, int(completed * percentile / 100))
+                self.stdout.write(f"p{percentile} latency: {latencies[index] * 1000:.1f}ms")
+        if server:
+            workers = len(server.children(recursive=True))
+            self.stdout.write(f"Server memory: {peak / 2**20:.1f}MB peak (PSS, {workers} worker processes)")
+
+    async def run(self, url, method, requests, concurrency, token, data, server, **kwargs):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        body = json.loads(data) if data else None
+        latencies = []
+        errors = 0
+        remaining = iter(range(requests))
+
+        async def worker(client):
+            nonlocal errors
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, url, headers=headers, json=body)
+                    if response.status_code >= 500:
+                        errors += 1
+                        continue
+                    latencies.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    errors += 1
+
+        async def sample_memory():
+            nonlocal peak
+            while True:
+                peak = max(peak, server_memory(server))
+                await asyncio.sleep(1)
+
+        peak = 0
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+            sampler = asyncio.create_task(sample_memory()) if server else None
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+            if sampler:
+                sampler.cancel()
+            return latencies, errors, elapsed, peak
+
+    def handle_idle_streams(self, url, idle_streams, hold, token, server_pid, concurrency, **kwargs):
+        server = psutil.Process(server_pid) if server_pid else None
+
+        def memory():
+            return server_memory(server) if server else 0
+
+        baseline = memory()
+        opened, failed, peak, elapsed = asyncio.run(
+            self.hold_streams(url, idle_streams, hold, token, concurrency, memory)
+        )
+        self.stdout.write(f"Streams open: {opened} ({failed} failed), opened in {elapsed:.1f}s, held {hold:.0f}s")
+        if server:
+            self.stdout.write(
+                f"Server memory (PSS): {baseline / 2**20:.1f}MB before, {peak / 2**20:.1f}MB peak "
+                f"({(peak - baseline) / max(opened, 1) / 1024:.1f}KB per stream)"
+            )
+
+    async def hold_streams(self, url, count, hold, token, concurrency, memory):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        connecting = asyncio.Semaphore(concurrency)
+        release = asyncio.Event()
+        opened = failed = 0
+
+        async def hold_stream(client):
+            nonlocal opened, failed
+            try:
+                async with connecting:
+                    request = client.build_request("GET", url, headers=headers)
+                    response = await client.send(request, stream=True)
+                if response.status_code != 200:
+                    failed += 1
+                    await response.aclose()
+                    return
+                opened += 1
+                try:
+                    # Keep reading, so keep-alive comments don't pile up in the socket buffers.
+                    async for _ in response.aiter_raw():
+                        if release.is_set():
+                            break
+                finally:
+                    await response.aclose()
+            except httpx.HTTPError:
+                failed += 1
+
+        limits = httpx.Limits(max_connections=count, max_keepalive_connections=0)
+        timeout = httpx.Timeout(60, read=None)
+        async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+            started = time.perf_counter()
+            tasks = [asyncio.create_task(hold_stream(client)) for _ in range(count)]
+            while opened + failed < count:
+                await asyncio.sleep(0.5)
+            elapsed = time.perf_counter() - started
+            peak = memory()
+            deadline = time.perf_counter() + hold
+            while time.perf_counter() < deadline:
+                await asyncio.sleep(1)
+                peak = max(peak, memory())
+            release.set()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return opened, failed, peak, elapsed
+
+
+def server_memory(server):
+    """
+    Memory of a server process and its workers as their summed PSS: pages the workers still share
+    with the master since the fork count once, where summing RSS would count them for every worker.
+    """
+    total = 0
+    for process in [server, *server.children(recursive=True)]:
+        try:
+            total += process.memory_full_info().pss
+        except psutil.NoSuchProcess:
+            continue
+    return total
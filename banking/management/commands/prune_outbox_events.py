@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from banking.models import OutboxEvent
+from utils.tools import snowflake
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete stream events older than --hours. They are only kept so that reconnecting clients can catch up; "
+        "run this periodically, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=float, default=24)
+
+    def handle(self, *args, **kwargs):
+        # Snowflake ids start with their creation time, so the cut-off is a primary key range.
+        cutoff = snowflake.first_id_at(time.time() - kwargs["hours"] * 3600)
+        deleted, _ = OutboxEvent.objects.filter(id__lt=cutoff).delete()
+        self.stdout.write(f"Deleted {deleted} events")
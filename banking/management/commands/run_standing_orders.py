@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand
+from banking.standing_orders import STANDING_ORDER_BATCH_SIZE, run_due_orders
+from utils.background import get_executor
+from utils.tools import use_batch_worker_ids
+
+
+class Command(BaseCommand):
+    help = (
+        "Execute due standing orders. Any number of these can run at once, on one machine or several: "
+        "each claims its own batches with SELECT ... FOR UPDATE SKIP LOCKED"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=STANDING_ORDER_BATCH_SIZE)
+        parser.add_argument(
+            "--interval", type=float, default=0,
+            help="Keep running, checking for due orders every this many seconds (default: run once and exit)",
+        )
+        parser.add_argument("--no-alerts", action="store_true", help="Don't email transfer alerts")
+
+    def handle(self, *args, **kwargs):
+        use_batch_worker_ids()
+        try:
+            while True:
+                started = time.perf_counter()
+                succeeded, failed = run_due_orders(kwargs["batch_size"], not kwargs["no_alerts"])
+                if succeeded or failed:
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f"{succeeded} payments made, {failed} failed in {elapsed:.1f}s "
+                        f"({(succeeded + failed) / elapsed:.0f} orders/s)"
+                    )
+                if not kwargs["interval"]:
+                    break
+                time.sleep(kwargs["interval"])
+        finally:
+            # Alerts are sent from the background pool; let them finish before exiting.
+            get_executor().shutdown(wait=True)
@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter, so it sees exactly what a cold gunicorn worker imports:
+# settings, apps and models, then the URLconf with every view module.
+BOOT_SCRIPT = """
+import json, os, resource, sys, time
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+stages = [("interpreter", 0.0, rss_mb())]
+started = time.perf_counter()
+import django
+django.setup()
+stages.append(("django.setup()", time.perf_counter() - started, rss_mb()))
+from django.urls import get_resolver
+get_resolver().url_patterns
+stages.append(("URLconf and views", time.perf_counter() - started, rss_mb()))
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+stages.append(("WSGI application", time.perf_counter() - started, rss_mb()))
+print(json.dumps(stages))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Boot the project in a fresh interpreter the way a worker does, and report import time "
+        "per module (python -X importtime) and resident memory after each boot stage"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=25, help="Number of modules and packages to list")
+
+    def handle(self, *args, **kwargs):
+        top = kwargs["top"]
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", BOOT_SCRIPT],
+            capture_output=True,
+            text=True,
+            env=os.environ.copy(),
+        )
+        if result.returncode != 0:
+            self.stderr.write(result.stderr[-2000:])
+            return
+
+        modules = []
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "imported package" in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            modules.append((name.strip(), int(self_us), int(cumulative_us)))
+
+        packages = defaultdict(int)
+        for name, self_us, _ in modules:
+            packages[name.split(".")[0]] += self_us
+
+        self.stdout.write(f"Modules imported: {len(modules)}")
+        self.stdout.write(f"Total import time: {sum(m[1] for m in modules) / 1000:.1f}ms\n")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Top {top} packages by import time"))
+        for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+            self.stdout.write(f"{self_us / 1000:>9.1f}ms  {package}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nTop {top} modules by cumulative import time"))
+        for name, _, cumulative_us in sorted(modules, key=lambda m: m[2], reverse=True)[:top]:
+            self.stdout.write(f"{cumulative_us / 1000:>9.1f}ms  {name}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\nBoot stages"))
+        previous_rss = None
+        for stage, elapsed, rss in json.loads(result.stdout.strip().splitlines()[-1]):
+            delta = f" (+{rss - previous_rss:.1f}MB)" if previous_rss is not None else ""
+            self.stdout.write(f"{elapsed * 1000:>9.1f}ms  {rss:>7.1f}MB RSS{delta}  {stage}")
+            previous_rss = rss
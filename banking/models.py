@@ -1,7 +1,8 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth import get_user_model
 from utils.tools import generate_transaction_id, generate_account_number, BaseModel
-from .constants import ACCOUNT_TYPE, TRANSACTION_TYPE, TRANSACTION_MODE
+from .constants import ACCOUNT_TYPE, TRANSACTION_TYPE, TRANSACTION_MODE, STANDING_ORDER_FREQUENCY, STANDING_ORDER_STATUS, OUTBOX_EVENT_TYPE
 
 # Create your models here.
 
@@ -20,6 +21,7 @@ class Account(BaseModel):
 
     class Meta:
         db_table = "Accounts"
+        indexes = [models.Index(fields=["date_created"], name="account_date_created_idx")]
         abstract = False
     
     def assign_account_number(self, *args, **kwargs):
@@ -63,6 +65,13 @@ class Transaction(BaseModel):
 
     class Meta:
         db_table = "Transactions"
+        # timestamp backs the admin date hierarchy and ordering; the composite ones serve
+        # per-account history newest first.
+        indexes = [
+            models.Index(fields=["timestamp"], name="transaction_timestamp_idx"),
+            models.Index(fields=["from_account", "-timestamp"], name="transaction_from_ts_idx"),
+            models.Index(fields=["to_account", "-timestamp"], name="transaction_to_ts_idx"),
+        ]
         abstract = False
         
     def save(self, *args, **kwargs):
@@ -80,4 +89,105 @@ class Ledger(BaseModel):
 
     class Meta:
         db_table = "Ledger"
+        # Latest entries of an account first; ids are snowflakes, so they follow creation time.
+        indexes = [models.Index(fields=["account", "-id"], name="ledger_account_id_idx")]
         abstract = False
+
+
+class InterestAccrual(BaseModel):
+    """
+    Progress of the interest run for one day and one partition of the accounts: the last account
+    credited, advanced in the same database transaction as the credits themselves.
+    """
+    accrual_date = models.DateField()
+    partition = models.PositiveIntegerField(default=0)
+    partitions = models.PositiveIntegerField(default=1)
+    last_account_id = models.BigIntegerField(default=0)
+    accounts_credited = models.PositiveIntegerField(default=0)
+    interest_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    completed = models.BooleanField(default=False)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "Interest Accruals"
+        abstract = False
+        constraints = [
+            models.UniqueConstraint(fields=["accrual_date", "partition"], name="interest_accrual_partition_unique")
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.accrual_date} - partition {self.partition + 1}/{self.partitions}"
+
+
+class TransferCounter(BaseModel):
+    """
+    Outgoing transfers of an account within one clock hour, so that limits are checked against a
+    day's worth of these rows rather than the account's whole transaction history.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="transfer_counters")
+    window_start = models.DateTimeField()
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "Transfer Counters"
+        abstract = False
+        constraints = [
+            models.UniqueConstraint(fields=["account", "window_start"], name="transfer_counter_window_unique")
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.account_id} - {self.window_start}"
+
+
+class StandingOrder(BaseModel):
+    """
+    A recurring transfer from the user to another account. The payment numbered `occurrence`
+    (counting from 0) falls due at first_run_at plus that many periods; next_run_at is when the
+    executor should next try, which is later than that while a failed payment waits for its retry.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="standing_orders")
+    to_account_number = models.BigIntegerField()
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    description = models.CharField(max_length=255, null=True, blank=True)
+    frequency = models.CharField(max_length=20, choices=STANDING_ORDER_FREQUENCY, default="MONTHLY")
+    first_run_at = models.DateTimeField()
+    end_date = models.DateField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STANDING_ORDER_STATUS, default="ACTIVE")
+    occurrence = models.PositiveIntegerField(default=0)
+    next_run_at = models.DateTimeField()
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True, default="")
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    # Set while an executor is running the order; see banking.standing_orders.
+    claim_token = models.UUIDField(null=True, editable=False)
+    claimed_until = models.DateTimeField(null=True, editable=False)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "Standing Orders"
+        abstract = False
+        indexes = [models.Index(fields=["status", "next_run_at"], name="standing_order_due_idx")]
+
+    def __str__(self) -> str:
+        return f"{self.amount} {self.frequency.lower()} to {self.to_account_number} - {self.user.full_name}"
+
+
+class OutboxEvent(BaseModel):
+    """
+    A transaction or balance event for a user's event stream, written in the same database
+    transaction as the change it describes, so an event exists exactly when the change committed.
+    Ids are snowflakes; streams resume from them via Last-Event-ID.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="outbox_events")
+    event_type = models.CharField(max_length=20, choices=OUTBOX_EVENT_TYPE)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "Outbox Events"
+        indexes = [models.Index(fields=["user", "id"], name="outbox_event_user_id_idx")]
+        abstract = False
+
+    def __str__(self) -> str:
+        return f"{self.event_type} for {self.user_id}"
@@ -1,20 +1,62 @@
+import logging
 from django.db import transaction
 from django.core.exceptions import ObjectDoesNotExist
+from utils.db_router import pin_to_primary
+from utils.logging import bind_log_context
+from .events import record_transfer_events
+from .limits import check_transfer_limits
 from .models import Account, Transaction, Ledger
+from .summary import invalidate_account_summaries
 
+logger = logging.getLogger(__name__)
 
-def transfer_funds(from_account, to_account_number, amount, description):
+
+def lock_transfer_accounts(from_user_id, to_account_number, from_account_number=None):
+    """
+    Locks the sender's and the recipient's accounts and returns them, in one query that locks in id
+    order. Anything else locking several accounts (interest accrual, other transfers) does so in id
+    order too, so they wait on each other instead of deadlocking. The owners come with the accounts
+    for the transfer's events, without being locked.
+
+    Only those two rows are locked. The sender's account is the one numbered `from_account_number`,
+    which can be left out when the sender has a single account.
+    """
+    to_account_number = int(to_account_number)
+    if from_account_number is None:
+        owned = list(Account.objects.filter(user_id=from_user_id).values_list("account_number", flat=True)[:2])
+        if len(owned) > 1:
+            raise ValueError("Choose which of your accounts to transfer from")
+        from_account_number = owned[0] if owned else None
+    else:
+        from_account_number = int(from_account_number)
+    accounts = {
+        account.account_number: account
+        for account in Account.objects.select_related("user")
+        .select_for_update(of=("self",))
+        .filter(account_number__in=[from_account_number, to_account_number])
+        .order_by("id")
+    }
+    from_account = accounts.get(from_account_number)
+    if from_account is None or from_account.user_id != from_user_id:
+        raise ValueError("Sender account doesn't exist")
+    to_account = accounts.get(to_account_number)
+    if to_account is None:
+        raise Account.DoesNotExist
+    return from_account, to_account
+
+
+def transfer_funds(from_user_id, to_account_number, amount, description, from_account_number=None):
     try:
         with transaction.atomic():
-            from_account = Account.objects.select_for_update().get(user=from_account)
+            from_account, to_account = lock_transfer_accounts(from_user_id, to_account_number, from_account_number)
             if from_account.current_balance < amount:
                 raise ValueError("Insufficient funds for transfer")
 
-            to_account = Account.objects.select_for_update().get(account_number=to_account_number)
-
-            if from_account.user == to_account.user:
+            if from_account.user_id == to_account.user_id:
                 raise ValueError("Cannot transfer funds to yourself")
 
+            check_transfer_limits(from_account, amount)
+
             debit_transaction = Transaction.objects.create(
                 transaction_type="DEBIT",
                 transaction_mode="MOBILE APP TRANSFER",
@@ -23,6 +65,7 @@ def transfer_funds(from_account, to_account_number, amount, description):
                 amount=amount,
                 description=description,
             )
+            bind_log_context(transaction_id=debit_transaction.transaction_id)
 
             from_account.current_balance -= amount
             from_account.save()
@@ -49,7 +92,21 @@ def transfer_funds(from_account, to_account_number, amount, description):
                 balance_after_transaction=to_account.current_balance,
             )
 
+            record_transfer_events(debit_transaction, credit_transaction, from_account, to_account)
+
+            sender_id, recipient_id = from_account.user_id, to_account.user_id
+            transaction.on_commit(lambda: pin_to_primary(sender_id, recipient_id))
+            # Robust: the transfer has committed, so a cache error must not turn it into a 500.
+            transaction.on_commit(lambda: invalidate_account_summaries(sender_id, recipient_id), robust=True)
+
     except ObjectDoesNotExist:
         raise ValueError("Recipient account doesn't exist")
 
+    logger.info(
+        "Transferred %s from account %s to account %s",
+        amount,
+        from_account.account_number,
+        to_account.account_number,
+        extra={"amount": amount, "credit_transaction_id": credit_transaction.transaction_id},
+    )
     return debit_transaction, credit_transaction
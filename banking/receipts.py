@@ -0,0 +1,151 @@
+"""Transaction receipt images, rendered once per transaction and kept in a bounded on-disk LRU cache"""
+
+import os
+import tempfile
+from functools import lru_cache
+from io import BytesIO
+from django.conf import settings
+from django.utils import timezone
+from utils.metrics import timed
+
+# Bump when the receipt layout changes, so cached receipts and client ETags are invalidated.
+RECEIPT_VERSION = 1
+
+BRAND_NAME = "Longman Technologies"
+BRAND_COLOR = (0, 128, 0)
+WIDTH, HEIGHT = 600, 760
+
+
+@lru_cache(maxsize=None)
+def font(size):
+    from PIL import ImageFont
+
+    return ImageFont.load_default(size=size)
+
+
+def receipt_etag(transaction_id):
+    return f'"receipt-{transaction_id}-v{RECEIPT_VERSION}"'
+
+
+def account_label(account):
+    if account is None:
+        return BRAND_NAME
+    return f"{account.user.full_name} ({account.account_number})"
+
+
+@timed("image")
+def render_receipt(transaction):
+    """Renders a JPEG receipt for a transaction; from_account/to_account users should be preloaded."""
+    # Pillow is loaded on first render rather than at worker boot.
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", (WIDTH, HEIGHT), color="white")
+    draw = ImageDraw.Draw(img)
+    brand_font, title_font, label_font, value_font = font(30), font(22), font(16), font(18)
+
+    draw.rectangle((0, 0, WIDTH, 90), fill=BRAND_COLOR)
+    draw.text((WIDTH // 2, 45), BRAND_NAME, font=brand_font, fill="white", anchor="mm")
+    draw.text((WIDTH // 2, 130), "Transaction Receipt", font=title_font, fill="black", anchor="mm")
+    draw.text(
+        (WIDTH // 2, 185),
+        f"NGN {transaction.amount:,.2f}",
+        font=font(36),
+        fill=BRAND_COLOR,
+        anchor="mm",
+    )
+
+    local_timestamp = timezone.localtime(transaction.timestamp)
+    rows = [
+        ("Transaction Type", transaction.transaction_type.title()),
+        ("Transaction Mode", transaction.transaction_mode.title()),
+        ("Sender", account_label(transaction.from_account)),
+        ("Recipient", account_label(transaction.to_account)),
+        ("Description", transaction.description or "-"),
+        ("Date", local_timestamp.strftime("%A, %d %B, %Y")),
+        ("Time", local_timestamp.strftime("%H:%M:%S")),
+        ("Reference", str(transaction.transaction_id)),
+    ]
+    y = 240
+    for label, value in rows:
+        draw.text((40, y), label, font=label_font, fill=(110, 110, 110))
+        draw.text((40, y + 22), value[:55], font=value_font, fill="black")
+        draw.line((40, y + 52, WIDTH - 40, y + 52), fill=(220, 220, 220))
+        y += 60
+
+    draw.rectangle((0, HEIGHT - 40, WIDTH, HEIGHT), fill=BRAND_COLOR)
+    draw.text(
+        (WIDTH // 2, HEIGHT - 20), f"Thank you for banking with {BRAND_NAME}", font=label_font, fill="white", anchor="mm"
+    )
+
+    img_byte_array = BytesIO()
+    img.save(img_byte_array, format="JPEG", quality=85)
+    return img_byte_array.getvalue()
+
+
+class ReceiptCache:
+    """
+    Bounded on-disk cache of rendered receipts keyed by transaction_id. Transactions never change,
+    so entries never go stale; past max_entries the least recently used ones are evicted, down to
+    low_water of max_entries so the directory is only scanned once every so many sets. The count
+    of entries between scans is this process's own, so with several workers sharing the
+    directory it can briefly hold up to a batch per worker more than max_entries.
+    """
+
+    def __init__(self, directory, max_entries, low_water=0.9):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.low_water = min(max(int(max_entries * low_water), 1), max_entries)
+        # Entries as of the last scan plus those set since, None until the first scan.
+        self.entries = None
+
+    def path(self, transaction_id):
+        return os.path.join(self.directory, f"{transaction_id}-v{RECEIPT_VERSION}.jpg")
+
+    def get(self, transaction_id):
+        path = self.path(transaction_id)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # The mtime doubles as the "last used" stamp for LRU eviction.
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return data
+
+    def set(self, transaction_id, data):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path(transaction_id))
+        if self.entries is None or self.entries >= self.max_entries:
+            self.evict()
+        else:
+            self.entries += 1
+
+    def evict(self):
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".jpg")]
+        self.entries = len(entries)
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[: len(entries) - self.low_water]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+        self.entries = self.low_water
+
+
+receipt_cache = ReceiptCache(settings.RECEIPT_CACHE_DIR, settings.RECEIPT_CACHE_MAX_ENTRIES)
+
+
+def get_receipt(transaction):
+    data = receipt_cache.get(transaction.transaction_id)
+    if data is None:
+        data = render_receipt(transaction)
+        receipt_cache.set(transaction.transaction_id, data)
+    return data
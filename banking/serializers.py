@@ -1,8 +1,12 @@
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Transaction, Account
+from utils.values import Nested, ValuesSerializer
+from .models import StandingOrder, Transaction, Account
 
 
 class TransferSerializer(serializers.Serializer):
+    # Required when the sender has more than one account.
+    from_account_number = serializers.CharField(max_length=50, required=False)
     to_account_number = serializers.CharField(max_length=50)
     amount = serializers.DecimalField(max_digits=10, decimal_places=2)
     description = serializers.CharField(required=False, allow_null=True, allow_blank=True)
@@ -35,5 +39,107 @@ class TransactionSerializer(serializers.ModelSerializer):
             "timestamp"
         ]
         
+class AccountValuesSerializer(ValuesSerializer):
+    serializer_class = AccountSerializer
+    lookups = {"user": "user__full_name"}
+
+class TransactionValuesSerializer(ValuesSerializer):
+    """values()-driven TransactionSerializer for the transaction list's fast rendering mode."""
+    serializer_class = TransactionSerializer
+    relations = {
+        "from_account": Nested(AccountValuesSerializer),
+        "to_account": Nested(AccountValuesSerializer),
+    }
+
+class SummaryAccountSerializer(serializers.Serializer):
+    account_number = serializers.IntegerField()
+    account_type = serializers.CharField()
+    current_balance = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+class SummaryEntrySerializer(serializers.Serializer):
+    transaction_id = serializers.IntegerField(source="transaction__transaction_id")
+    transaction_type = serializers.CharField(source="transaction__transaction_type")
+    transaction_mode = serializers.CharField(source="transaction__transaction_mode")
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, source="transaction__amount")
+    description = serializers.CharField(source="transaction__description", allow_null=True)
+    timestamp = serializers.DateTimeField(source="transaction__timestamp")
+    account_number = serializers.IntegerField(source="account__account_number")
+    balance_after_transaction = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+class AccountSummarySerializer(serializers.Serializer):
+    """Documents the account-summary payload; the data itself is built from values() rows."""
+    full_name = serializers.CharField()
+    accounts = SummaryAccountSerializer(many=True)
+    recent_entries = SummaryEntrySerializer(many=True)
+
 class TransactionImageSerializer(serializers.Serializer):
-    pass
\ No newline at end of file
+    pass
+
+class StandingOrderSerializer(serializers.ModelSerializer):
+    pin = serializers.CharField(max_length=4, write_only=True, required=False)
+
+    class Meta:
+        model = StandingOrder
+        fields = [
+            "id",
+            "to_account_number",
+            "amount",
+            "description",
+            "frequency",
+            "first_run_at",
+            "end_date",
+            "status",
+            "next_run_at",
+            "attempts",
+            "last_error",
+            "last_run_at",
+            "date_created",
+            "pin",
+        ]
+        read_only_fields = ["next_run_at", "attempts", "last_error", "last_run_at", "date_created"]
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Amount must be greater than zero")
+        return value
+
+    def validate_first_run_at(self, value):
+        if self.instance is None and value < timezone.now():
+            raise serializers.ValidationError("The first payment must be in the future")
+        return value
+
+    def validate_status(self, value):
+        if value not in ("ACTIVE", "PAUSED"):
+            raise serializers.ValidationError("An order can only be set to ACTIVE or PAUSED")
+        return value
+
+    def validate_to_account_number(self, value):
+        account = Account.objects.filter(account_number=value).only("user_id").first()
+        if account is None:
+            raise serializers.ValidationError("Recipient account doesn't exist")
+        if account.user_id == self.context["request"].user.id:
+            raise serializers.ValidationError("Cannot transfer funds to yourself")
+        return value
+
+    def validate(self, attrs):
+        if self.instance is None and not attrs.get("pin"):
+            raise serializers.ValidationError({"pin": ["This field is required."]})
+        if self.instance is not None:
+            changed = [field for field in ("to_account_number", "frequency", "first_run_at") if field in attrs]
+            if changed:
+                raise serializers.ValidationError(
+                    {field: ["Create a new standing order to change the recipient or schedule"] for field in changed}
+                )
+        first_run_at = attrs.get("first_run_at", getattr(self.instance, "first_run_at", None))
+        end_date = attrs.get("end_date", getattr(self.instance, "end_date", None))
+        if end_date and first_run_at and end_date < timezone.localdate(first_run_at):
+            raise serializers.ValidationError({"end_date": ["The end date must not be before the first payment"]})
+        if (
+            end_date
+            and "end_date" in attrs
+            and self.instance is not None
+            and self.instance.status == "ACTIVE"
+            and end_date < timezone.localdate(self.instance.next_run_at)
+        ):
+            raise serializers.ValidationError({"end_date": ["The end date must not be before the next payment"]})
+        return attrs
@@ -0,0 +1,148 @@
+import calendar
+import logging
+import uuid
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from accounts.utils import send_email
+from utils.background import run_in_background
+from .constants import STANDING_ORDER_CLAIM_SECONDS, STANDING_ORDER_MAX_ATTEMPTS, STANDING_ORDER_RETRY_SECONDS
+from .models import StandingOrder
+from .operations import transfer_funds
+from .utils import build_transfer_alert_emails
+
+logger = logging.getLogger(__name__)
+
+STANDING_ORDER_BATCH_SIZE = 100
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    year, month = value.year + month // 12, month % 12 + 1
+    return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+
+def occurrence_at(order, occurrence):
+    """When payment number `occurrence` of the order falls due, counted from first_run_at so dates don't drift."""
+    if order.frequency == "DAILY":
+        return order.first_run_at + timedelta(days=occurrence)
+    if order.frequency == "WEEKLY":
+        return order.first_run_at + timedelta(weeks=occurrence)
+    return add_months(timezone.localtime(order.first_run_at), occurrence)
+
+
+def next_occurrence(order, after):
+    """The first payment number of the order due at or after `after`, e.g. when a paused order is resumed."""
+    occurrence = order.occurrence
+    while occurrence_at(order, occurrence) < after:
+        occurrence += 1
+    return occurrence
+
+
+def past_end_date(order, occurrence):
+    """Whether payment number `occurrence` of the order falls after its end date."""
+    return bool(order.end_date) and timezone.localdate(occurrence_at(order, occurrence)) > order.end_date
+
+
+def claim_due_orders(token, batch_size=STANDING_ORDER_BATCH_SIZE):
+    """
+    Claims up to `batch_size` due orders for the executor identified by `token` and returns their ids.
+    SKIP LOCKED lets concurrent executors claim disjoint batches without waiting on each other; a
+    claim lapses after STANDING_ORDER_CLAIM_SECONDS so orders of an executor that died are picked up.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        order_ids = list(
+            StandingOrder.objects.select_for_update(skip_locked=True)
+            .filter(status="ACTIVE", next_run_at__lte=now)
+            .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now))
+            .order_by("next_run_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        StandingOrder.objects.filter(id__in=order_ids).update(
+            claim_token=token, claimed_until=now + timedelta(seconds=STANDING_ORDER_CLAIM_SECONDS)
+        )
+    return order_ids
+
+
+def schedule_next_payment(order):
+    order.occurrence += 1
+    order.attempts = 0
+    order.next_run_at = occurrence_at(order, order.occurrence)
+    if past_end_date(order, order.occurrence):
+        order.status = "COMPLETED"
+
+
+def send_alerts(debit_transaction, credit_transaction, amount, description):
+    for email in build_transfer_alert_emails(debit_transaction, credit_transaction, amount, description):
+        send_email(**email)
+
+
+def execute_order(order_id, token, send_alerts_on_success=True):
+    """
+    Makes the order's due payment through transfer_funds. The payment and the order's next date are
+    committed together, and only while `token` still holds the claim, so a payment can't be made
+    twice even when a slow executor's claim has been taken over. An order whose due payment falls
+    after its end date is completed without paying. Returns True on success, False when the payment
+    failed (it is retried later), None when the claim was lost or the order had ended.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        order = (
+            StandingOrder.objects.select_for_update()
+            .filter(id=order_id, claim_token=token, status="ACTIVE")
+            .first()
+        )
+        if order is None:
+            return None
+        if past_end_date(order, order.occurrence):
+            order.status = "COMPLETED"
+            order.claim_token = None
+            order.claimed_until = None
+            order.save()
+            return None
+        try:
+            with transaction.atomic():
+                debit_transaction, credit_transaction = transfer_funds(
+                    order.user_id, order.to_account_number, order.amount, order.description or ""
+                )
+        except Exception as e:
+            if not isinstance(e, ValueError):
+                logger.exception("Standing order %s failed", order.id)
+            order.attempts += 1
+            order.last_error = str(e)[:255]
+            if order.attempts >= STANDING_ORDER_MAX_ATTEMPTS:
+                # This payment is given up on; the order carries on from its next date.
+                schedule_next_payment(order)
+            else:
+                order.next_run_at = now + timedelta(seconds=STANDING_ORDER_RETRY_SECONDS * 2 ** (order.attempts - 1))
+            succeeded = False
+        else:
+            order.last_run_at = now
+            order.last_error = ""
+            schedule_next_payment(order)
+            if send_alerts_on_success:
+                amount, description = order.amount, order.description or ""
+                transaction.on_commit(
+                    lambda: run_in_background(send_alerts, debit_transaction, credit_transaction, amount, description)
+                )
+            succeeded = True
+        order.claim_token = None
+        order.claimed_until = None
+        order.save()
+    return succeeded
+
+
+def run_due_orders(batch_size=STANDING_ORDER_BATCH_SIZE, send_alerts_on_success=True):
+    """Claims and executes batches of due orders until none are left. Returns (succeeded, failed) counts."""
+    token = uuid.uuid4()
+    succeeded = failed = 0
+    while order_ids := claim_due_orders(token, batch_size):
+        for order_id in order_ids:
+            result = execute_order(order_id, token, send_alerts_on_success)
+            if result:
+                succeeded += 1
+            elif result is False:
+                failed += 1
+    return succeeded, failed
@@ -0,0 +1,117 @@
+"""
+Server-sent event stream of a user's transaction and balance events, as a plain ASGI app.
+
+It is routed in controller/asgi.py ahead of Django because a stream stays open indefinitely:
+Django's ASGI handler keeps a thread per request for its synchronous parts, so every connected
+client would hold an OS thread. Here an idle stream only costs a queue and a couple of tasks.
+"""
+
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from utils.events import format_event, get_broker
+from .events import to_event
+from .models import OutboxEvent
+
+EVENT_STREAM_PATH = "/api/v1/events"
+
+
+def authenticate(authorization):
+    """The id of the user the Bearer token in `authorization` belongs to."""
+    close_old_connections()
+    authentication = JWTAuthentication()
+    raw_token = authentication.get_raw_token(authorization)
+    if raw_token is None:
+        raise AuthenticationFailed("Authentication credentials were not provided.")
+    return authentication.get_user(authentication.get_validated_token(raw_token)).id
+
+
+def get_missed_events(user_id, last_event_id):
+    close_old_connections()
+    missed = OutboxEvent.objects.filter(user_id=user_id, id__gt=last_event_id).order_by("id")
+    return [to_event(outbox_event) for outbox_event in missed[: settings.EVENT_REPLAY_LIMIT]]
+
+
+async def send_error(send, message, status_code):
+    body = json.dumps({"status": status_code, "Success": False, "message": message}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def event_stream(scope, receive, send):
+    """
+    GET api/v1/events with a Bearer token. Sends a `transaction` event for every transfer or credit
+    on the user's accounts and a `balance` event with the new balance. A client reconnecting with
+    the Last-Event-ID header first gets the events it missed.
+    """
+    if scope["method"] != "GET":
+        return await send_error(send, f'Method "{scope["method"]}" not allowed.', 405)
+    headers = dict(scope["headers"])
+    # Not thread-sensitive: these run on the shared executor rather than a thread of their own.
+    try:
+        user_id = await sync_to_async(authenticate, thread_sensitive=False)(headers.get(b"authorization", b""))
+    except (AuthenticationFailed, InvalidToken) as e:
+        # InvalidToken carries a dict of details; its "detail" entry is the message.
+        detail = e.detail.get("detail", e.detail) if isinstance(e.detail, dict) else e.detail
+        return await send_error(send, str(detail), 401)
+    last_event_id = headers.get(b"last-event-id", b"").decode("latin-1")
+
+    broker = get_broker()
+    # Subscribed before replaying, so nothing committed in between is missed.
+    subscription = broker.subscribe(user_id)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    # Stops nginx from buffering the stream.
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        missed = []
+        if last_event_id.isdigit():
+            missed = await sync_to_async(get_missed_events, thread_sensitive=False)(user_id, int(last_event_id))
+        replayed = {event.id for event in missed}
+        body = ": connected\n\n" + "".join(format_event(event) for event in missed)
+        while not disconnected.done():
+            await send({"type": "http.response.body", "body": body.encode(), "more_body": True})
+            if subscription.overflowed:
+                break
+            next_event = asyncio.ensure_future(subscription.get(settings.EVENT_HEARTBEAT_SECONDS))
+            await asyncio.wait([next_event, disconnected], return_when=asyncio.FIRST_COMPLETED)
+            if not next_event.done():
+                next_event.cancel()
+                break
+            event = next_event.result()
+            if event is None:
+                body = ": keep-alive\n\n"
+            elif event.id in replayed:
+                body = ""
+            else:
+                body = format_event(event)
+        if not disconnected.done():
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        disconnected.cancel()
+        broker.unsubscribe(subscription)
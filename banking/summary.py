@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.cache import cache
+from .models import Account, Ledger
+from .serializers import SummaryAccountSerializer, SummaryEntrySerializer
+
+
+def _version_key(user_id):
+    return f"account-summary-version:{user_id}"
+
+
+def _summary_key(user_id, version):
+    return f"account-summary:{user_id}:{version}"
+
+
+def _summary_version(user_id):
+    """
+    The user's current summary version. Summaries are cached under it and invalidating moves it on,
+    so a summary built from data read before a change can't be cached as current after it.
+    """
+    cache.add(_version_key(user_id), 1, timeout=None)
+    return cache.get(_version_key(user_id), 1)
+
+
+def build_account_summary(user_id):
+    """
+    The user's account balances and latest ledger entries as JSON-ready data, in two queries.
+    Ledger ids are snowflakes, so the newest entries are the ones with the highest ids.
+    """
+    accounts = Account.objects.filter(user_id=user_id).order_by("date_created").values(
+        "account_number", "account_type", "current_balance"
+    )
+    entries = (
+        Ledger.objects.filter(account__user_id=user_id)
+        .order_by("-id")
+        .values(
+            "transaction__transaction_id",
+            "transaction__transaction_type",
+            "transaction__transaction_mode",
+            "transaction__amount",
+            "transaction__description",
+            "transaction__timestamp",
+            "account__account_number",
+            "balance_after_transaction",
+        )[: settings.ACCOUNT_SUMMARY_ENTRIES]
+    )
+    return {
+        "accounts": SummaryAccountSerializer(accounts, many=True).data,
+        "recent_entries": SummaryEntrySerializer(entries, many=True).data,
+    }
+
+
+def get_account_summary(user_id):
+    """The cached summary, built and cached on a miss."""
+    key = _summary_key(user_id, _summary_version(user_id))
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_account_summary(user_id)
+        cache.set(key, summary, settings.ACCOUNT_SUMMARY_CACHE_SECONDS)
+    return summary
+
+
+def invalidate_account_summaries(*user_ids):
+    for user_id in filter(None, user_ids):
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            # No version yet (or it was evicted): nothing cached under it can be read again anyway.
+            cache.add(_version_key(user_id), 1, timeout=None)
@@ -1,3 +1,548 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import csv
+import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import OperationalError, connection, connections, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.models import User
+from utils import events, exports
+from utils.exports import iter_csv
+from . import interest, summary
+from .events import OutboxPollingBackend
+from .constants import TRANSFER_LIMITS
+from .exports import LEDGER_EXPORT_FIELDS
+from .limits import check_transfer_limits
+from .models import Account, Ledger, OutboxEvent, StandingOrder, Transaction, TransferCounter
+from .operations import transfer_funds
+from .receipts import ReceiptCache
+from .standing_orders import execute_order
+from .streams import EVENT_STREAM_PATH, event_stream
+from .summary import build_account_summary, get_account_summary, invalidate_account_summaries
 
-# Create your tests here.
+
+def create_account(email, balance="20000.00", account_type="SAVINGS"):
+    user = User.objects.create_user(email=email, full_name=email.split("@")[0].title(), password="pass12345")
+    return Account.objects.create(user=user, current_balance=Decimal(balance), account_type=account_type)
+
+
+class StandingOrderEndDateTests(TestCase):
+    def setUp(self):
+        self.sender = create_account("sender@example.com")
+        self.recipient = create_account("recipient@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.sender.user)
+
+    def create_order(self, days_ago, occurrence, end_date, status="ACTIVE"):
+        first_run_at = timezone.now() - timedelta(days=days_ago)
+        return StandingOrder.objects.create(
+            user=self.sender.user,
+            to_account_number=self.recipient.account_number,
+            amount=Decimal("100.00"),
+            frequency="DAILY",
+            first_run_at=first_run_at,
+            end_date=end_date,
+            status=status,
+            occurrence=occurrence,
+            next_run_at=first_run_at + timedelta(days=occurrence),
+        )
+
+    def test_due_payment_after_end_date_completes_the_order_without_paying(self):
+        order = self.create_order(days_ago=10, occurrence=9, end_date=timezone.localdate() - timedelta(days=2))
+        token = uuid.uuid4()
+        StandingOrder.objects.filter(id=order.id).update(claim_token=token)
+
+        self.assertIsNone(execute_order(order.id, token, send_alerts_on_success=False))
+
+        order.refresh_from_db()
+        self.sender.refresh_from_db()
+        self.assertEqual(order.status, "COMPLETED")
+        self.assertIsNone(order.claim_token)
+        self.assertEqual(self.sender.current_balance, Decimal("20000.00"))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_last_payment_on_end_date_is_made(self):
+        order = self.create_order(days_ago=3, occurrence=3, end_date=timezone.localdate())
+        token = uuid.uuid4()
+        StandingOrder.objects.filter(id=order.id).update(claim_token=token)
+
+        self.assertTrue(execute_order(order.id, token, send_alerts_on_success=False))
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, "COMPLETED")
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_end_date_before_next_payment_is_rejected(self):
+        order = self.create_order(days_ago=1, occurrence=3, end_date=None)
+
+        response = self.client.patch(
+            f"/api/v1/standing-orders/{order.id}", {"end_date": str(timezone.localdate())}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("end_date", response.json())
+
+    def test_resuming_past_end_date_completes_the_order(self):
+        order = self.create_order(days_ago=10, occurrence=1, end_date=timezone.localdate() - timedelta(days=2), status="PAUSED")
+
+        response = self.client.patch(f"/api/v1/standing-orders/{order.id}", {"status": "ACTIVE"}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "COMPLETED")
+
+
+def database_error(pgcode):
+    """An OperationalError as Django raises it, wrapping a driver error with the given SQLSTATE."""
+    cause = Exception("could not serialize access")
+    cause.pgcode = pgcode
+    error = OperationalError(*cause.args)
+    error.__cause__ = cause
+    return error
+
+
+class TransferLockingTests(TestCase):
+    def test_accounts_are_locked_in_id_order_whichever_sends(self):
+        first = create_account("first@example.com")
+        second = create_account("second@example.com")
+        for sender, recipient in ((first, second), (second, first)):
+            with CaptureQueriesContext(connection) as queries:
+                transfer_funds(sender.user_id, recipient.account_number, Decimal("10.00"), "")
+            locking = [query["sql"] for query in queries if "FOR UPDATE" in query["sql"]]
+            self.assertEqual(len(locking), 1)
+            self.assertIn('ORDER BY "Accounts"."id" ASC FOR UPDATE', locking[0])
+        first.refresh_from_db()
+        self.assertEqual(first.current_balance, Decimal("20000.00"))
+
+    def test_unknown_recipient(self):
+        sender = create_account("sender@example.com")
+        with self.assertRaisesMessage(ValueError, "Recipient account doesn't exist"):
+            transfer_funds(sender.user_id, 1, Decimal("10.00"), "")
+
+    def test_sender_with_several_accounts_names_the_account(self):
+        savings = create_account("sender@example.com")
+        current = Account.objects.create(user=savings.user, current_balance=Decimal("50.00"), account_type="CURRENT")
+        recipient = create_account("recipient@example.com")
+
+        with self.assertRaisesMessage(ValueError, "Choose which of your accounts to transfer from"):
+            transfer_funds(savings.user_id, recipient.account_number, Decimal("10.00"), "")
+        transfer_funds(savings.user_id, recipient.account_number, Decimal("10.00"), "", str(current.account_number))
+
+        savings.refresh_from_db()
+        current.refresh_from_db()
+        self.assertEqual(savings.current_balance, Decimal("20000.00"))
+        self.assertEqual(current.current_balance, Decimal("40.00"))
+
+    def test_sender_account_must_be_their_own(self):
+        sender = create_account("sender@example.com")
+        recipient = create_account("recipient@example.com")
+        with self.assertRaisesMessage(ValueError, "Sender account doesn't exist"):
+            transfer_funds(sender.user_id, sender.account_number, Decimal("10.00"), "", recipient.account_number)
+
+
+class TransferRowLockTests(TransactionTestCase):
+    def test_only_the_two_accounts_are_locked(self):
+        savings = create_account("sender@example.com")
+        current = Account.objects.create(user=savings.user, current_balance=Decimal("50.00"), account_type="CURRENT")
+        recipient = create_account("recipient@example.com")
+        locked = {}
+
+        def is_locked(account):
+            try:
+                with transaction.atomic():
+                    Account.objects.select_for_update(nowait=True).get(pk=account.pk)
+                return False
+            except OperationalError:
+                return True
+            finally:
+                connection.close()
+
+        def probe(account, amount):
+            # Runs while the transfer holds its locks; other connections try to take them.
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                for name, other in (("savings", savings), ("current", current), ("recipient", recipient)):
+                    locked[name] = executor.submit(is_locked, other).result()
+
+        with mock.patch("banking.operations.check_transfer_limits", side_effect=probe):
+            transfer_funds(savings.user_id, recipient.account_number, Decimal("10.00"), "", savings.account_number)
+
+        self.assertEqual(locked, {"savings": True, "current": False, "recipient": True})
+
+
+class InterestRetryTests(TestCase):
+    def setUp(self):
+        self.account = create_account("saver@example.com", balance="36500.00")
+        self.accrue_chunk = interest.accrue_chunk
+        patcher = mock.patch.object(interest, "ACCRUAL_RETRY_SECONDS", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def failing_once(self, error):
+        calls = []
+
+        def accrue_chunk(*args, **kwargs):
+            calls.append(None)
+            if len(calls) == 1:
+                raise error
+            return self.accrue_chunk(*args, **kwargs)
+
+        return accrue_chunk
+
+    def test_chunk_aborted_by_a_deadlock_is_retried(self):
+        with mock.patch.object(interest, "accrue_chunk", self.failing_once(database_error("40P01"))):
+            checkpoint = interest.accrue_interest(timezone.localdate())
+
+        self.assertTrue(checkpoint.completed)
+        self.assertEqual(checkpoint.accounts_credited, 1)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.current_balance, Decimal("36504.00"))
+
+    def test_other_database_errors_are_raised(self):
+        with mock.patch.object(interest, "accrue_chunk", self.failing_once(database_error("53300"))):
+            with self.assertRaises(OperationalError):
+                interest.accrue_interest(timezone.localdate())
+
+
+def summary_balance(user_id):
+    return Decimal(get_account_summary(user_id)["accounts"][0]["current_balance"])
+
+
+class AccountSummaryCacheTests(TestCase):
+    def setUp(self):
+        self.sender = create_account("sender@example.com")
+        self.recipient = create_account("recipient@example.com")
+        self.addCleanup(cache.clear)
+
+    def test_transfer_invalidates_both_summaries(self):
+        get_account_summary(self.sender.user_id)
+        get_account_summary(self.recipient.user_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transfer_funds(self.sender.user_id, self.recipient.account_number, Decimal("10.00"), "")
+
+        self.assertEqual(summary_balance(self.sender.user_id), Decimal("19990.00"))
+        self.assertEqual(summary_balance(self.recipient.user_id), Decimal("20010.00"))
+
+    def test_summary_built_before_a_change_is_not_served_after_it(self):
+        version = summary._summary_version(self.sender.user_id)
+        stale = build_account_summary(self.sender.user_id)
+        Account.objects.filter(id=self.sender.id).update(current_balance=Decimal("500.00"))
+        invalidate_account_summaries(self.sender.user_id)
+        # A slow reader caching what it read before the change, after the change was invalidated.
+        cache.set(summary._summary_key(self.sender.user_id, version), stale)
+
+        self.assertEqual(summary_balance(self.sender.user_id), Decimal("500.00"))
+
+    def test_cache_errors_after_commit_do_not_fail_the_transfer(self):
+        with mock.patch.object(cache, "incr", side_effect=ConnectionError("cache is down")):
+            with self.captureOnCommitCallbacks(execute=True):
+                transfer_funds(self.sender.user_id, self.recipient.account_number, Decimal("10.00"), "")
+
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.current_balance, Decimal("19990.00"))
+
+
+# The admin pages link static files, which have no manifest until collectstatic has run.
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class AdminQueryCountTests(TestCase):
+    """The admin's list and change pages run a fixed number of queries, however many rows they show."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser(email="admin@example.com", full_name="Admin")
+        accounts = [create_account(f"customer{i}@example.com") for i in range(4)]
+        for i in range(12):
+            from_account, to_account = accounts[i % 4], accounts[(i + 1) % 4]
+            cls.transaction = Transaction.objects.create(
+                transaction_type="DEBIT", from_account=from_account, to_account=to_account, amount=Decimal("1.00")
+            )
+            cls.entry = Ledger.objects.create(
+                account=from_account, transaction=cls.transaction, balance_after_transaction=Decimal("19999.00")
+            )
+        cls.account = accounts[0]
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def assert_page_queries(self, view, queries, *args):
+        with self.assertNumQueries(queries):
+            response = self.client.get(reverse(f"admin:banking_{view}", args=args))
+        self.assertEqual(response.status_code, 200)
+
+    def test_account_pages(self):
+        self.assert_page_queries("account_changelist", 7)
+        self.assert_page_queries("account_change", 8, self.account.pk)
+
+    def test_transaction_pages(self):
+        self.assert_page_queries("transaction_changelist", 7)
+        self.assert_page_queries("transaction_change", 12, self.transaction.pk)
+
+    def test_ledger_pages(self):
+        self.assert_page_queries("ledger_changelist", 7)
+        self.assert_page_queries("ledger_change", 11, self.entry.pk)
+
+
+class TransferLimitTests(TestCase):
+    def setUp(self):
+        self.account = create_account("saver@example.com", balance="500000.00", account_type="FIXED DEPOSIT")
+        # FIXED DEPOSIT: 100000.00 and 5 transfers a day, 2 transfers an hour.
+        self.now = timezone.make_aware(datetime(2026, 3, 10, 9, 15))
+
+    def send(self, amount="100.00", hours=0, minutes=0):
+        check_transfer_limits(self.account, Decimal(amount), now=self.now + timedelta(hours=hours, minutes=minutes))
+
+    def test_hourly_count(self):
+        self.send()
+        self.send(minutes=30)
+        with self.assertRaisesMessage(ValueError, "2 transfers an hour"):
+            self.send(minutes=44)
+        # 10:00 starts a new hour.
+        self.send(minutes=45)
+
+    def test_daily_count(self):
+        for hours in (0, 0, 1, 1, 2):
+            self.send(hours=hours)
+        with self.assertRaisesMessage(ValueError, "5 transfers a day"):
+            self.send(hours=3)
+
+    def test_daily_amount(self):
+        self.send("60000.00")
+        with self.assertRaisesMessage(ValueError, "daily transfer limit of 100000.00"):
+            self.send("40000.01", hours=1)
+        self.send("40000.00", hours=1)
+
+    def test_transfers_leave_the_window_after_a_day(self):
+        self.send("60000.00")
+        # At 8:59 the next day the 9:00 counter still counts, from 10:00 it no longer does.
+        with self.assertRaises(ValueError):
+            self.send("60000.00", hours=23, minutes=44)
+        self.send("60000.00", hours=24, minutes=45)
+        self.assertEqual(TransferCounter.objects.filter(account=self.account).count(), 1)
+
+    def test_failed_transfer_is_not_counted(self):
+        recipient = create_account("recipient@example.com")
+        with mock.patch("banking.operations.record_transfer_events", side_effect=RuntimeError("events are down")):
+            with self.assertRaises(RuntimeError):
+                transfer_funds(self.account.user_id, recipient.account_number, Decimal("100.00"), "")
+
+        self.assertFalse(TransferCounter.objects.exists())
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.current_balance, Decimal("500000.00"))
+
+    def test_account_types_without_limits(self):
+        with mock.patch.dict(TRANSFER_LIMITS):
+            del TRANSFER_LIMITS["FIXED DEPOSIT"]
+            with self.assertNumQueries(0):
+                for _ in range(10):
+                    self.send("100000.00")
+        self.assertFalse(TransferCounter.objects.exists())
+
+
+class ReceiptCacheTests(TestCase):
+    def test_evicts_least_recently_used_in_batches(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        receipt_cache = ReceiptCache(directory, max_entries=100)
+        receipt_cache.set(0, b"receipt")
+        with mock.patch("os.scandir", wraps=os.scandir) as scandir:
+            for transaction_id in range(1, 300):
+                # Kept in use, so eviction passes it over.
+                receipt_cache.get(0)
+                receipt_cache.set(transaction_id, b"receipt")
+
+        self.assertLessEqual(len(os.listdir(directory)), 100)
+        self.assertIsNotNone(receipt_cache.get(0))
+        self.assertIsNotNone(receipt_cache.get(299))
+        # Once every 10 sets, from 90 entries back up to 100, rather than on every set.
+        self.assertLess(scandir.call_count, 30)
+
+
+class CsvExportTests(TestCase):
+    def test_text_that_would_run_as_a_formula_is_escaped(self):
+        row = ['=HYPERLINK("http://example.com")', "@SUM(A1)", "+1", "-1", "Rent", Decimal("-10.00")]
+
+        lines = list(iter_csv(["a", "b", "c", "d", "e", "f"], [row]))
+
+        self.assertEqual(
+            next(csv.reader([lines[1]])),
+            ["'=HYPERLINK(\"http://example.com\")", "'@SUM(A1)", "'+1", "'-1", "Rent", "-10.00"],
+        )
+
+
+class ExportStreamingTests(TestCase):
+    rows = 3000
+
+    @classmethod
+    def setUpTestData(cls):
+        account = create_account("saver@example.com")
+        payer = create_account("payer@example.com")
+        transactions = Transaction.objects.bulk_create(
+            Transaction(transaction_type="CREDIT", from_account=payer, to_account=account, amount=Decimal("1.00"))
+            for _ in range(cls.rows)
+        )
+        Ledger.objects.bulk_create(
+            Ledger(account=account, transaction=credit, balance_after_transaction=Decimal("20001.00"))
+            for credit in transactions
+        )
+        cls.token = str(AccessToken.for_user(account.user))
+
+    async def test_large_range_streams_under_asgi(self):
+        with mock.patch("utils.exports.csv_cell", wraps=exports.csv_cell) as csv_cell:
+            response = await AsyncClient().get(
+                "/api/v1/statement-of-account/export", headers={"Authorization": f"Bearer {self.token}"}
+            )
+            self.assertTrue(response.is_async)
+            content = aiter(response.streaming_content)
+            first = await anext(content)
+            # The first piece went out once a buffer's worth of rows was written, not the whole export.
+            self.assertLess(csv_cell.call_count // len(LEDGER_EXPORT_FIELDS), self.rows // 2)
+            rest = [piece async for piece in content]
+
+        self.assertEqual(len(b"".join([first, *rest]).decode().splitlines()), self.rows + 1)
+
+
+@contextlib.asynccontextmanager
+async def database_thread():
+    """
+    Runs the thread_sensitive=False work of the streams and the polling backend on a single thread
+    of the loop's, whose database connection is closed afterwards; the shared executor's threads
+    would otherwise keep theirs open past the test.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1)
+    loop.set_default_executor(executor)
+    try:
+        yield
+    finally:
+        await loop.run_in_executor(executor, connections.close_all)
+
+
+class EventStreamClient:
+    """Drives banking.streams.event_stream as an ASGI server would, collecting what it sends."""
+
+    def __init__(self, token, last_event_id=None):
+        headers = [(b"authorization", f"Bearer {token}".encode())]
+        if last_event_id is not None:
+            headers.append((b"last-event-id", str(last_event_id).encode()))
+        self.scope = {"type": "http", "method": "GET", "path": EVENT_STREAM_PATH, "headers": headers}
+        self.disconnect = asyncio.Event()
+        self.messages = []
+        self.received = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.messages.append(message)
+        self.received.set()
+
+    @property
+    def body(self):
+        return b"".join(message.get("body", b"") for message in self.messages[1:]).decode()
+
+    async def __aenter__(self):
+        self.task = asyncio.ensure_future(event_stream(self.scope, self.receive, self.send))
+        await self.wait_for(": connected")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.disconnect.set()
+        await asyncio.wait_for(self.task, 5)
+
+    async def wait_for(self, text, timeout=5):
+        async with asyncio.timeout(timeout):
+            while text not in self.body:
+                self.received.clear()
+                await self.received.wait()
+
+
+@override_settings(EVENT_POLL_SECONDS=0.05, EVENT_HEARTBEAT_SECONDS=60)
+class EventStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.sender = create_account("sender@example.com")
+        self.recipient = create_account("recipient@example.com")
+        self.token = str(AccessToken.for_user(self.recipient.user))
+        # A broker of the test's own, since its listener task belongs to the test's event loop.
+        patcher = mock.patch.object(events, "_broker", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def transfer(self, amount):
+        return transfer_funds(self.sender.user_id, self.recipient.account_number, Decimal(amount), "")
+
+    async def test_events_are_delivered_to_the_users_stream(self):
+        async with database_thread(), EventStreamClient(self.token) as client:
+            _, credit = await sync_to_async(self.transfer)("10.00")
+            await client.wait_for("event: balance")
+
+        self.assertEqual(client.messages[0]["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream"), client.messages[0]["headers"])
+        self.assertIn(f'"transaction_id": {credit.transaction_id}', client.body)
+        self.assertIn('"current_balance": "20010.00"', client.body)
+        # The sender's side of the transfer is not the recipient's business.
+        self.assertNotIn('"current_balance": "19990.00"', client.body)
+        self.assertIsNone(events.get_broker().listener)
+
+    async def test_reconnect_replays_missed_events(self):
+        await sync_to_async(self.transfer)("10.00")
+        await sync_to_async(self.transfer)("20.00")
+        seen, *missed = await sync_to_async(list)(
+            OutboxEvent.objects.filter(user=self.recipient.user).order_by("id").values_list("id", flat=True)
+        )
+
+        async with database_thread(), EventStreamClient(self.token, last_event_id=seen) as client:
+            pass
+
+        self.assertNotIn(f"id: {seen}\n", client.body)
+        self.assertEqual([line for line in client.body.splitlines() if line.startswith("id: ")], [f"id: {id}" for id in missed])
+        self.assertIn('"current_balance": "20030.00"', client.body)
+
+    async def test_invalid_token_is_rejected(self):
+        client = EventStreamClient("not-a-token")
+        async with database_thread():
+            await event_stream(client.scope, client.receive, client.send)
+
+        self.assertEqual(client.messages[0]["status"], 401)
+
+
+class OutboxPollingBackendTests(TransactionTestCase):
+    @override_settings(EVENT_POLL_SECONDS=0.01)
+    async def test_polls_only_for_users_with_an_open_stream(self):
+        sender = await sync_to_async(create_account)("sender@example.com")
+        recipient = await sync_to_async(create_account)("recipient@example.com")
+        await sync_to_async(transfer_funds)(sender.user_id, recipient.account_number, Decimal("10.00"), "")
+        backend, delivered, subscribed = OutboxPollingBackend(), [], []
+
+        with mock.patch.object(backend, "fetch", wraps=backend.fetch) as fetch:
+            async with database_thread():
+                listener = asyncio.ensure_future(backend.listen(delivered.append, lambda: subscribed))
+                await asyncio.sleep(0.05)
+                fetch.assert_not_called()
+
+                subscribed.append(recipient.user_id)
+                async with asyncio.timeout(5):
+                    while len(delivered) < 2:
+                        await asyncio.sleep(0.01)
+                listener.cancel()
+
+        self.assertEqual(fetch.call_args.args[1], [recipient.user_id])
+        self.assertEqual({event.user_id for event in delivered}, {recipient.user_id})
+        self.assertEqual(sorted(event.type for event in delivered), ["balance", "transaction"])
+
+    def test_backends_must_implement_listen(self):
+        with self.assertRaises(TypeError):
+            events.EventBackend()
@@ -5,13 +5,24 @@ from .views import (
                     UserTransactionListView, 
                     UserTransactionRetrieveView, 
                     StatementOfAccountPDFView, 
-                    TransactionImageView)
+                    StatementExportView,
+                    TransactionImageView,
+                    StandingOrderListCreateAPIView,
+                    StandingOrderDetailAPIView,
+                    AccountSummaryAPIView)
+from .async_views import AsyncTransferAPIView, AsyncStatementOfAccountView
 
 urlpatterns = [
     path("account-info", AccountInfoAPIView.as_view(), name="account-info"),
+    path("account-summary", AccountSummaryAPIView.as_view(), name="account-summary"),
     path("funds-transfer", TransferAPIView.as_view(), name="funds-transfer"),
+    path("funds-transfer/async", AsyncTransferAPIView.as_view(), name="funds-transfer-async"),
     path("transactions", UserTransactionListView.as_view(), name="user-transactions"),
     path("transactions/<int:transaction_id>", UserTransactionRetrieveView.as_view(), name="transaction-detail"),
     path("transactions/<int:transaction_id>/image", TransactionImageView.as_view(), name="transaction-image",),
     path("statement-of-account", StatementOfAccountPDFView.as_view(), name="send-account-statement"),
+    path("statement-of-account/export", StatementExportView.as_view(), name="export-account-statement"),
+    path("standing-orders", StandingOrderListCreateAPIView.as_view(), name="standing-orders"),
+    path("standing-orders/<int:id>", StandingOrderDetailAPIView.as_view(), name="standing-order-detail"),
+    path("statement-of-account/async", AsyncStatementOfAccountView.as_view(), name="send-account-statement-async"),
 ]
@@ -1,18 +1,29 @@
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import make_aware
+from django.template.loader import render_to_string
 from io import BytesIO
-from sib_api_v3_sdk.rest import ApiException
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Image, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-from reportlab.lib.units import inch
 from pathlib import Path
 from datetime import datetime
 import os
-import sib_api_v3_sdk
+import base64
+import logging
+from accounts.utils import EMAIL_API_HOST
+from utils.metrics import timed
+from .models import Ledger
 
+logger = logging.getLogger(__name__)
 
+
+@timed("pdf")
 def generate_ledger_pdf(ledger_entries, user, start_date, end_date):
+    # ReportLab is only loaded by workers that actually render a statement.
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Image, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
+
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     styles = getSampleStyleSheet()
@@ -105,9 +116,111 @@ def generate_ledger_pdf(ledger_entries, user, start_date, end_date):
     return pdf
 
 
+def build_transfer_alert_emails(debit_transaction, credit_transaction, amount, description):
+    """Returns the debit and credit alert e-mails of a completed transfer, as send_email kwargs."""
+    sender_name = debit_transaction.from_account.user.full_name
+    sender_email = debit_transaction.from_account.user.email
+    sender_balance = debit_transaction.from_account.current_balance
+    recipient_name = credit_transaction.to_account.user.full_name
+    recipient_email = credit_transaction.to_account.user.email
+    recipient_account_number = credit_transaction.to_account.account_number
+    recipient_balance = credit_transaction.to_account.current_balance
+
+    local_tz = timezone.get_current_timezone()
+    local_timestamp = timezone.localtime(credit_transaction.timestamp, local_tz)
+
+    date = local_timestamp.strftime("%A, %d %B, %Y")
+    time = local_timestamp.strftime("%H:%M:%S")
+
+    credit_context = {
+        "recipient_name": recipient_name,
+        "sender_name": sender_name,
+        "amount": amount,
+        "description": description,
+        "date": date,
+        "time": time,
+        "current_balance": recipient_balance,
+    }
+    debit_context = {
+        "recipient_name": recipient_name,
+        "sender_name": sender_name,
+        "recipient_account_number": recipient_account_number,
+        "amount": amount,
+        "description": description,
+        "date": date,
+        "time": time,
+        "current_balance": sender_balance,
+    }
+    subject = "Transaction Alert!"
+    sender = {"name": "Longman Technologies", "email": os.getenv("EMAIL_SENDER")}
+    reply_to = {"email": os.getenv("REPLY_TO_EMAIL")}
+
+    return [
+        {
+            "to": [{"email": sender_email, "name": sender_name}],
+            "subject": subject,
+            "html_content": render_to_string("debit_alert_email.html", debit_context),
+            "sender": sender,
+            "reply_to": reply_to,
+        },
+        {
+            "to": [{"email": recipient_email, "name": recipient_name}],
+            "subject": subject,
+            "html_content": render_to_string("credit_alert_email.html", credit_context),
+            "sender": sender,
+            "reply_to": reply_to,
+        },
+    ]
+
+
+def get_statement_ledger_entries(accounts, start_date, end_date):
+    """
+    Returns (ledger_entries, start_date, end_date, start_date_str, end_date_str) for a statement.
+    Raises ValueError when the YYYY-MM-DD dates provided are invalid.
+    """
+    if start_date and end_date:
+        start_date = make_aware(parse_datetime(start_date + "T00:00:00"))
+        end_date = make_aware(parse_datetime(end_date + "T23:59:59"))
+        ledger_entries = Ledger.objects.filter(
+            account__in=accounts,
+            transaction__timestamp__range=[start_date, end_date]
+        ).select_related("transaction").order_by("-transaction__timestamp")
+        return ledger_entries, start_date, end_date, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+
+    ledger_entries = Ledger.objects.filter(account__in=accounts).select_related("transaction").order_by("-transaction__timestamp")
+    return ledger_entries, start_date, end_date, "the beginning", "now"
+
+
+def build_statement_email(user, pdf, start_date_str, end_date_str):
+    """Returns the statement of account e-mail, with the PDF attached, as send_attachment_email kwargs."""
+    attachment = [{
+        "content": base64.b64encode(pdf).decode("utf-8"),
+        "name": f"{user.full_name}_statement_of_account_{timezone.localtime().strftime('%Y-%m-%d_%H-%M-%S')}.pdf",
+        "type": "application/pdf",
+    }]
+    context = {
+        "user": user,
+        "start_date": start_date_str,
+        "end_date": end_date_str,
+        "company_name": "Longman Technologies",
+    }
+    return {
+        "to": [{"email": user.email, "name": user.full_name}],
+        "reply_to": {"email": os.getenv("REPLY_TO_EMAIL")},
+        "html_content": render_to_string("statement_of_account.html", context),
+        "sender": {"name": "Longman Technologies", "email": os.getenv("EMAIL_SENDER")},
+        "subject": "Your Statement of Account from Longman Technologies",
+        "attachment": attachment,
+    }
+
+
 def send_attachment_email(to, reply_to, html_content, sender, subject, attachment):
+    import sib_api_v3_sdk
+    from sib_api_v3_sdk.rest import ApiException
+
     try:
         configuration = sib_api_v3_sdk.Configuration()
+        configuration.host = EMAIL_API_HOST
         configuration.api_key["api-key"] = os.getenv("EMAIL_API_KEY")
         api_instance = sib_api_v3_sdk.TransactionalEmailsApi(
             sib_api_v3_sdk.ApiClient(configuration)
@@ -120,12 +233,13 @@ def send_attachment_email(to, reply_to, html_content, sender, subject, attachmen
             subject=subject,
             attachment=attachment
         )
-        api_response = api_instance.send_transac_email(send_smtp_email)
+        with timed("email"):
+            api_response = api_instance.send_transac_email(send_smtp_email)
 
-        print("Email sent successfully:", api_response)
+        logger.info("Sent email %r", subject, extra={"recipients": len(to), "message_id": api_response.message_id})
 
         return "Success"
 
     except ApiException as e:
-        print("Exception when calling SMTPApi->send_transac_email:", e)
+        logger.warning("Could not send email %r: %s %s", subject, e.status, e.reason, extra={"response": e.body})
         return "Fail"
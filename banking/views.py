@@ -3,25 +3,31 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
+from django.db import transaction
 from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.http import parse_etags
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import check_password
-from django.template.loader import render_to_string
-from django.utils.dateparse import parse_datetime
-from django.utils.timezone import make_aware
-from django.utils import timezone
 from drf_spectacular.utils import extend_schema, OpenApiParameter
-from PIL import Image
-from .utils import send_attachment_email
+from .utils import (
+    send_attachment_email,
+    generate_ledger_pdf,
+    build_transfer_alert_emails,
+    get_statement_ledger_entries,
+    build_statement_email,
+)
 from accounts.utils import send_email
-from .serializers import TransferSerializer, TransactionSerializer, AccountSerializer, TransactionImageSerializer
+from .serializers import TransferSerializer, TransactionSerializer, AccountSerializer, TransactionImageSerializer, TransactionValuesSerializer, StandingOrderSerializer, AccountSummarySerializer
 from .operations import transfer_funds
-from .models import Transaction, Ledger, Account
+from .models import Transaction, Account, Ledger, StandingOrder
+from .standing_orders import next_occurrence, occurrence_at
+from .summary import get_account_summary
+from .exports import EXPORT_PARAMETERS, export_ledger
 from .permissions import IsOwnerOfTransaction
-from .utils import generate_ledger_pdf
-import io
-import os
-import base64
+from .receipts import get_receipt, receipt_etag
+from utils.db_router import ReplicaReadMixin
+from utils.values import SPARSE_FIELDSET_PARAMETERS, ValuesListMixin
 import logging
 
 logger = logging.getLogger(__name__)
@@ -91,7 +97,8 @@ class TransferAPIView(generics.GenericAPIView):
     """
     This view handles funds transfer between two verified users. A user sends funds to a fellow user\n
     and their accounts both get debited and credited immediately. The two users involved in the transaction also get\n
-    email alerts immediately after successful transaction.
+    email alerts immediately after successful transaction. A user with more than one account names the account\n
+    to send from in 'from_account_number'.
     """
     serializer_class = TransferSerializer
     permission_classes = [IsAuthenticated]
@@ -100,7 +107,8 @@ class TransferAPIView(generics.GenericAPIView):
     description="""
     This endpoint handles funds transfer between two verified users. A user sends funds to a fellow user\n
     and their accounts both get debited and credited immediately. The two users involved in the transaction also receive\n
-    email alerts immediately after successful transaction.
+    email alerts immediately after successful transaction. A user with more than one account names the account\n
+    to send from in 'from_account_number'.
     """,
     request=TransferSerializer,
     responses={
@@ -144,75 +152,18 @@ class TransferAPIView(generics.GenericAPIView):
                 serializer.validated_data["to_account_number"],
                 serializer.validated_data["amount"],
                 serializer.validated_data.get("description", ""),
+                serializer.validated_data.get("from_account_number"),
             )
 
-            sender_name = debit_transaction.from_account.user.full_name
-            sender_email = debit_transaction.from_account.user.email
-            sender_balance = debit_transaction.from_account.current_balance
-            recipient_name = credit_transaction.to_account.user.full_name
-            recipient_email = credit_transaction.to_account.user.email
-            recipient_account_number = credit_transaction.to_account.account_number
-            recipient_balance = credit_transaction.to_account.current_balance
-
-            local_tz = timezone.get_current_timezone()
-            timestamp = (
-                credit_transaction.timestamp
-                if credit_transaction
-                else debit_transaction.timestamp
-            )
-            local_timestamp = timezone.localtime(timestamp, local_tz)
-
-            date = local_timestamp.strftime("%A, %d %B, %Y")
-            time = local_timestamp.strftime("%H:%M:%S")
-
-            credit_context =  {
-                    "recipient_name": recipient_name,
-                    "sender_name": sender_name,
-                    "amount": serializer.validated_data["amount"],
-                    "description": serializer.validated_data.get("description", ""),
-                    "date": date,
-                    "time": time,
-                    "current_balance": recipient_balance,
-                }
-            debit_context = {
-                    "recipient_name": recipient_name,
-                    "sender_name": sender_name,
-                    "recipient_account_number": recipient_account_number,
-                    "amount": serializer.validated_data["amount"],
-                    "description": serializer.validated_data.get("description", ""),
-                    "date": date,
-                    "time": time,
-                    "current_balance": sender_balance,
-                }
-
-            credit_message = render_to_string('credit_alert_email.html', credit_context)
-            debit_message = render_to_string('debit_alert_email.html', debit_context)
-            subject = "Transaction Alert!"
-
-            if debit_transaction:
-                send_email(
-                    to=[{"email": sender_email, "name": sender_name}],
-                    subject=subject,
-                    html_content=debit_message,
-                    sender={
-                        "name": "Longman Technologies",
-                        "email": os.getenv("EMAIL_SENDER"),
-                    },
-                    reply_to={"email": os.getenv("REPLY_TO_EMAIL")},
-                )
-
-            if credit_transaction:
-                send_email(
-                    to=[{"email": recipient_email, "name": recipient_name}],
-                    subject=subject,
-                    html_content=credit_message,
-                    sender={
-                        "name": "Longman Technologies",
-                        "email": os.getenv("EMAIL_SENDER"),
-                    },
-                    reply_to={"email": os.getenv("REPLY_TO_EMAIL")},
-                )
+            for email in build_transfer_alert_emails(
+                debit_transaction,
+                credit_transaction,
+                serializer.validated_data["amount"],
+                serializer.validated_data.get("description", ""),
+            ):
+                send_email(**email)
 
+            recipient_name = credit_transaction.to_account.user.full_name
             return Response(
                 {
                     "status": status.HTTP_200_OK,
@@ -241,15 +192,17 @@ class TransferAPIView(generics.GenericAPIView):
         OpenApiParameter(
             name="page", description="Page number", required=False, type=int
         ),
+        *SPARSE_FIELDSET_PARAMETERS,
     ],
 )
-class UserTransactionListView(generics.ListAPIView):
+class UserTransactionListView(ReplicaReadMixin, ValuesListMixin, generics.ListAPIView):
     """
     This view allows a user to fetch all the transactions they are invloved in.\n
     To speed up database query, a query parameter('page') may be appended to the url\n
     and the value can be any digit, commonly starting from one.
     """
     serializer_class = TransactionSerializer
+    values_serializer_class = TransactionValuesSerializer
     permission_classes = [IsAuthenticated, IsOwnerOfTransaction]
     pagination_class = PageNumberPagination
 
@@ -270,20 +223,20 @@ class UserTransactionListView(generics.ListAPIView):
 
     def list(self, request, *args, **kwargs):
         try:
-            queryset = self.get_queryset()
+            queryset = self.get_list_queryset()
 
             paginator = self.pagination_class()
             paginated_queryset = paginator.paginate_queryset(queryset, request, view=self)
             
-            serializer = self.get_serializer(paginated_queryset, many=True)
+            serializer = self.get_list_serializer(paginated_queryset)
             response_data = {
                 "status": status.HTTP_200_OK,
                 "success": True,
                 "data": serializer.data
             }
             return paginator.get_paginated_response(response_data)
-        except Exception as e:
-            logger.error(f"An error occurred: {e}")
+        except Exception:
+            logger.exception("Could not list the transactions of user %s", request.user.pk)
             return Response(
                 {
                     "status": status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -293,7 +246,7 @@ class UserTransactionListView(generics.ListAPIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class UserTransactionRetrieveView(generics.RetrieveAPIView):
+class UserTransactionRetrieveView(ReplicaReadMixin, generics.RetrieveAPIView):
     """
     This view allows a user to fetch a particular transaction they are involved in\n 
     by appending the transaction id to the url as a parameter. 
@@ -307,26 +260,31 @@ class UserTransactionRetrieveView(generics.RetrieveAPIView):
 class TransactionImageView(generics.RetrieveAPIView):
     """
     This view allows a user to get the image(jpeg format) of a transaction they are\n
-    involved in by simply appending the transaction id to the url as a parameter.
+    involved in by simply appending the transaction id to the url as a parameter.\n
+    Transactions never change, so receipts are rendered once, cached, and served with a strong ETag.
     """
     serializer_class = TransactionImageSerializer
     permission_classes = [IsAuthenticated, IsOwnerOfTransaction]
-    queryset = Transaction.objects.all()
+    queryset = Transaction.objects.select_related("from_account__user", "to_account__user")
     lookup_field = "transaction_id"
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        image = self.generate_image(instance)
-        return HttpResponse(image, content_type="image/jpeg")
+        etag = receipt_etag(instance.transaction_id)
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in if_none_match or "*" in if_none_match:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(self.generate_image(instance), content_type="image/jpeg")
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, max-age=31536000, immutable"
+        return response
 
     def generate_image(self, instance):
-        img = Image.new("RGB", (100, 50), color="white")
-        img_byte_array = io.BytesIO()
-        img.save(img_byte_array, format="JPEG")
-        return img_byte_array.getvalue()
+        return get_receipt(instance)
 
 
-class StatementOfAccountPDFView(generics.GenericAPIView):
+class StatementOfAccountPDFView(ReplicaReadMixin, generics.GenericAPIView):
     """
     This view gives room for a user to generate an account statement which will be immediately\n
     sent to their email. A user can generate account records for all their transactions or for\n
@@ -364,51 +322,215 @@ class StatementOfAccountPDFView(generics.GenericAPIView):
         start_date = request.query_params.get("start_date")
         end_date = request.query_params.get("end_date")
 
-        if start_date and end_date:
-            try:
-                start_date = make_aware(parse_datetime(start_date + "T00:00:00"))
-                end_date = make_aware(parse_datetime(end_date + "T23:59:59"))
-                ledger_entries = Ledger.objects.filter(
-                    account__in=accounts,
-                    transaction__timestamp__range=[start_date, end_date]
-                ).select_related("transaction").order_by("-transaction__timestamp")
-                start_date_str = start_date.strftime("%Y-%m-%d")
-                end_date_str = end_date.strftime("%Y-%m-%d")
-            except ValueError:
-                return Response({"error": "Invalid date format provided."}, status=status.HTTP_400_BAD_REQUEST)
-        else:
-            ledger_entries = Ledger.objects.filter(account__in=accounts).select_related("transaction").order_by("-transaction__timestamp")
-            start_date_str = "the beginning"
-            end_date_str = "now"
+        try:
+            ledger_entries, start_date, end_date, start_date_str, end_date_str = get_statement_ledger_entries(
+                accounts, start_date, end_date
+            )
+        except ValueError:
+            return Response({"error": "Invalid date format provided."}, status=status.HTTP_400_BAD_REQUEST)
 
         pdf = generate_ledger_pdf(ledger_entries, user, start_date, end_date)
-        pdf_base64 = base64.b64encode(pdf).decode("utf-8")
-
-        attachment = [{
-            "content": pdf_base64,
-            "name": f"{user.full_name}_statement_of_account_{timezone.localtime().strftime('%Y-%m-%d_%H-%M-%S')}.pdf",
-            "type": "application/pdf",
-        }]
-        context =  {
-                "user": user,
-                "start_date": start_date_str,
-                "end_date": end_date_str,
-                "company_name": "Longman Technologies",
-            } 
-        html_content = render_to_string("statement_of_account.html", context)
-
-        to = [{"email": user.email, "name": user.full_name}]
-        reply_to = {"email": os.getenv("REPLY_TO_EMAIL")}
-        sender = {
-            "name": "Longman Technologies",
-            "email": os.getenv("EMAIL_SENDER"),
-        }
-        subject = "Your Statement of Account from Longman Technologies"
-
-        send_attachment_email(to, reply_to, html_content, sender, subject, attachment)
+        send_attachment_email(**build_statement_email(user, pdf, start_date_str, end_date_str))
         response_data = {
             "status" : status.HTTP_200_OK,
             "success" : True,
             "message": "Requested account statement on its way to your registered email. Kindly check your inbox.",
             }
         return Response(response_data, status=status.HTTP_200_OK)
+
+
+class StatementExportView(ReplicaReadMixin, generics.GenericAPIView):
+    """
+    This view gives room for a user to download their statement in a machine-readable format,\n
+    one line per ledger entry with the balance after each transaction, oldest first.\n
+    The file is CSV by default ('export=jsonl' for JSON lines) and covers all transactions unless\n
+    'start_date' and/or 'end_date' (YYYY-MM-DD) are appended; 'compress=gzip' returns a gzipped file.\n
+    Example: api/v1/statement-of-account/export?export=jsonl&start_date=2024-06-01&end_date=2024-06-30
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+    description="""
+    This endpoint gives room for a user to download their statement in a machine-readable format,\n
+    one line per ledger entry with the balance after each transaction, oldest first.\n
+    The file is CSV by default ('export=jsonl' for JSON lines) and covers all transactions unless\n
+    'start_date' and/or 'end_date' (YYYY-MM-DD) are appended; 'compress=gzip' returns a gzipped file.\n
+    Example: api/v1/statement-of-account/export?export=jsonl&start_date=2024-06-01&end_date=2024-06-30
+    """,
+    parameters=EXPORT_PARAMETERS,
+    responses={
+        (200, "text/csv"): {"type": "string"},
+        (200, "application/x-ndjson"): {"type": "string"},
+        400: {"description": "Invalid parameter"},
+    },
+    methods=["GET"]
+    )
+    def get(self, request):
+        ledger_entries = Ledger.objects.filter(account__user=request.user)
+        return export_ledger(ledger_entries, request, name="statement_of_account")
+
+
+class AccountSummaryAPIView(generics.GenericAPIView):
+    """
+    This view returns what the app's home screen shows: the balance of each of the user's accounts\n
+    and their latest ledger entries. The summary is cached per user and refreshed whenever the user\n
+    makes a transfer, so it is usually served without touching the database.
+    """
+    serializer_class = AccountSummarySerializer
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+    description="""
+    This endpoint returns what the app's home screen shows: the balance of each of the user's accounts\n
+    and their latest ledger entries, newest first. The summary is cached per user and refreshed whenever\n
+    the user makes a transfer, so it is usually served without touching the database.
+    """,
+    responses={200: AccountSummarySerializer},
+    methods=["GET"]
+    )
+    def get(self, request):
+        response_data = {
+            "status": status.HTTP_200_OK,
+            "success": True,
+            "data": {"full_name": request.user.full_name, **get_account_summary(request.user.id)},
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    description="""
+    This endpoint lets a user list their standing orders (GET) or set up a new one (POST).\n
+    A standing order sends 'amount' to 'to_account_number' every day, week or month ('frequency'),\n
+    starting at 'first_run_at' and, optionally, until 'end_date'. Setting one up requires the transaction PIN.\n
+    A payment that fails, e.g. for insufficient funds, is retried a few times before it is skipped.
+    """,
+    request=StandingOrderSerializer,
+    responses={
+        200: StandingOrderSerializer(many=True),
+        201: StandingOrderSerializer,
+        400: {"description": "Invalid data or incorrect PIN"},
+    },
+    methods=["GET", "POST"],
+)
+class StandingOrderListCreateAPIView(generics.ListCreateAPIView):
+    """
+    This view lets a user list their standing orders or set up a new recurring transfer.
+    """
+    serializer_class = StandingOrderSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = PageNumberPagination
+
+    def get_queryset(self):
+        return StandingOrder.objects.filter(user=self.request.user).order_by("-date_created")
+
+    def list(self, request, *args, **kwargs):
+        paginator = self.pagination_class()
+        paginated_queryset = paginator.paginate_queryset(self.get_queryset(), request, view=self)
+        serializer = self.get_serializer(paginated_queryset, many=True)
+        response_data = {
+            "status": status.HTTP_200_OK,
+            "success": True,
+            "data": serializer.data
+        }
+        return paginator.get_paginated_response(response_data)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        pin = serializer.validated_data.pop("pin")
+        if not check_password(pin, request.user.pin):
+            response_data = {
+                "status" : status.HTTP_400_BAD_REQUEST,
+                "success" : False,
+                "error": "Incorrect PIN"
+                }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer.save(user=request.user, next_run_at=serializer.validated_data["first_run_at"])
+        response_data = {
+            "status": status.HTTP_201_CREATED,
+            "success": True,
+            "message": "Standing order set up successfully",
+            "data": serializer.data
+        }
+        return Response(response_data, status=status.HTTP_201_CREATED)
+
+
+@extend_schema(
+    description="""
+    This endpoint lets a user view (GET), change (PATCH) or cancel (DELETE) one of their standing orders.\n
+    The amount, description and end date can be changed, and 'status' can be set to PAUSED or back to ACTIVE;\n
+    a resumed order continues from its next date, without the payments missed while it was paused.
+    """,
+    request=StandingOrderSerializer,
+    responses={
+        200: StandingOrderSerializer,
+        400: {"description": "Invalid data"},
+        404: {"description": "Not found"},
+    },
+    methods=["GET", "PATCH", "DELETE"],
+)
+class StandingOrderDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
+    """
+    This view lets a user view, change, pause, resume or cancel one of their standing orders.
+    """
+    serializer_class = StandingOrderSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ["get", "patch", "delete"]
+    lookup_field = "id"
+
+    def get_queryset(self):
+        queryset = StandingOrder.objects.filter(user=self.request.user).exclude(status="CANCELLED")
+        if self.request.method != "GET":
+            # The executor writes to the same row; the lock keeps either from overwriting the other.
+            queryset = queryset.select_for_update()
+        return queryset
+
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_object())
+        response_data = {
+            "status": status.HTTP_200_OK,
+            "success": True,
+            "data": serializer.data
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        instance = self.get_object()
+        if instance.status == "COMPLETED":
+            return Response(
+                {"status": status.HTTP_400_BAD_REQUEST, "success": False, "error": "This standing order has ended"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        serializer = self.get_serializer(instance, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.validated_data.pop("pin", None)
+        extra = {}
+        if instance.status == "PAUSED" and serializer.validated_data.get("status") == "ACTIVE":
+            occurrence = next_occurrence(instance, timezone.now())
+            extra = {"occurrence": occurrence, "next_run_at": occurrence_at(instance, occurrence), "attempts": 0}
+            end_date = serializer.validated_data.get("end_date", instance.end_date)
+            if end_date and timezone.localdate(extra["next_run_at"]) > end_date:
+                # Every payment left would fall after the end date.
+                extra["status"] = "COMPLETED"
+        serializer.save(**extra)
+        response_data = {
+            "status": status.HTTP_200_OK,
+            "success": True,
+            "message": "Standing order updated successfully",
+            "data": serializer.data
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
+    @transaction.atomic
+    def destroy(self, request, *args, **kwargs):
+        instance = self.get_object()
+        instance.status = "CANCELLED"
+        instance.save(update_fields=["status"])
+        response_data = {
+            "status": status.HTTP_204_NO_CONTENT,
+            "success": True,
+            "message": "Standing order cancelled successfully",
+        }
+        return Response(response_data, status=status.HTTP_204_NO_CONTENT)
@@ -4,4 +4,4 @@ set -o errexit
 
 pip install -r requirements.txt
 python manage.py collectstatic --no-input
-
+python manage.py spectacular --file schema.yml
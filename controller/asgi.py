@@ -3,6 +3,14 @@ ASGI config for controller project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The async endpoints (the ``.../async`` routes) only free up the worker while they wait
+on the e-mail API, storage or the database when served under ASGI, e.g.:
+
+    gunicorn controller.asgi:application -k uvicorn.workers.UvicornWorker
+
+Event streams (api/v1/events, server-sent events) are served here by banking.streams.event_stream
+rather than by a Django view, and only under ASGI.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -13,4 +21,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "controller.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up, since it loads models.
+from banking.streams import EVENT_STREAM_PATH, event_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] == EVENT_STREAM_PATH:
+        return await event_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -13,7 +13,9 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
+import tempfile
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 
 load_dotenv()
 
@@ -50,12 +52,14 @@ INSTALLED_APPS = [
     "rest_framework",
     "rest_framework_simplejwt.token_blacklist",
     "drf_spectacular",
-    "cloudinary_storage",
-    "cloudinary",
 ]
 
 MIDDLEWARE = [
+    "utils.middleware.RequestLogMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "utils.middleware.CompressionMiddleware",
+    "utils.middleware.PerformanceMiddleware",
+    "utils.middleware.ProfilingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -69,7 +73,8 @@ ROOT_URLCONF = "controller.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # Django's backend, timing renders for Server-Timing and /metrics.
+        "BACKEND": "utils.templates.DjangoTemplates",
         "DIRS": [
             BASE_DIR / "templates",
         ],
@@ -95,7 +100,7 @@ DATABASES = {
     "default": {
         # 'ENGINE': 'django.db.backends.sqlite3',
         # 'NAME': BASE_DIR / 'db.sqlite3',
-        "ENGINE": "django.db.backends.postgresql_psycopg2",
+        "ENGINE": "utils.postgresql_pool",
         "NAME": os.getenv("DB_NAME"),
         "USER": os.getenv("DB_USER"),
         "PASSWORD": os.getenv("DB_PASSWORD"),
@@ -104,6 +109,66 @@ DATABASES = {
     }
 }
 
+# Connection management:
+#   "request"    - a new connection per request (Django's default behaviour).
+#   "persistent" - one connection per worker thread, reused for DB_CONN_MAX_AGE seconds
+#                  and health-checked before reuse.
+#   "pooled"     - connections are borrowed from an in-process pool per worker and
+#                  returned at the end of each request; those idle in the pool for more than
+#                  DB_POOL_CHECK_IDLE_SECONDS are checked with a "SELECT 1" first.
+DB_CONN_MODE = os.getenv("DB_CONN_MODE", "request")
+
+if DB_CONN_MODE == "persistent":
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv("DB_CONN_MAX_AGE", 600))
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+elif DB_CONN_MODE == "pooled":
+    DATABASES["default"]["POOL"] = {
+        "MIN_SIZE": int(os.getenv("DB_POOL_MIN_SIZE", 1)),
+        "MAX_SIZE": int(os.getenv("DB_POOL_MAX_SIZE", 4)),
+        "TIMEOUT": float(os.getenv("DB_POOL_TIMEOUT", 10)),
+        "CHECK_IDLE_SECONDS": float(os.getenv("DB_POOL_CHECK_IDLE_SECONDS", 30)),
+    }
+
+# Optional read replica. Heavy read endpoints (transaction history, statements, admin lists)
+# opt into it through utils.db_router.ReplicaReadMixin; everything else stays on default.
+# It needs a CACHE_BACKEND shared by all workers, see CACHES.
+if os.getenv("DB_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": os.getenv("DB_REPLICA_NAME", DATABASES["default"]["NAME"]),
+        "USER": os.getenv("DB_REPLICA_USER", DATABASES["default"]["USER"]),
+        "PASSWORD": os.getenv("DB_REPLICA_PASSWORD", DATABASES["default"]["PASSWORD"]),
+        "HOST": os.getenv("DB_REPLICA_HOST"),
+        "PORT": os.getenv("DB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["utils.db_router.ReplicaRouter"]
+
+# Seconds a user's reads stay on the primary after they make a transfer (read-your-writes).
+REPLICA_STICKINESS_SECONDS = int(os.getenv("REPLICA_STICKINESS_SECONDS", 30))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+# Users who just wrote are pinned to the primary through the cache (read-your-writes); with a cache
+# of each process's own, the pin would only hold in the worker that served the write.
+if "replica" in DATABASES and CACHES["default"]["BACKEND"] in (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+):
+    raise ImproperlyConfigured(
+        "A read replica (DB_REPLICA_HOST) needs a CACHE_BACKEND shared by all workers, e.g. Redis or Memcached"
+    )
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -146,6 +211,19 @@ SPECTACULAR_SETTINGS = {
     'VERSION': '1.0.0',
 }
 
+# The OpenAPI schema is built once: read from API_SCHEMA_FILE when build.sh has generated it,
+# otherwise generated on first use. SERVE_API_DOCS=False drops the schema and docs routes.
+API_SCHEMA_FILE = os.getenv("API_SCHEMA_FILE", os.path.join(BASE_DIR, "schema.yml"))
+SERVE_API_DOCS = os.getenv("SERVE_API_DOCS", "True").lower() == "true"
+
+# Hot list endpoints render from values() rows with orjson (when installed) instead of
+# ModelSerializer instances and the stdlib encoder. The JSON produced is the same.
+FAST_LIST_RENDERING = os.getenv("FAST_LIST_RENDERING", "False").lower() == "true"
+
+# Text responses at least this large are brotli- (when installed) or gzip-compressed.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
@@ -197,7 +275,33 @@ STATIC_URL = "static/"
 STATIC_ROOT = "staticfiles"
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
-DEFAULT_FILE_STORAGE = "cloudinary_storage.storage.MediaCloudinaryStorage"
+# Cloudinary, with its API calls timed for Server-Timing and /metrics.
+DEFAULT_FILE_STORAGE = "utils.storage.MediaCloudinaryStorage"
+
+# MEDIA_STORAGE=local swaps Cloudinary for the local filesystem (development and tests).
+if os.getenv("MEDIA_STORAGE") == "local":
+    DEFAULT_FILE_STORAGE = "django.core.files.storage.FileSystemStorage"
+    MEDIA_ROOT = BASE_DIR / "media"
+else:
+    # Only load the Cloudinary apps (and SDK) when Cloudinary actually backs media storage.
+    INSTALLED_APPS += ["cloudinary_storage", "cloudinary"]
+
+# Uploads are staged here before the background pool pushes them to media storage.
+UPLOAD_STAGING_DIR = os.getenv("UPLOAD_STAGING_DIR", os.path.join(tempfile.gettempdir(), "upload_staging"))
+
+# Threads per worker process for background work such as media uploads.
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", 4))
+
+# Uploaded pictures are re-encoded to IMAGE_FORMAT ("WEBP" or "JPEG"), downsized to fit
+# IMAGE_MAX_DIMENSION pixels and given a IMAGE_THUMBNAIL_DIMENSION-pixel thumbnail.
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "WEBP")
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 80))
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", 1600))
+IMAGE_THUMBNAIL_DIMENSION = int(os.getenv("IMAGE_THUMBNAIL_DIMENSION", 320))
+
+# Image uploads are cut off while streaming once a single file or the whole request exceeds these sizes.
+MAX_UPLOAD_FILE_SIZE = int(os.getenv("MAX_UPLOAD_FILE_SIZE", 5 * 1024 * 1024))
+MAX_UPLOAD_REQUEST_SIZE = int(os.getenv("MAX_UPLOAD_REQUEST_SIZE", 20 * 1024 * 1024))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -217,3 +321,138 @@ CLOUDINARY_STORAGE = {
     "API_SECRET": os.getenv("CLOUDINARY_SECRET"),
 }
 
+
+# Rendered transaction receipts are cached on disk, keeping the most recently viewed ones.
+RECEIPT_CACHE_DIR = os.getenv("RECEIPT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "receipt_cache"))
+RECEIPT_CACHE_MAX_ENTRIES = int(os.getenv("RECEIPT_CACHE_MAX_ENTRIES", 10000))
+
+# Home-screen account summary: ledger entries shown, and how long a cached summary may be served.
+# Transfers refresh it on commit; the timeout bounds staleness after other balance changes.
+ACCOUNT_SUMMARY_ENTRIES = int(os.getenv("ACCOUNT_SUMMARY_ENTRIES", 5))
+ACCOUNT_SUMMARY_CACHE_SECONDS = int(os.getenv("ACCOUNT_SUMMARY_CACHE_SECONDS", 600))
+
+# Bulk user imports from CSV: rows validated, inserted and e-mailed together, and the most row
+# errors kept on an import for its report (all failed rows are still counted).
+USER_IMPORT_BATCH_SIZE = int(os.getenv("USER_IMPORT_BATCH_SIZE", 500))
+USER_IMPORT_MAX_ERRORS = int(os.getenv("USER_IMPORT_MAX_ERRORS", 1000))
+
+# Server-sent event streams (api/v1/events, ASGI only). EVENT_BACKEND feeds each process's broker;
+# the default polls the outbox table every EVENT_POLL_SECONDS, re-reading the last
+# EVENT_POLL_LOOKBACK_SECONDS for events that committed late. A stream more than EVENT_QUEUE_SIZE
+# events behind is closed and resumes from the outbox on reconnect (at most EVENT_REPLAY_LIMIT
+# events). Idle streams get a keep-alive comment every EVENT_HEARTBEAT_SECONDS.
+EVENT_BACKEND = os.getenv("EVENT_BACKEND", "banking.events.OutboxPollingBackend")
+EVENT_POLL_SECONDS = float(os.getenv("EVENT_POLL_SECONDS", 1))
+EVENT_POLL_LOOKBACK_SECONDS = float(os.getenv("EVENT_POLL_LOOKBACK_SECONDS", 5))
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", 100))
+EVENT_REPLAY_LIMIT = int(os.getenv("EVENT_REPLAY_LIMIT", 500))
+EVENT_HEARTBEAT_SECONDS = float(os.getenv("EVENT_HEARTBEAT_SECONDS", 15))
+
+# Admin changelists show the planner's row estimate instead of COUNT(*) for unfiltered
+# tables larger than this.
+ESTIMATED_COUNT_THRESHOLD = int(os.getenv("ESTIMATED_COUNT_THRESHOLD", 100000))
+
+# Snowflake primary keys embed a worker and a datacenter id (0-31 each). Every process that inserts
+# rows leases a worker id of its own (a PostgreSQL advisory lock, held on one extra connection per
+# process) before its first insert, and forked workers lease their own; processes that never insert,
+# like `manage.py check`, lease nothing. Web workers and other long-running processes take theirs
+# from SNOWFLAKE_WORKER_IDS, batch commands (interest accrual, standing orders, imports) from
+# SNOWFLAKE_BATCH_WORKER_IDS, so jobs can't use up the ids the web workers need. A process that
+# finds no free id fails on its first insert. SNOWFLAKE_WORKER_ID, when set, is used instead of a
+# lease, e.g. by a deployment of a single process; it is also used (0 if unset) when the database
+# isn't PostgreSQL, and by the tests.
+def parse_id_range(value):
+    first, _, last = value.partition("-")
+    return range(int(first), int(last or first) + 1)
+
+
+SNOWFLAKE_WORKER_IDS = parse_id_range(os.getenv("SNOWFLAKE_WORKER_IDS", "0-23"))
+SNOWFLAKE_BATCH_WORKER_IDS = parse_id_range(os.getenv("SNOWFLAKE_BATCH_WORKER_IDS", "24-31"))
+SNOWFLAKE_DATACENTER_ID = int(os.getenv("SNOWFLAKE_DATACENTER_ID", 1))
+SNOWFLAKE_WORKER_ID = int(os.environ["SNOWFLAKE_WORKER_ID"]) if os.getenv("SNOWFLAKE_WORKER_ID") else None
+
+# Uses the static snowflake worker id rather than leasing one.
+TEST_RUNNER = "utils.test_runner.TestRunner"
+
+# Logging: one JSON object per line on stderr ("text" for plain lines), with the request's
+# X-Request-ID, user and transaction ids. Records go through a bounded queue to a listener
+# thread, so logging never blocks a request; records that don't fit are dropped and counted.
+# LOG_SAMPLE_RATES keeps a fraction of the records below WARNING from busy loggers, e.g.
+# "access=0.1,banking.operations=0.5"; whole requests are kept or dropped. Requests slower than
+# LOG_SLOW_REQUEST_MS are logged at WARNING, so they are never sampled out.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, _, rate in (item.partition("=") for item in os.getenv("LOG_SAMPLE_RATES", "access=0.1").split(","))
+    if name.strip()
+}
+LOG_SLOW_REQUEST_MS = int(os.getenv("LOG_SLOW_REQUEST_MS", 1000))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "filters": {
+        "correlation": {"()": "utils.logging.CorrelationFilter"},
+        "sampling": {"()": "utils.logging.SamplingFilter", "rates": LOG_SAMPLE_RATES},
+    },
+    "formatters": {
+        "json": {"()": "utils.logging.JSONFormatter"},
+        "text": {
+            "()": "logging.Formatter",
+            "fmt": "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s",
+            "defaults": {"request_id": "-"},
+        },
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": LOG_FORMAT},
+        # Named to sort after "console", which dictConfig must set up first.
+        "queue": {
+            "()": "utils.logging.QueueHandler",
+            "handlers": ["cfg://handlers.console"],
+            "queue_size": LOG_QUEUE_SIZE,
+            "filters": ["correlation", "sampling"],
+        },
+    },
+    "root": {"handlers": ["queue"], "level": LOG_LEVEL},
+    "loggers": {
+        # Replaces Django's own handlers, which print to the console only with DEBUG and mail ADMINS.
+        "django": {"handlers": ["queue"], "level": LOG_LEVEL, "propagate": False},
+    },
+}
+
+# Performance instrumentation (utils.middleware.PerformanceMiddleware). /metrics serves Prometheus
+# histograms per URL name to scrapers presenting "Authorization: Bearer <METRICS_TOKEN>", and is
+# off without a token. With several worker processes, point METRICS_DIR at a directory they share
+# (emptied when the server starts) so any worker can report for all of them; each writes its
+# numbers there every METRICS_FLUSH_SECONDS.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", 5))
+# Who gets the Server-Timing header, which shows where each request spent its time: "staff"
+# (requests authenticated as a staff user), "all" (e.g. for a load test) or "none".
+SERVER_TIMING = os.getenv("SERVER_TIMING", "staff")
+
+# Most SQL queries a request to a URL name should run, e.g. "users-list=4,transactions-list=3";
+# requests over budget are logged at WARNING and counted. DEFAULT_QUERY_BUDGET (0 for none)
+# applies to the URL names not listed.
+QUERY_BUDGETS = {
+    name.strip(): int(budget)
+    for name, _, budget in (item.partition("=") for item in os.getenv("QUERY_BUDGETS", "").split(","))
+    if name.strip()
+}
+DEFAULT_QUERY_BUDGET = int(os.getenv("DEFAULT_QUERY_BUDGET", 0))
+
+# On-demand profiling (utils.middleware.ProfilingMiddleware), off while PROFILING_SECRET is unset.
+# Admins get a signed X-Profile header from admin/profiles/tokens, valid for
+# PROFILING_TOKEN_SECONDS. The request that carries it runs under cProfile or tracemalloc. The
+# results, and the worker memory snapshots taken at admin/profiles/snapshots, are kept in
+# PROFILES_DIR (the newest PROFILES_KEEP) for download. With PROFILING_TRACE_MEMORY set, workers
+# trace memory from the start; this makes them slower and bigger, so only set it while hunting a leak.
+PROFILING_SECRET = os.getenv("PROFILING_SECRET", "")
+PROFILING_TOKEN_SECONDS = int(os.getenv("PROFILING_TOKEN_SECONDS", 600))
+PROFILING_TRACE_MEMORY = os.getenv("PROFILING_TRACE_MEMORY", "False").lower() == "true"
+PROFILING_TRACEMALLOC_FRAMES = int(os.getenv("PROFILING_TRACEMALLOC_FRAMES", 10))
+PROFILES_DIR = os.getenv("PROFILES_DIR", os.path.join(tempfile.gettempdir(), "profiles"))
+PROFILES_KEEP = int(os.getenv("PROFILES_KEEP", 50))
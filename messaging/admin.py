@@ -1,30 +1,47 @@
 from django.contrib import admin
+from utils.pagination import EstimatedCountPaginator
 from .models import CustomerMessage, Picture
+from .search import REFERENCE_ID, search_messages
 
 
 class PictureInline(admin.TabularInline):
     model = CustomerMessage.pictures.through
     extra = 1
     readonly_fields = []
+    raw_id_fields = ("picture",)
 
 
 class CustomerMessageAdmin(admin.ModelAdmin):
     list_display = ("reference_id", "user", "message", "date_created", "date_updated")
     search_fields = ("reference_id", "user__email", "message")
-    list_filter = ("date_created", "date_updated")
+    search_help_text = "A reference id, a customer's email address, or words from the message"
+    list_select_related = ("user",)
+    autocomplete_fields = ("user",)
+    date_hierarchy = "date_created"
     readonly_fields = ("reference_id", "date_created", "date_updated")
     inlines = [PictureInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.select_related("user")
+    def get_search_results(self, request, queryset, search_term):
+        # Each kind of term goes to its own index instead of ILIKE over every search field.
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if REFERENCE_ID.fullmatch(search_term.upper()):
+            return queryset.filter(reference_id=search_term.upper()), False
+        if "@" in search_term:
+            return queryset.filter(user__email__iexact=search_term), False
+        return search_messages(queryset, search_term), False
 
 
 class PictureAdmin(admin.ModelAdmin):
     list_display = ("id", "image", "caption", "date_created")
     search_fields = ("caption",)
-    list_filter = ("date_created",)
+    date_hierarchy = "date_created"
     readonly_fields = ("date_created",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 admin.site.register(CustomerMessage, CustomerMessageAdmin)
 admin.site.register(Picture, PictureAdmin)
@@ -0,0 +1,47 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import status
+from utils.async_views import AsyncAPIView
+from utils.db_router import pin_to_primary
+from .models import CustomerMessage, Picture
+from .serializers import CustomerMessageSerializer
+from .utils import upload_pictures
+
+
+class AsyncCustomerMessageAPIView(AsyncAPIView):
+    """
+    Async variant of CustomerMessageAPIView. The Picture rows are created in one query and the\n
+    pictures are staged and uploaded in the background, so the message comes back straight away\n
+    with its pictures PENDING.
+    """
+
+    serializer_class = CustomerMessageSerializer
+    guard_image_uploads = True
+
+    async def post(self, request, *args, **kwargs):
+        validated_data, error_response = await self.get_validated_data(request)
+        if error_response:
+            return error_response
+
+        message = await CustomerMessage.objects.acreate(
+            user=request.user,
+            message=validated_data["message"],
+        )
+
+        image_files = validated_data.get("image_files") or []
+        if image_files:
+            pictures = await Picture.objects.abulk_create([Picture(status="PENDING") for _ in image_files])
+            await message.pictures.aset(pictures)
+            await sync_to_async(upload_pictures)(pictures, image_files)
+
+        await sync_to_async(pin_to_primary)(request.user.pk)
+        data = await sync_to_async(lambda: CustomerMessageSerializer(message).data)()
+        return JsonResponse(
+            {
+                "status": status.HTTP_201_CREATED,
+                "Success": True,
+                "message": "Your message has been received. You'll receive a response from our customer care representative shortly.",
+                "data": data,
+            },
+            status=status.HTTP_201_CREATED,
+        )
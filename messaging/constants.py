@@ -0,0 +1,3 @@
+PICTURE_STATUS = [
+    ("PENDING", "Pending"), ("UPLOADED", "Uploaded"), ("FAILED", "Failed")
+]
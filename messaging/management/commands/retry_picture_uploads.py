@@ -0,0 +1,74 @@
+import logging
+import os
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from messaging.models import Picture
+from messaging.utils import push_staged_picture, re_staged_picture, remove_staged
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Push pictures whose upload was lost (still PENDING, e.g. the worker restarted) or failed again from "
+        "their staged files, and delete staged files nothing will use any more. Uploads are staged on the "
+        "host that received them, so run this periodically on every such host, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stale-minutes", type=float, default=10,
+            help="Leave staged files younger than this to the worker that staged them",
+        )
+        parser.add_argument(
+            "--give-up-hours", type=float, default=24,
+            help="Delete staged files older than this and fail pictures PENDING for longer",
+        )
+
+    def handle(self, *args, **kwargs):
+        now = time.time()
+        stale_before = now - kwargs["stale_minutes"] * 60
+        give_up_before = now - kwargs["give_up_hours"] * 3600
+
+        staged, removed = {}, 0
+        try:
+            entries = list(os.scandir(settings.UPLOAD_STAGING_DIR))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            modified = entry.stat().st_mtime
+            if modified > stale_before:
+                continue
+            match = re_staged_picture.match(entry.name)
+            if match and modified > give_up_before:
+                staged[int(match[1])] = (entry.path, match[2])
+            elif modified <= give_up_before:
+                remove_staged(entry.path)
+                removed += 1
+
+        pushed = failed = 0
+        for picture_id in Picture.objects.filter(pk__in=staged, status__in=["PENDING", "FAILED"]).values_list(
+            "pk", flat=True
+        ):
+            staged_path, name = staged.pop(picture_id)
+            try:
+                push_staged_picture(picture_id, staged_path, name)
+                pushed += 1
+            except Exception:
+                logger.exception("Picture %s could not be uploaded", picture_id)
+                failed += 1
+        # What's left belongs to pictures that were uploaded or deleted meanwhile.
+        for staged_path, _ in staged.values():
+            remove_staged(staged_path)
+            removed += 1
+
+        given_up = Picture.objects.filter(
+            status="PENDING", date_created__lt=timezone.now() - timedelta(hours=kwargs["give_up_hours"])
+        ).update(status="FAILED")
+        self.stdout.write(
+            f"{pushed} pictures uploaded, {failed} failed again, {given_up} given up on; "
+            f"{removed} staged files deleted"
+        )
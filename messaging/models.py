@@ -1,23 +1,28 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth import get_user_model
 from utils.tools import BaseModel, generate_reference_id
 from .utils import message_pictures_path
+from .constants import PICTURE_STATUS
 
 # Create your models here.
 User = get_user_model()
 
 class CustomerMessage(BaseModel):
     reference_id = models.CharField(
-        unique=True, editable=False, default=generate_reference_id
+        max_length=19, unique=True, editable=False, default=generate_reference_id
     )
     user = models.ForeignKey(User, null=False, on_delete=models.CASCADE)
     message = models.TextField(null=False)
+    # Filled by a database trigger on PostgreSQL, see messaging.search.
+    search_vector = SearchVectorField(null=True, editable=False)
     pictures = models.ManyToManyField("Picture", related_name="message_pictures")
     date_created = models.DateTimeField(auto_now_add=True)
     date_updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = "Customers' Messages"
+        indexes = [models.Index(fields=["date_created"], name="message_date_created_idx")]
         verbose_name_plural = "Customers' Messages"
         abstract = False
         ordering = ["-date_created"]
@@ -32,11 +37,14 @@ class CustomerMessage(BaseModel):
 
 class Picture(BaseModel):
     image = models.ImageField(null=True, upload_to=message_pictures_path)
+    thumbnail = models.ImageField(null=True, editable=False, upload_to=message_pictures_path)
+    status = models.CharField(max_length=20, choices=PICTURE_STATUS, default="UPLOADED")
     caption = models.CharField(max_length=200, blank=True)
     date_created = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = "Messages' Pictures"
+        indexes = [models.Index(fields=["date_created"], name="picture_date_created_idx")]
         verbose_name_plural = "Messages' Pictures"
         abstract = False
         ordering = ["-date_created"]
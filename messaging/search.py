@@ -0,0 +1,70 @@
+import logging
+import re
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F, FloatField, Q, Value
+from django.contrib.postgres.search import SearchQuery, SearchRank
+
+logger = logging.getLogger(__name__)
+
+# Text search configuration used both to build CustomerMessage.search_vector and to parse queries.
+SEARCH_CONFIG = "english"
+
+# Rows filled per statement when search_vector is backfilled for existing messages.
+BACKFILL_BATCH_SIZE = 5000
+
+REFERENCE_ID = re.compile(r"[0-9A-F]{4}(-[0-9A-F]{4}){3}")
+
+
+def search_messages(queryset, query):
+    """
+    Messages matching `query`, best match first, with a `rank` annotation. On PostgreSQL this is a
+    websearch-style query against the stored tsvector (GIN indexed); other databases, i.e. SQLite
+    in development, fall back to matching every word as a substring, newest first.
+    """
+    if connections[queryset.db].vendor == "postgresql":
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+        return (
+            queryset.filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F("search_vector"), search_query))
+            .order_by("-rank", "-date_created")
+        )
+    condition = Q()
+    for word in query.split():
+        condition &= Q(message__icontains=word)
+    return queryset.filter(condition).annotate(rank=Value(0.0, output_field=FloatField())).order_by("-date_created")
+
+
+def create_search_trigger(using="default", **kwargs):
+    """
+    post_migrate handler keeping CustomerMessage.search_vector up to date on PostgreSQL: a trigger
+    rebuilds it whenever a message is inserted or its text changes, a GIN index serves the @@
+    queries, and rows written before the trigger existed are backfilled in batches.
+    """
+    from .models import CustomerMessage
+
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+    table = connection.ops.quote_name(CustomerMessage._meta.db_table)
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(f"DROP TRIGGER IF EXISTS message_search_vector_update ON {table}")
+            cursor.execute(
+                f"CREATE TRIGGER message_search_vector_update BEFORE INSERT OR UPDATE OF message "
+                f"ON {table} FOR EACH ROW EXECUTE FUNCTION "
+                f"tsvector_update_trigger(search_vector, 'pg_catalog.{SEARCH_CONFIG}', message)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS message_search_vector_idx ON {table} USING gin (search_vector)"
+            )
+        with connection.cursor() as cursor:
+            while True:
+                cursor.execute(
+                    f"UPDATE {table} SET search_vector = to_tsvector(%s::regconfig, message) "
+                    f"WHERE id IN (SELECT id FROM {table} WHERE search_vector IS NULL LIMIT %s)",
+                    [SEARCH_CONFIG, BACKFILL_BATCH_SIZE],
+                )
+                if cursor.rowcount < BACKFILL_BATCH_SIZE:
+                    break
+    except DatabaseError as e:
+        logger.warning("Could not set up the customer message search vector: %s", e)
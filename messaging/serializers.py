@@ -1,11 +1,13 @@
+from django.conf import settings
 from rest_framework import serializers
+from utils.values import Many, ValuesSerializer
 from .models import CustomerMessage, Picture
 from filetype import guess
 
 class PictureSerializer(serializers.ModelSerializer):
     class Meta:
         model = Picture
-        fields = ["id", "image", "caption"]
+        fields = ["id", "image", "thumbnail", "caption", "status"]
 
 
 class CustomerMessageSerializer(serializers.ModelSerializer):
@@ -34,14 +36,42 @@ class CustomerMessageSerializer(serializers.ModelSerializer):
         if not value:
             return value
         for image in value:
-            file_type = guess(image.read())
-            image.seek(0)
-            if file_type is None or file_type.mime not in ["image/jpeg", "image/png"]:
+            if image.size > settings.MAX_UPLOAD_FILE_SIZE:
                 raise serializers.ValidationError(
-                    "Invalid file type. Only JPEG and PNG files are allowed"
+                    f"Pictures must not be larger than {settings.MAX_UPLOAD_FILE_SIZE // (1024 * 1024)}MB"
                 )
-            if image.size > 5 * 1024 * 1024:
+            # guess() only reads the file header, not the whole upload.
+            file_type = guess(image)
+            if file_type is None or file_type.mime not in ["image/jpeg", "image/png"]:
                 raise serializers.ValidationError(
-                    "Pictures must not be larger than 5MB"
+                    "Invalid file type. Only JPEG and PNG files are allowed"
                 )
         return value
+
+
+class MessageSearchResultSerializer(CustomerMessageSerializer):
+    """A message as returned by the admin search, with its sender and how well it matched."""
+    user_email = serializers.EmailField(source="user.email", read_only=True)
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(CustomerMessageSerializer.Meta):
+        fields = [
+            "reference_id",
+            "user",
+            "user_email",
+            "message",
+            "rank",
+            "date_created",
+            "date_updated",
+            "pictures",
+        ]
+
+
+class PictureValuesSerializer(ValuesSerializer):
+    serializer_class = PictureSerializer
+
+
+class CustomerMessageValuesSerializer(ValuesSerializer):
+    """values()-driven CustomerMessageSerializer for the message list's fast rendering mode."""
+    serializer_class = CustomerMessageSerializer
+    relations = {"pictures": Many(PictureValuesSerializer)}
@@ -1,3 +1,276 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import wait
+from datetime import timedelta
+from unittest import mock, skipUnless
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from utils.background import run_in_background, stage_upload
+from .models import CustomerMessage, Picture
+from .views import CustomerMessageAPIView
+from .search import create_search_trigger, search_messages
+from .utils import push_staged_picture
 
-# Create your tests here.
+User = get_user_model()
+
+
+def png_upload(name="receipt.png"):
+    output = io.BytesIO()
+    Image.new("RGB", (40, 30), "white").save(output, format="PNG")
+    return SimpleUploadedFile(name, output.getvalue(), content_type="image/png")
+
+
+def age(path, minutes):
+    modified = time.time() - minutes * 60
+    os.utime(path, (modified, modified))
+
+
+class LocalStorageMixin:
+    """Stores media on the local filesystem, as MEDIA_STORAGE=local does, in throwaway directories."""
+
+    def setUp(self):
+        super().setUp()
+        self.staging_dir, self.media_root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.staging_dir)
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            UPLOAD_STAGING_DIR=self.staging_dir,
+            MEDIA_ROOT=self.media_root,
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+            },
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def assertStored(self, picture):
+        self.assertEqual(picture.status, "UPLOADED")
+        for file in (picture.image, picture.thumbnail):
+            self.assertTrue(os.path.isfile(os.path.join(self.media_root, file.name)), file.name)
+
+
+class PictureUploadTests(LocalStorageMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(email="customer@example.com", full_name="Customer", password="pass12345")
+        )
+
+    def test_pictures_are_staged_then_pushed_in_the_background(self):
+        submitted, futures = [], []
+
+        def submit(fn, picture_id, staged_path, name):
+            submitted.append((Picture.objects.get(pk=picture_id).status, os.path.exists(staged_path)))
+            futures.append(run_in_background(fn, picture_id, staged_path, name))
+            return futures[-1]
+
+        with mock.patch("messaging.utils.run_in_background", side_effect=submit):
+            response = self.client.post(
+                "/api/v1/user/messaging",
+                {"message": "Receipts attached", "image_files": [png_upload("first.png"), png_upload("second.png")]},
+                format="multipart",
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([picture["status"] for picture in response.data["data"]["pictures"]], ["PENDING"] * 2)
+        # Each picture was staged before its push was handed to the pool.
+        self.assertEqual(submitted, [("PENDING", True)] * 2)
+
+        wait(futures)
+        message = CustomerMessage.objects.get()
+        for picture in message.pictures.all():
+            self.assertStored(picture)
+        self.assertEqual(os.listdir(self.staging_dir), [])
+
+
+class UploadGuardTests(LocalStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(email="customer@example.com", full_name="Customer", password="pass12345")
+        )
+
+    def post(self, *image_files):
+        return self.client.post(
+            "/api/v1/user/messaging", {"message": "Receipts attached", "image_files": list(image_files)}, format="multipart"
+        )
+
+    def assertRejected(self, response, message):
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(message, str(response.data))
+        # Cut off while streaming, not by the serializer's checks after the fact.
+        self.assertIn(message, response.wsgi_request.upload_rejection[1])
+        self.assertFalse(CustomerMessage.objects.exists())
+        self.assertFalse(Picture.objects.exists())
+        self.assertEqual(os.listdir(self.staging_dir), [])
+
+    def test_oversized_picture_is_rejected(self):
+        with mock.patch.object(CustomerMessageAPIView, "max_upload_file_size", 1024):
+            response = self.post(png_upload(), SimpleUploadedFile("large.png", b"\x89PNG\r\n\x1a\n" + bytes(4096)))
+
+        self.assertRejected(response, "Pictures must not be larger than")
+
+    def test_oversized_request_is_rejected(self):
+        with mock.patch.object(CustomerMessageAPIView, "max_upload_request_size", 1024):
+            response = self.post(png_upload(), SimpleUploadedFile("large.png", bytes(4096)))
+
+        self.assertRejected(response, "Request body must not be larger than")
+
+    def test_wrong_file_type_is_rejected(self):
+        response = self.post(png_upload(), SimpleUploadedFile("receipt.png", b"%PDF-1.4 " + bytes(512)))
+
+        self.assertRejected(response, "Only JPEG and PNG files are allowed")
+
+    def test_allowed_pictures_are_staged(self):
+        with mock.patch("messaging.utils.run_in_background"):
+            response = self.post(png_upload())
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(os.listdir(self.staging_dir)), 1)
+
+
+class PictureUploadRetryTests(LocalStorageMixin, TestCase):
+    def stage(self, picture, minutes_ago=30):
+        staged_path = stage_upload(png_upload(), prefix=f"picture-{picture.pk}")
+        age(staged_path, minutes_ago)
+        return staged_path
+
+    def retry(self):
+        call_command("retry_picture_uploads", stdout=io.StringIO())
+
+    def test_storage_error_keeps_the_staged_file_for_a_retry(self):
+        picture = Picture.objects.create(status="PENDING")
+        staged_path = self.stage(picture)
+
+        with mock.patch.object(default_storage, "save", side_effect=OSError("storage unavailable")):
+            with self.assertRaises(OSError):
+                push_staged_picture(picture.pk, staged_path, "receipt.png")
+        picture.refresh_from_db()
+        self.assertEqual(picture.status, "FAILED")
+        self.assertTrue(os.path.exists(staged_path))
+
+        self.retry()
+
+        picture.refresh_from_db()
+        self.assertStored(picture)
+        self.assertFalse(os.path.exists(staged_path))
+
+    def test_lost_pending_upload_is_pushed_once_stale(self):
+        picture = Picture.objects.create(status="PENDING")
+        staged_path = self.stage(picture, minutes_ago=1)
+
+        self.retry()
+        picture.refresh_from_db()
+        self.assertEqual(picture.status, "PENDING")
+
+        age(staged_path, 30)
+        self.retry()
+        picture.refresh_from_db()
+        self.assertStored(picture)
+
+    def test_unusable_image_fails_for_good(self):
+        picture = Picture.objects.create(status="PENDING")
+        staged_path = stage_upload(SimpleUploadedFile("receipt.png", b"not an image"), prefix=f"picture-{picture.pk}")
+
+        with self.assertRaises(OSError):
+            push_staged_picture(picture.pk, staged_path, "receipt.png")
+
+        picture.refresh_from_db()
+        self.assertEqual(picture.status, "FAILED")
+        self.assertFalse(os.path.exists(staged_path))
+
+    def test_orphaned_and_expired_files_are_deleted(self):
+        uploaded = Picture.objects.create(status="UPLOADED")
+        orphan = self.stage(uploaded)
+        pending = Picture.objects.create(status="PENDING")
+        Picture.objects.filter(pk=pending.pk).update(date_created=timezone.now() - timedelta(days=2))
+        expired = self.stage(pending, minutes_ago=48 * 60)
+
+        self.retry()
+
+        self.assertFalse(os.path.exists(orphan))
+        self.assertFalse(os.path.exists(expired))
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, "FAILED")
+
+
+class MessageSearchTests(TestCase):
+    def setUp(self):
+        customer = User.objects.create_user(email="customer@example.com", full_name="Customer", password="pass12345")
+        self.refund = CustomerMessage.objects.create(user=customer, message="Please refund my card payment")
+        self.card = CustomerMessage.objects.create(user=customer, message="My card was declined twice")
+        CustomerMessage.objects.create(user=customer, message="How do I change my address?")
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser(email="admin@example.com", full_name="Admin"))
+
+    def search(self, query):
+        return [message.message for message in search_messages(CustomerMessage.objects.all(), query)]
+
+    def test_substring_fallback_matches_every_word(self):
+        with mock.patch.object(connection, "vendor", "sqlite"):
+            self.assertEqual(self.search("CARD"), [self.card.message, self.refund.message])
+            self.assertEqual(self.search("card refund"), [self.refund.message])
+            self.assertEqual(self.search("card transfer"), [])
+
+    def test_search_endpoint(self):
+        with mock.patch.object(connection, "vendor", "sqlite"):
+            response = self.client.get("/api/v1/admin/messages/search", {"q": "declined"})
+
+        self.assertEqual(response.status_code, 200)
+        [result] = response.data["results"]["data"]
+        self.assertEqual(result["reference_id"], self.card.reference_id)
+        self.assertEqual(result["user_email"], "customer@example.com")
+        self.assertEqual(result["rank"], 0.0)
+
+    def test_search_endpoint_needs_a_query(self):
+        response = self.client.get("/api/v1/admin/messages/search", {"q": " "})
+
+        self.assertEqual(response.status_code, 400)
+
+    @skipUnless(connection.vendor == "postgresql", "Full-text search needs PostgreSQL")
+    def test_ranked_websearch(self):
+        self.assertEqual(self.search("cards"), [self.card.message, self.refund.message])
+        self.assertEqual(self.search('"card payment"'), [self.refund.message])
+        self.assertEqual(self.search("card -refund"), [self.card.message])
+        self.assertEqual(self.search("refund or address"), [
+            "How do I change my address?", self.refund.message,
+        ])
+
+        ranked = search_messages(CustomerMessage.objects.all(), "card declined")
+        self.assertEqual([message.pk for message in ranked], [self.card.pk])
+        self.assertGreater(ranked[0].rank, 0)
+
+    @skipUnless(connection.vendor == "postgresql", "Full-text search needs PostgreSQL")
+    def test_backfill_fills_messages_written_before_the_trigger(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DROP TRIGGER message_search_vector_update ON {connection.ops.quote_name(CustomerMessage._meta.db_table)}"
+            )
+        CustomerMessage.objects.update(search_vector=None)
+        self.assertEqual(self.search("card"), [])
+
+        # Runs deferred foreign key checks, which would otherwise block the CREATE INDEX inside TestCase's transaction.
+        connection.check_constraints()
+        with mock.patch("messaging.search.BACKFILL_BATCH_SIZE", 2):
+            create_search_trigger()
+
+        self.assertFalse(CustomerMessage.objects.filter(search_vector=None).exists())
+        self.assertEqual(self.search("card"), [self.card.message, self.refund.message])
+
+        # The trigger is back, so edited messages are searchable again straight away.
+        self.card.message = "My transfer was declined"
+        self.card.save()
+        self.assertEqual(self.search("transfer"), [self.card.message])
@@ -1,8 +1,10 @@
 from django.urls import path
 from .views import CustomerMessageAPIView, UserMessagesAPIView, UserMessageDetailAPIView
+from .async_views import AsyncCustomerMessageAPIView
 
 urlpatterns = [
    path("user/messaging", CustomerMessageAPIView.as_view(), name="customer-message"),
+   path("user/messaging/async", AsyncCustomerMessageAPIView.as_view(), name="customer-message-async"),
     path('user/messages', UserMessagesAPIView.as_view(), name='user-messages'),
     path('user/messages/<str:reference_id>', UserMessageDetailAPIView.as_view(), name='user-message-detail'),
 ]
\ No newline at end of file
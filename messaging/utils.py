@@ -1,2 +1,63 @@
+import os
+import re
+from django.db import transaction
+from utils.background import run_in_background, stage_upload
+from utils.images import normalize_image
+
+# Staged pictures are named after their Picture, so retry_picture_uploads can find them again.
+re_staged_picture = re.compile(r"^picture-(\d+)-(.+)$")
+
+
 def message_pictures_path(instance, filename):
     return f"message_pictures/{filename}"
+
+
+def upload_pictures(pictures, image_files):
+    """
+    Stages each uploaded image to local disk and hands it to the background pool, where it is
+    normalized and uploaded to storage, so several pictures are processed in parallel and the
+    request returns straight away. The pictures stay PENDING until their upload finishes; uploads
+    lost with a restarting worker are picked up by the retry_picture_uploads command.
+    """
+    for picture, image in zip(pictures, image_files):
+        staged_path = stage_upload(image, prefix=f"picture-{picture.pk}")
+        transaction.on_commit(
+            lambda picture=picture, staged_path=staged_path, name=image.name: run_in_background(
+                push_staged_picture, picture.pk, staged_path, name
+            )
+        )
+
+
+def remove_staged(staged_path):
+    try:
+        os.remove(staged_path)
+    except FileNotFoundError:
+        pass
+
+
+def push_staged_picture(picture_id, staged_path, name):
+    """
+    Normalizes a staged picture and uploads it to storage. The staged file is kept until the
+    picture is UPLOADED, so a picture FAILED by a storage error can be pushed again; one that isn't
+    a usable image fails for good and its staged file is removed.
+    """
+    from .models import Picture
+
+    picture = Picture(pk=picture_id)
+    try:
+        with open(staged_path, "rb") as staged_file:
+            image, thumbnail = normalize_image(staged_file, name)
+    except Exception:
+        Picture.objects.filter(pk=picture_id).update(status="FAILED")
+        remove_staged(staged_path)
+        raise
+    try:
+        picture.image.save(image.name, image, save=False)
+        picture.thumbnail.save(thumbnail.name, thumbnail, save=False)
+        Picture.objects.filter(pk=picture_id).update(
+            image=picture.image.name, thumbnail=picture.thumbnail.name, status="UPLOADED"
+        )
+    except Exception:
+        Picture.objects.filter(pk=picture_id).update(status="FAILED")
+        raise
+    remove_staged(staged_path)
@@ -6,18 +6,23 @@ from rest_framework import generics
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.pagination import PageNumberPagination
 from .models import CustomerMessage, Picture
-from .serializers import CustomerMessageSerializer
+from .serializers import CustomerMessageSerializer, CustomerMessageValuesSerializer
+from .utils import upload_pictures
+from utils.db_router import ReplicaReadMixin, pin_to_primary
+from utils.values import SPARSE_FIELDSET_PARAMETERS, ValuesListMixin
+from utils.uploads import ImageUploadGuardMixin
 
 # Create your views here.
 
 
-class CustomerMessageAPIView(generics.GenericAPIView):
+class CustomerMessageAPIView(ImageUploadGuardMixin, generics.GenericAPIView):
     """
     This view enables a user to contact Longman technologies directly. Here, a user is mandated to send\n 
     a message alongside the request body and they can also decide to send images to corroborate their concern.\n
     A user can send more than one picture alongside the message, which will be converted to a list\n 
     before being uploaded to the DB. Upon successfully sending the message, the admin will be alerted and the concern\n
-    will be taken up.
+    will be taken up. Pictures are uploaded in the background and show as PENDING until their upload completes.\n
+    Uploads that are not JPEG/PNG or exceed the size caps are rejected while they stream in.
     """
     permission_classes = [IsAuthenticated]
     serializer_class = CustomerMessageSerializer
@@ -61,8 +66,11 @@ class CustomerMessageAPIView(generics.GenericAPIView):
         image_files = request.FILES.getlist("image_files")
 
         if image_files:
-            pictures = [Picture.objects.create(image=image) for image in image_files]
+            pictures = Picture.objects.bulk_create([Picture(status="PENDING") for _ in image_files])
             message.pictures.set(pictures)
+            upload_pictures(pictures, image_files)
+
+        pin_to_primary(user.pk)
 
         response_data = {
             "status": status.HTTP_201_CREATED,
@@ -84,12 +92,14 @@ class CustomerMessageAPIView(generics.GenericAPIView):
     },
     parameters=[
         OpenApiParameter(name="page", description="Page number", required=False, type=int),
+        *SPARSE_FIELDSET_PARAMETERS,
     ],
     )
-class UserMessagesAPIView(generics.ListAPIView):
+class UserMessagesAPIView(ReplicaReadMixin, ValuesListMixin, generics.ListAPIView):
     """This view allows a user to view all the messages they have sent to Longman Technologies"""
     permission_classes = [IsAuthenticated]
     serializer_class = CustomerMessageSerializer
+    values_serializer_class = CustomerMessageValuesSerializer
     pagination_class = PageNumberPagination
 
     def get_queryset(self):
@@ -97,10 +107,10 @@ class UserMessagesAPIView(generics.ListAPIView):
         return CustomerMessage.objects.filter(user=user)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
+        queryset = self.get_list_queryset()
         paginator = self.pagination_class()
         paginated_queryset = paginator.paginate_queryset(queryset, request, view=self)
-        serializer = self.get_serializer(paginated_queryset, many=True)
+        serializer = self.get_list_serializer(paginated_queryset)
         response_data = {
             "status": status.HTTP_200_OK,
             "success": True,
@@ -0,0 +1,62 @@
+"""Thread pool for work that shouldn't hold up the request thread"""
+
+import contextvars
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection
+from .metrics import detach_request_timings
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS, thread_name_prefix="background"
+            )
+        return _executor
+
+
+def run_in_background(fn, *args, **kwargs):
+    """
+    Runs fn in the per-process background pool. Failures are logged rather than raised,
+    and the thread's database connection is closed once the task is done. The task runs in a
+    copy of the caller's context, so its log records carry the request's correlation ids; its
+    queries, e-mails and uploads don't count towards the request's timings, which may still be
+    running or be reported already.
+    """
+
+    def task():
+        detach_request_timings()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            logger.exception("Background task %s failed", getattr(fn, "__name__", fn))
+        finally:
+            connection.close()
+
+    return get_executor().submit(contextvars.copy_context().run, task)
+
+
+def stage_upload(uploaded_file, prefix=None):
+    """
+    Copies an uploaded file to UPLOAD_STAGING_DIR so background work can use it after the request ends.
+    The staged file is named `<prefix>-<original name>`, with a random prefix by default.
+    """
+    os.makedirs(settings.UPLOAD_STAGING_DIR, exist_ok=True)
+    staged_path = os.path.join(
+        settings.UPLOAD_STAGING_DIR, f"{prefix or uuid.uuid4().hex}-{os.path.basename(uploaded_file.name)}"
+    )
+    with open(staged_path, "wb") as staged_file:
+        for chunk in uploaded_file.chunks():
+            staged_file.write(chunk)
+    return staged_path
@@ -0,0 +1,88 @@
+"""Database routing for sending read-heavy views to a replica"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICA_DB_ALIAS = "replica"
+
+_read_from_replica = ContextVar("read_from_replica", default=False)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica only while a view has opted in through ReplicaReadMixin
+    (or the use_replica context manager). Writes and migrations always go to default.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get() and replica_configured():
+            return REPLICA_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+@contextmanager
+def use_replica():
+    token = _read_from_replica.set(True)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+def _primary_pin_key(user_id):
+    return f"db-router:primary-pin:{user_id}"
+
+
+def pin_to_primary(*user_ids):
+    """Keeps the given users' reads on the primary for REPLICA_STICKINESS_SECONDS (read-your-writes)."""
+    if not replica_configured():
+        return
+    cache.set_many(
+        {_primary_pin_key(user_id): True for user_id in user_ids if user_id},
+        settings.REPLICA_STICKINESS_SECONDS,
+    )
+
+
+def is_pinned_to_primary(user_id):
+    return bool(user_id) and cache.get(_primary_pin_key(user_id), False)
+
+
+class ReplicaReadMixin:
+    """
+    Serves safe (read-only) requests of a DRF view from the replica. Authentication and
+    permission checks still run against the primary, and users who wrote recently stay
+    on the primary until their stickiness window runs out.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            request.method in SAFE_METHODS
+            and replica_configured()
+            and not is_pinned_to_primary(request.user.pk)
+        ):
+            self._replica_token = _read_from_replica.set(True)
+
+    def dispatch(self, request, *args, **kwargs):
+        self._replica_token = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._replica_token is not None:
+                _read_from_replica.reset(self._replica_token)
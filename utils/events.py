@@ -0,0 +1,114 @@
+"""In-process fan-out of per-user events to server-sent-event streams"""
+
+import asyncio
+import contextvars
+from abc import ABC, abstractmethod
+import logging
+from collections import namedtuple
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# `data` is the JSON-encoded payload, encoded once however many streams the event goes to.
+Event = namedtuple("Event", ["id", "user_id", "type", "data"])
+
+
+def format_event(event):
+    """The event in text/event-stream framing."""
+    return f"id: {event.id}\nevent: {event.type}\ndata: {event.data}\n\n"
+
+
+class EventBackend(ABC):
+    """
+    Where a broker's events come from. listen() runs as a task on the server's event loop while
+    anyone is subscribed, calling deliver(event) for each new event until it is cancelled.
+    subscribed() returns the ids of the users with an open stream at that moment; events for
+    anyone else would only be dropped by the broker.
+    """
+
+    @abstractmethod
+    async def listen(self, deliver, subscribed):
+        ...
+
+
+class Subscription:
+    """One open stream's bounded queue of events waiting to be written."""
+
+    def __init__(self, user_id, queue_size):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind is dropped; it reconnects with Last-Event-ID and catches up from the outbox.
+            self.overflowed = True
+
+    async def get(self, timeout):
+        """The next event, or None if none arrived within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker:
+    """
+    Hands events from the backend to the open streams of the user they are for. Only one backend
+    listener runs per process, however many streams are open, and only while there are any.
+    """
+
+    def __init__(self, backend, queue_size):
+        self.backend = backend
+        self.queue_size = queue_size
+        self.subscriptions = {}
+        self.listener = None
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, self.queue_size)
+        self.subscriptions.setdefault(user_id, set()).add(subscription)
+        if self.listener is None or self.listener.done():
+            # A fresh context, so the listener doesn't inherit the subscribing request's.
+            self.listener = asyncio.get_running_loop().create_task(self.listen(), context=contextvars.Context())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscriptions = self.subscriptions.get(subscription.user_id, set())
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            self.subscriptions.pop(subscription.user_id, None)
+        if not self.subscriptions and self.listener is not None:
+            self.listener.cancel()
+            self.listener = None
+
+    def deliver(self, event):
+        for subscription in self.subscriptions.get(event.user_id, ()):
+            subscription.put(event)
+
+    def subscribed(self):
+        return list(self.subscriptions)
+
+    async def listen(self):
+        while True:
+            try:
+                await self.backend.listen(self.deliver, self.subscribed)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Event backend %s failed; restarting it", type(self.backend).__name__)
+                await asyncio.sleep(settings.EVENT_POLL_SECONDS)
+
+
+_broker = None
+
+
+def get_broker():
+    """The process's broker, with the EVENT_BACKEND class as its backend."""
+    global _broker
+    if _broker is None:
+        _broker = EventBroker(import_string(settings.EVENT_BACKEND)(), settings.EVENT_QUEUE_SIZE)
+    return _broker
@@ -0,0 +1,44 @@
+"""Pillow pipeline that normalizes uploaded images before they reach media storage"""
+
+import os
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+
+def encode_image(img, max_dimension):
+    """Downsizes img to fit max_dimension and re-encodes it; EXIF and other metadata are not carried over."""
+    from PIL import Image
+
+    img = img.copy()
+    img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    output = BytesIO()
+    img.save(output, format=settings.IMAGE_FORMAT, quality=settings.IMAGE_QUALITY)
+    return output.getvalue()
+
+
+def normalize_image(fp, name):
+    """
+    Returns (image, thumbnail) ContentFiles for an uploaded image: orientation applied,
+    metadata stripped, downsized to IMAGE_MAX_DIMENSION / IMAGE_THUMBNAIL_DIMENSION and
+    recompressed to IMAGE_FORMAT.
+    """
+    # Pillow is loaded on first use, from the background pool, rather than at worker boot.
+    from PIL import Image, ImageOps
+
+    with Image.open(fp) as img:
+        # Bake the EXIF orientation into the pixels, since the EXIF block itself is dropped.
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA") or settings.IMAGE_FORMAT == "JPEG":
+            img = img.convert("RGB")
+        image = encode_image(img, settings.IMAGE_MAX_DIMENSION)
+        thumbnail = encode_image(img, settings.IMAGE_THUMBNAIL_DIMENSION)
+
+    stem = os.path.splitext(os.path.basename(name))[0]
+    extension = EXTENSIONS[settings.IMAGE_FORMAT]
+    return (
+        ContentFile(image, name=f"{stem}.{extension}"),
+        ContentFile(thumbnail, name=f"{stem}_thumb.{extension}"),
+    )
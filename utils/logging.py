@@ -0,0 +1,189 @@
+"""
+Structured logging: JSON records carrying the request's correlation ids, written by a listener
+thread so that request threads only ever put records on a queue. Configured by LOGGING in
+controller/settings.py.
+"""
+
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import zlib
+from django.utils.functional import SimpleLazyObject, empty
+
+# Correlation fields of the current request or task, e.g. request_id, added to every record.
+_log_context = contextvars.ContextVar("log_context", default={})
+_log_request = contextvars.ContextVar("log_request", default=None)
+
+# LogRecord attributes that aren't extra fields passed by the caller.
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def bind_log_context(**fields):
+    """Adds fields, e.g. transaction_id, to the records logged for the rest of the current request or task."""
+    _log_context.set({**_log_context.get(), **fields})
+
+
+def start_log_context(request=None, **fields):
+    """Starts a fresh context, e.g. for a request; returns the tokens to pass to end_log_context."""
+    return _log_context.set(fields), _log_request.set(request)
+
+
+def end_log_context(tokens):
+    context_token, request_token = tokens
+    _log_context.reset(context_token)
+    _log_request.reset(request_token)
+
+
+def request_user_id(request):
+    """The id of the request's user if it has been authenticated already, without triggering authentication."""
+    user = request.__dict__.get("user")
+    if isinstance(user, SimpleLazyObject):
+        # Set by AuthenticationMiddleware and not looked up yet; DRF replaces it once it authenticates.
+        user = user._wrapped
+        if user is empty:
+            return None
+    return getattr(user, "pk", None)
+
+
+class CorrelationFilter(logging.Filter):
+    """
+    Adds the current context's fields and user_id to records. The context is the logging
+    thread's, so this must sit on the queue handler rather than on the handlers behind it.
+    """
+
+    def filter(self, record):
+        request = _log_request.get()
+        for name, value in _log_context.get().items():
+            setattr(record, name, value)
+        if request is None and hasattr(getattr(record, "request", None), "request_id"):
+            # django.request logs error responses after the middleware is done, passing the request.
+            request = record.request
+            record.request_id = request.request_id
+        user_id = request_user_id(request) if request is not None else None
+        if user_id is not None:
+            record.user_id = user_id
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of the records below WARNING from loggers with a sample rate, e.g.
+    {"access": 0.1}; a logger's rate also applies to its children. Records of one request are
+    kept or dropped together, so a sampled request can still be followed end to end. Kept
+    records carry their sample_rate so counts can be scaled back up.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = rates or {}
+
+    def rate_for(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1:
+            return True
+        request_id = getattr(record, "request_id", None)
+        # A request's position in 0-1 is the same for every logger, so a request kept at some rate
+        # keeps all its records from loggers sampled at that rate or more.
+        position = zlib.crc32(request_id.encode()) / 2**32 if request_id else random.random()
+        if position >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, then the correlation and extra fields."""
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES and not name.startswith("_"):
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on a bounded queue for a listener thread that passes them to `handlers`, so
+    writing logs never blocks the thread that logged. When the queue is full, records are
+    dropped and counted instead. In LOGGING, refer to the handlers as "cfg://handlers.<name>"
+    and give this handler a name that sorts after theirs, so they are configured first.
+    """
+
+    def __init__(self, handlers, queue_size=10000):
+        # dictConfig only resolves cfg:// references on item access, not when iterating.
+        self.handlers = [handlers[index] for index in range(len(handlers))]
+        self.queue_size = queue_size
+        self.dropped = 0
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.start_listener()
+        # A forked worker inherits neither the listener thread nor a safe queue lock.
+        os.register_at_fork(after_in_child=self.start_listener)
+        atexit.register(self.stop_listener)
+
+    def start_listener(self):
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self.listener = logging.handlers.QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def stop_listener(self):
+        if self.listener._thread is not None:
+            self.queue.put(self.listener._sentinel)
+            self.listener._thread.join()
+            self.listener._thread = None
+
+    def prepare(self, record):
+        # Arguments are merged now, as they may change before the listener gets to them; the
+        # exception is kept for the formatter, which renders it in the listener thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        # Handlers hold their lock while emitting, so this runs in one thread at a time.
+        try:
+            if self.dropped:
+                self.queue.put_nowait(self.dropped_record())
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def dropped_record(self):
+        return logging.makeLogRecord(
+            {
+                "name": __name__,
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": f"The log queue was full; {self.dropped} records were dropped",
+                "dropped": self.dropped,
+            }
+        )
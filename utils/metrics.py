@@ -0,0 +1,356 @@
+"""
+Per-request performance instrumentation: where a request's time went (database, e-mail, media
+storage, template and PDF rendering) and how many queries it ran, reported in its Server-Timing
+header and aggregated into Prometheus histograms per URL name.
+"""
+
+import atexit
+import bisect
+import contextvars
+import fcntl
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import ContextDecorator, contextmanager
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Time spent per phase of one request, e.g. {"db": [queries, seconds]}."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    def add(self, phase, seconds):
+        count_and_time = self.phases.setdefault(phase, [0, 0.0])
+        count_and_time[0] += 1
+        count_and_time[1] += seconds
+
+    def count(self, phase):
+        return self.phases.get(phase, (0, 0.0))[0]
+
+    def seconds(self, phase):
+        return self.phases.get(phase, (0, 0.0))[1]
+
+
+def start_request_timings():
+    """Starts timing the current request; returns the token to pass to end_request_timings."""
+    return _timings.set(RequestTimings())
+
+
+def end_request_timings(token):
+    timings = _timings.get()
+    _timings.reset(token)
+    return timings
+
+
+def detach_request_timings():
+    """Stops counting towards the current request in this context, e.g. in work it handed to another thread."""
+    _timings.set(None)
+
+
+def add_timing(phase, seconds):
+    """Counts `seconds` towards the current request's phase; does nothing outside a request."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+class timed(ContextDecorator):
+    """Times a block or function as a phase of the current request, e.g. `with timed("email"):`."""
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def _recreate_cm(self):
+        # A fresh instance per decorated call, as concurrent calls each need their own start time.
+        return type(self)(self.phase)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        add_timing(self.phase, time.perf_counter() - self.started)
+        return False
+
+
+def query_timer(execute, sql, params, many, context):
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add("db", time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # Connections are per thread, and a request's view may run in another thread than its
+    # middleware (ASGI), so the wrapper sits on every connection and finds its request through
+    # the context rather than being installed by the middleware.
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+def server_timing(timings, total):
+    """The Server-Timing header value: one entry per phase the request went through, then the total."""
+    entries = []
+    for phase, (count, seconds) in timings.phases.items():
+        description = f';desc="{count} queries"' if phase == "db" else ""
+        entries.append(f"{phase};dur={seconds * 1000:.2f}{description}")
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One count per bucket plus +Inf, not cumulative.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+def merge_snapshots(snapshots):
+    """Adds up snapshots into (histograms, counters) keyed like a Registry's."""
+    histograms, counters = {}, {}
+    for snapshot in snapshots:
+        for name, labels, buckets, counts, total in snapshot["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            histogram = histograms.setdefault(key, Histogram(tuple(buckets)))
+            histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+            histogram.sum += total
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+
+def to_snapshot(histograms, counters):
+    return {
+        "histograms": [
+            [name, labels, list(histogram.buckets), list(histogram.counts), histogram.sum]
+            for (name, labels), histogram in histograms.items()
+        ],
+        "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+    }
+
+
+def read_snapshot(path):
+    with open(path) as snapshot_file:
+        return json.load(snapshot_file)
+
+
+def write_snapshot(path, snapshot):
+    # Written aside and renamed, so a scrape never reads half a file.
+    fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as snapshot_file:
+        json.dump(snapshot, snapshot_file)
+    os.replace(temporary_path, path)
+
+
+@contextmanager
+def snapshots_lock(operation):
+    """
+    Held exclusively while snapshots of exited processes are folded into the retired one and shared
+    while snapshots are read, so a scrape never counts one both in its own file and the retired one.
+    """
+    with open(os.path.join(settings.METRICS_DIR, "retire.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, operation)
+        yield
+
+
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    """
+    This process's histograms and counters, keyed by metric name and labels. With METRICS_DIR
+    set, a thread in every process writes its snapshot there every METRICS_FLUSH_SECONDS and the
+    metrics endpoint adds up all of them, so gunicorn workers can be scraped through any one.
+    Snapshots of processes that have exited are folded into one for all of them, so the directory
+    doesn't grow with worker restarts and the totals never go down, which scrapers would take for
+    a reset.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.flusher_pid = None
+
+    def observe(self, name, labels, value, buckets):
+        self.start_flusher()
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return to_snapshot(self.histograms, self.counters)
+
+    def start_flusher(self):
+        # Started on first use in each process, as threads don't survive a fork.
+        if not settings.METRICS_DIR or self.flusher_pid == os.getpid():
+            return
+        with self.lock:
+            if self.flusher_pid != os.getpid():
+                self.flusher_pid = os.getpid()
+                threading.Thread(target=self.flush_periodically, name="metrics-flusher", daemon=True).start()
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_SECONDS)
+            try:
+                self.flush()
+            except OSError:
+                logger.exception("Could not write the metrics snapshot to %s", settings.METRICS_DIR)
+
+    def flush(self):
+        if not settings.METRICS_DIR or self.flusher_pid != os.getpid():
+            return
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        write_snapshot(os.path.join(settings.METRICS_DIR, f"metrics-{os.getpid()}.json"), self.snapshot())
+
+    def retire_dead_snapshots(self):
+        """Folds the snapshots of processes that have exited into metrics-retired.json."""
+        dead = []
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, "metrics-*.json")):
+            pid = os.path.basename(path)[len("metrics-"):-len(".json")]
+            if pid.isdigit() and not process_exists(int(pid)):
+                dead.append(path)
+        if not dead:
+            return
+        retired_path = os.path.join(settings.METRICS_DIR, "metrics-retired.json")
+        # Workers scraped at the same time must not both fold in the same snapshot.
+        with snapshots_lock(fcntl.LOCK_EX):
+            snapshots = []
+            for path in [retired_path, *dead]:
+                try:
+                    snapshots.append(read_snapshot(path))
+                except FileNotFoundError:
+                    continue
+            write_snapshot(retired_path, to_snapshot(*merge_snapshots(snapshots)))
+            for path in dead:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def collect(self):
+        """All processes' histograms and counters, added up, those of exited processes included."""
+        if not settings.METRICS_DIR:
+            return merge_snapshots([self.snapshot()])
+        self.flush()
+        try:
+            self.retire_dead_snapshots()
+        except (OSError, ValueError):
+            logger.exception("Could not retire the metrics snapshots of exited processes")
+        snapshots = []
+        with snapshots_lock(fcntl.LOCK_SH):
+            for path in glob.glob(os.path.join(settings.METRICS_DIR, "metrics-*.json")):
+                try:
+                    snapshots.append(read_snapshot(path))
+                except (OSError, ValueError):
+                    continue
+        return merge_snapshots(snapshots)
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+METRIC_HELP = {
+    "http_request_duration_seconds": ("histogram", "Time to respond, by URL name, method and status class."),
+    "http_request_phase_seconds": ("histogram", "Time spent in a phase (db, email, template, ...) by requests that went through it."),
+    "http_request_queries": ("histogram", "SQL queries run per request."),
+    "http_request_query_budget_exceeded_total": ("counter", "Requests that ran more queries than their QUERY_BUDGETS entry."),
+}
+
+
+def format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    histograms, counters = registry.collect()
+    lines = []
+    for name, (kind, help_text) in METRIC_HELP.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip([*histogram.buckets, "+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def record_request(view, method, status_code, timings, total):
+    """Adds a finished request to the histograms and checks it against its query budget."""
+    queries = timings.count("db")
+    registry.observe(
+        "http_request_duration_seconds",
+        {"view": view, "method": method, "status": f"{status_code // 100}xx"},
+        total,
+        DURATION_BUCKETS,
+    )
+    registry.observe("http_request_queries", {"view": view}, queries, QUERY_BUCKETS)
+    for phase, (_, seconds) in timings.phases.items():
+        registry.observe("http_request_phase_seconds", {"view": view, "phase": phase}, seconds, DURATION_BUCKETS)
+
+    budget = settings.QUERY_BUDGETS.get(view, settings.DEFAULT_QUERY_BUDGET)
+    if budget and queries > budget:
+        registry.increment("http_request_query_budget_exceeded_total", {"view": view})
+        logger.warning(
+            "%s ran %s queries, over its budget of %s",
+            view,
+            queries,
+            budget,
+            extra={"view": view, "queries": queries, "query_budget": budget, "db_ms": round(timings.seconds("db") * 1000, 2)},
+        )
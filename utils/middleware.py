@@ -0,0 +1,228 @@
+import logging
+import re
+import time
+import uuid
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import LazyObject, empty
+from .logging import end_log_context, start_log_context
+from .metrics import end_request_timings, record_request, server_timing, start_request_timings
+from .profiling import PROFILE_HEADER, profile_request, read_profile_token, start_tracing_memory
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; without it responses are gzipped.
+    brotli = None
+
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("access")
+
+re_request_id = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestLogMiddleware:
+    """
+    Gives each request a correlation id for its log records: the X-Request-ID header set by the
+    client or a proxy when it looks like one, a new id otherwise. The id is echoed in the response.
+    Logs one access record per request, at WARNING for server errors and requests slower than
+    LOG_SLOW_REQUEST_MS, at INFO (and subject to sampling) otherwise.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tokens, started = self.start(request)
+        try:
+            return self.finish(request, self.get_response(request), started)
+        finally:
+            end_log_context(tokens)
+
+    async def __acall__(self, request):
+        tokens, started = self.start(request)
+        try:
+            return self.finish(request, await self.get_response(request), started)
+        finally:
+            end_log_context(tokens)
+
+    def start(self, request):
+        request_id = request.headers.get("X-Request-ID", "")
+        if not re_request_id.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        return start_log_context(request, request_id=request_id), time.perf_counter()
+
+    def finish(self, request, response, started):
+        duration_ms = (time.perf_counter() - started) * 1000
+        response["X-Request-ID"] = request.request_id
+        slow = duration_ms >= settings.LOG_SLOW_REQUEST_MS
+        access_logger.log(
+            logging.WARNING if slow or response.status_code >= 500 else logging.INFO,
+            "%s %s %s %.1fms",
+            request.method,
+            request.path,
+            response.status_code,
+            duration_ms,
+            extra={
+                "method": request.method,
+                "path": request.path,
+                "status_code": response.status_code,
+                "duration_ms": round(duration_ms, 1),
+            },
+        )
+        return response
+
+
+class PerformanceMiddleware:
+    """
+    Times each request by phase: SQL queries (and their count), opening database connections,
+    e-mail, media storage, template and PDF rendering. Reports them in a Server-Timing header to
+    the clients SERVER_TIMING allows, records them in the Prometheus histograms served at
+    /metrics under the request's URL name, and logs requests that run more queries than their
+    QUERY_BUDGETS entry.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = start_request_timings()
+        try:
+            response = self.get_response(request)
+        finally:
+            timings = end_request_timings(token)
+        return self.process_response(request, response, timings)
+
+    async def __acall__(self, request):
+        token = start_request_timings()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timings = end_request_timings(token)
+        return self.process_response(request, response, timings)
+
+    def process_response(self, request, response, timings):
+        total = time.perf_counter() - timings.started
+        if shows_server_timing(request):
+            response["Server-Timing"] = server_timing(timings, total)
+        resolver_match = getattr(request, "resolver_match", None)
+        view = resolver_match.view_name if resolver_match else "unmatched"
+        record_request(view, request.method, response.status_code, timings, total)
+        return response
+
+
+def shows_server_timing(request):
+    if settings.SERVER_TIMING != "staff":
+        return settings.SERVER_TIMING == "all"
+    # Only a user authentication has resolved already (DRF sets the one it authenticated): looking
+    # the session's user up now would query the database, which async requests can't do here.
+    user = getattr(request, "user", None)
+    if isinstance(user, LazyObject) and user._wrapped is empty:
+        return False
+    return bool(user is not None and user.is_staff)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests that carry an X-Profile header signed for an admin (see
+    admin/profiles/tokens), with cProfile or tracemalloc, and names the stored profile in the
+    response's X-Profile-Id header. Headers that are invalid, expired or signed for another path
+    are ignored. With PROFILING_TRACE_MEMORY, workers trace memory from the start, so their
+    snapshots cover everything they allocated. Not installed while PROFILING_SECRET is unset.
+
+    Other requests pass straight through, under ASGI without leaving the event loop. cProfile
+    follows a single thread, so a profiled request runs the rest of the chain from one thread,
+    which Django then also runs the sync view in.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_SECRET:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        if settings.PROFILING_TRACE_MEMORY:
+            start_tracing_memory()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        fields = self.profile_fields(request)
+        if fields is None:
+            return self.get_response(request)
+        return profile_request(self.get_response, request, fields)
+
+    async def __acall__(self, request):
+        fields = self.profile_fields(request)
+        if fields is None:
+            return await self.get_response(request)
+        return await sync_to_async(profile_request)(async_to_sync(self.get_response), request, fields)
+
+    def profile_fields(self, request):
+        """The fields of the request's X-Profile header, None when it isn't to be profiled."""
+        token = request.headers.get(PROFILE_HEADER)
+        if not token:
+            return None
+        fields = read_profile_token(token)
+        if fields is None or fields["path"] not in ("", request.path):
+            logger.warning("Ignored an invalid or expired %s header on %s %s", PROFILE_HEADER, request.method, request.path)
+            return None
+        return fields
+
+
+# "br" unless it is refused with a zero quality ("br;q=0", "br; q=0.000"); "br;q=0.5" is accepted.
+re_accepts_brotli = re.compile(r"\bbr\b(?!\s*;\s*q=0(\.0*)?\s*(,|$))")
+COMPRESSIBLE_TYPES = re.compile(r"^text/|json|xml|javascript|yaml|openapi|csv")
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Negotiated response compression for text-like payloads of at least COMPRESSION_MIN_SIZE bytes:
+    brotli when the client accepts it and the brotli package is installed, gzip otherwise.
+    Images and PDFs are already compressed and passed through untouched.
+    """
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        if not COMPRESSIBLE_TYPES.search(response.get("Content-Type", "")):
+            return response
+        if (
+            brotli is None
+            or response.streaming
+            or response.has_header("Content-Encoding")
+            or not re_accepts_brotli.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed_content = brotli.compress(response.content, quality=settings.BROTLI_QUALITY)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers["Content-Length"] = str(len(response.content))
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
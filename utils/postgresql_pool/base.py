@@ -0,0 +1,122 @@
+"""
+PostgreSQL backend that records connection-setup time and, when a POOL is configured
+for the database, borrows connections from an in-process pool instead of opening a new
+TCP/auth/SSL session for every request.
+"""
+
+import os
+import threading
+import time
+import psycopg2
+from psycopg2 import extensions, pool
+from django.db.backends.postgresql import base
+from utils.metrics import add_timing
+
+
+class ConnectionPool(pool.ThreadedConnectionPool):
+    """
+    Thread-safe pool that opens connections through Django's own connection setup and
+    blocks (up to `timeout` seconds) instead of failing when all connections are busy.
+    Connections that sat in the pool for more than `check_idle` seconds are pinged before being
+    handed out, as the server, a proxy or a firewall may have dropped them meanwhile without the
+    client noticing; dead ones are replaced.
+    """
+
+    def __init__(self, min_size, max_size, connect, timeout, check_idle):
+        self._connect_fn = connect
+        self._slots = threading.BoundedSemaphore(max_size)
+        self.timeout = timeout
+        self.check_idle = check_idle
+        # When each pooled connection was put back, by id().
+        self._returned_at = {}
+        super().__init__(min_size, max_size)
+
+    def _connect(self, key=None):
+        conn = self._connect_fn()
+        if key is not None:
+            self._used[key] = conn
+            self._rused[id(conn)] = key
+        else:
+            self._pool.append(conn)
+        return conn
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise pool.PoolError(f"No database connection became free within {self.timeout}s")
+        try:
+            conn = super().getconn(key)
+            while not self.usable(conn):
+                super().putconn(conn, close=True)
+                conn = super().getconn(key)
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def usable(self, conn):
+        returned_at = self._returned_at.pop(id(conn), None)
+        if conn.closed or conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if returned_at is None or time.monotonic() - returned_at < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def putconn(self, conn, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+            # psycopg2 closes the connections returned beyond min_size rather than pooling them.
+            if not conn.closed:
+                self._returned_at[id(conn)] = time.monotonic()
+        finally:
+            self._slots.release()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connection_setup_time = 0.0
+
+    @property
+    def pool_settings(self):
+        return self.settings_dict.get("POOL")
+
+    def get_pool(self, conn_params):
+        # Pools are per process: gunicorn forks workers after the master may have touched the DB.
+        key = (self.alias, os.getpid())
+        with self._pools_lock:
+            if key not in self._pools:
+                self._pools[key] = ConnectionPool(
+                    min_size=self.pool_settings.get("MIN_SIZE", 1),
+                    max_size=self.pool_settings.get("MAX_SIZE", 4),
+                    connect=lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                    timeout=self.pool_settings.get("TIMEOUT", 10),
+                    check_idle=self.pool_settings.get("CHECK_IDLE_SECONDS", 30),
+                )
+            return self._pools[key]
+
+    def get_new_connection(self, conn_params):
+        started = time.perf_counter()
+        try:
+            if self.pool_settings:
+                return self.get_pool(conn_params).getconn()
+            return super().get_new_connection(conn_params)
+        finally:
+            setup_time = time.perf_counter() - started
+            self.connection_setup_time += setup_time
+            add_timing("db-connect", setup_time)
+
+    def _close(self):
+        if self.connection is not None and self.pool_settings:
+            with self.wrap_database_errors:
+                return self.get_pool(self.get_connection_params()).putconn(self.connection)
+        return super()._close()
@@ -0,0 +1,221 @@
+"""
+On-demand profiling of live workers. A request carrying an X-Profile header signed for an admin
+runs under cProfile ("cpu") or tracemalloc ("memory"); admins can also snapshot a whole worker's
+memory. Results are kept in PROFILES_DIR for download. All of it is off while PROFILING_SECRET
+is unset.
+"""
+
+import cProfile
+import datetime
+import glob
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import resource
+import secrets
+import threading
+import time
+import tracemalloc
+from django.conf import settings
+from django.core import signing
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_KINDS = ("cpu", "memory")
+# Functions or allocation sites listed in a report.
+REPORT_LINES = 50
+
+re_profile_id = re.compile(r"^\d{8}T\d{6}-(cpu|memory|snapshot)-[0-9a-f]{8}$")
+
+# cProfile and tracemalloc can each profile one thing at a time per process.
+_profiling = threading.Lock()
+_last_snapshot = None
+
+# tracemalloc's own allocations and those of imports are noise in the reports.
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+)
+
+
+def profile_signer():
+    return signing.TimestampSigner(key=settings.PROFILING_SECRET, salt="utils.profiling")
+
+
+def make_profile_token(kind, user, path=""):
+    """A value for the X-Profile header, valid for PROFILING_TOKEN_SECONDS; `path` limits it to one URL path."""
+    return profile_signer().sign_object({"kind": kind, "path": path, "user": user.pk})
+
+
+def read_profile_token(token):
+    """The fields of a valid, unexpired X-Profile value, None otherwise."""
+    try:
+        fields = profile_signer().unsign_object(token, max_age=settings.PROFILING_TOKEN_SECONDS)
+    except signing.BadSignature:
+        return None
+    return fields if fields.get("kind") in PROFILE_KINDS else None
+
+
+def format_size(size):
+    return f"{size / 2**20:.1f} MiB"
+
+
+def start_tracing_memory():
+    """Starts tracemalloc, which only sees memory allocated from then on; returns False if it was running already."""
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(settings.PROFILING_TRACEMALLOC_FRAMES)
+    return True
+
+
+def take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+
+def run_cpu_profile(get_response, request):
+    profiler = cProfile.Profile()
+    response = profiler.runcall(get_response, request)
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(REPORT_LINES)
+    return response, report.getvalue(), ("prof", profiler.dump_stats)
+
+
+def run_memory_profile(get_response, request):
+    # Workers tracing already (PROFILING_TRACE_MEMORY or a snapshot) keep tracing afterwards.
+    was_tracing = not start_tracing_memory()
+    if was_tracing:
+        tracemalloc.reset_peak()
+    try:
+        before = take_snapshot()
+        response = get_response(request)
+        after = take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    lines = [f"Peak traced memory: {format_size(peak)}", "", "Allocated during the request and still held at its end:"]
+    lines += map(str, after.compare_to(before, "lineno")[:REPORT_LINES])
+    return response, "\n".join(lines) + "\n", ("tracemalloc", after.dump)
+
+
+PROFILERS = {"cpu": run_cpu_profile, "memory": run_memory_profile}
+
+
+def profile_request(get_response, request, fields):
+    """Runs the request under the profiler named by its X-Profile fields and stores the result."""
+    if not _profiling.acquire(blocking=False):
+        logger.warning("Did not profile %s %s: another profile is running", request.method, request.path)
+        return get_response(request)
+    try:
+        started = time.perf_counter()
+        response, report, raw = PROFILERS[fields["kind"]](get_response, request)
+        duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        resolver_match = getattr(request, "resolver_match", None)
+        profile = save_profile(
+            fields["kind"],
+            f"{request.method} {request.path} -> {response.status_code} in {duration_ms} ms\n\n{report}",
+            raw,
+            method=request.method,
+            path=request.path,
+            view=resolver_match.view_name if resolver_match else None,
+            status_code=response.status_code,
+            duration_ms=duration_ms,
+            request_id=getattr(request, "request_id", None),
+            requested_by=fields["user"],
+        )
+    finally:
+        _profiling.release()
+    logger.info("Profiled %s %s as %s", request.method, request.path, profile["id"])
+    response["X-Profile-Id"] = profile["id"]
+    return response
+
+
+def snapshot_memory(user):
+    """
+    Snapshots the memory traced in this worker: the largest allocation sites and what grew since
+    its previous snapshot. Returns the stored profile, or None if tracing has only been started
+    now, as it only sees memory allocated from then on. Raises RuntimeError while another profile runs.
+    """
+    global _last_snapshot
+    if not _profiling.acquire(blocking=False):
+        raise RuntimeError("Another profile is running in this worker, try again.")
+    try:
+        if start_tracing_memory():
+            return None
+        snapshot = take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        # ru_maxrss is in KiB on Linux.
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        lines = [
+            f"Traced memory: {format_size(current)} now, {format_size(peak)} at peak since the previous snapshot",
+            f"Peak RSS of the worker: {format_size(max_rss)}",
+            "",
+            "Largest allocation sites:",
+            *map(str, snapshot.statistics("lineno")[:REPORT_LINES]),
+        ]
+        if _last_snapshot is not None:
+            previous_time, previous = _last_snapshot
+            lines += ["", f"Growth since the snapshot of {previous_time}:"]
+            lines += map(str, snapshot.compare_to(previous, "lineno")[:REPORT_LINES])
+        profile = save_profile("snapshot", "\n".join(lines) + "\n", ("tracemalloc", snapshot.dump), requested_by=user.pk)
+        _last_snapshot = (profile["created"], snapshot)
+        return profile
+    finally:
+        _profiling.release()
+
+
+def save_profile(kind, report, raw, **details):
+    """Writes a report, the raw profile for other tools and their details to PROFILES_DIR."""
+    created = datetime.datetime.now(datetime.timezone.utc)
+    profile_id = f"{created:%Y%m%dT%H%M%S}-{kind}-{secrets.token_hex(4)}"
+    extension, write_raw = raw
+    files = {"report": f"{profile_id}.txt", "raw": f"{profile_id}.{extension}"}
+    os.makedirs(settings.PROFILES_DIR, exist_ok=True)
+    with open(os.path.join(settings.PROFILES_DIR, files["report"]), "w") as report_file:
+        report_file.write(report)
+    write_raw(os.path.join(settings.PROFILES_DIR, files["raw"]))
+    profile = {"id": profile_id, "kind": kind, "created": created.isoformat(), "pid": os.getpid(), "files": files, **details}
+    # Written last, so listings only see complete profiles.
+    with open(os.path.join(settings.PROFILES_DIR, f"{profile_id}.json"), "w") as details_file:
+        json.dump(profile, details_file)
+    prune_profiles()
+    return profile
+
+
+def list_profiles():
+    """The stored profiles' details, newest first."""
+    profiles = []
+    for path in glob.glob(os.path.join(settings.PROFILES_DIR, "*.json")):
+        try:
+            with open(path) as details_file:
+                profiles.append(json.load(details_file))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda profile: profile["created"], reverse=True)
+
+
+def prune_profiles():
+    for profile in list_profiles()[settings.PROFILES_KEEP:]:
+        for name in [*profile["files"].values(), f"{profile['id']}.json"]:
+            try:
+                os.remove(os.path.join(settings.PROFILES_DIR, name))
+            except FileNotFoundError:
+                pass
+
+
+def profile_file_path(profile_id, file):
+    """The path of a stored profile's "report" or "raw" file, None if there is no such file."""
+    if not re_profile_id.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(settings.PROFILES_DIR, f"{profile_id}.json")) as details_file:
+            name = json.load(details_file)["files"].get(file)
+    except (OSError, ValueError):
+        return None
+    return os.path.join(settings.PROFILES_DIR, name) if name else None
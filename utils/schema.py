@@ -0,0 +1,81 @@
+"""OpenAPI schema served from memory instead of being regenerated on every request"""
+
+import hashlib
+import json
+import os
+import threading
+import yaml
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+
+class CachedSchemaView(SpectacularAPIView):
+    """
+    SpectacularAPIView that builds the schema at most once per process. It is loaded from
+    API_SCHEMA_FILE when that file exists (written at build time by `manage.py spectacular`),
+    otherwise generated on the first request. Each rendered format is kept in memory and
+    served with a strong ETag.
+    """
+
+    _schema = None
+    _rendered = {}
+    _lock = threading.Lock()
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        content, etag = self.get_rendered_schema(request)
+        # Weak comparison, so the W/ tag CompressionMiddleware gives compressed responses still matches.
+        if etag in [tag.removeprefix("W/") for tag in parse_etags(request.headers.get("If-None-Match", ""))]:
+            return HttpResponseNotModified(headers={"ETag": etag})
+
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f"{content_type}; charset={renderer.charset}"
+        response = HttpResponse(content, content_type=content_type)
+        response["ETag"] = etag
+        response["Cache-Control"] = "public, max-age=300"
+        return response
+
+    def get_rendered_schema(self, request):
+        renderer = request.accepted_renderer
+        key = renderer.media_type
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            with self._lock:
+                rendered = self._rendered.get(key)
+                if rendered is None:
+                    content = self.read_schema_file(renderer.format)
+                    if content is None:
+                        content = renderer.render(self.get_schema(request), renderer.media_type, {})
+                    etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+                    rendered = self._rendered[key] = (content, etag)
+        return rendered
+
+    def read_schema_file(self, format):
+        """Returns the prebuilt schema file's bytes when it exists and is already in the requested format."""
+        path = settings.API_SCHEMA_FILE
+        if not path or not os.path.exists(path):
+            return None
+        file_format = "json" if path.endswith(".json") else "yaml"
+        if format != file_format:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def get_schema(self, request):
+        cls = type(self)
+        if cls._schema is None:
+            path = settings.API_SCHEMA_FILE
+            if path and os.path.exists(path):
+                with open(path) as f:
+                    if path.endswith(".json"):
+                        cls._schema = json.load(f)
+                    else:
+                        cls._schema = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+            else:
+                cls._schema = self._get_schema_response(request).data
+        return cls._schema
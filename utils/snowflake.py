@@ -1,15 +1,20 @@
 """Snowflake ID generator for Django models"""
 
+import threading
 import time
 
 class Snowflake:
-    """Snowflake ID generator for Django models"""
+    """
+    Snowflake ID generator for Django models. `worker_id` is an int, or a function returning the
+    worker id to use, called for every id, e.g. utils.worker_ids.WorkerIdLease.get.
+    """
 
     def __init__(self, worker_id, datacenter_id):
         self.worker_id = worker_id
         self.datacenter_id = datacenter_id
         self.sequence = 0
         self.timestamp = -1
+        self._lock = threading.Lock()
 
         self.twepoch = 1288834974657 
         self.datacenter_bits = 5
@@ -27,12 +32,17 @@ class Snowflake:
         self.sequence_mask = -1 ^ (-1 << self.sequence_bits)
 
         if (
-            self.worker_id > self.max_worker_id
+            not callable(self.worker_id) and self.worker_id > self.max_worker_id
             or self.datacenter_id > self.max_datacenter_id
         ):
             raise ValueError("Worker ID or Datacenter ID is greater than max")
 
     def generate_id(self):
+        # Threads share the generator, so the sequence has to be advanced under a lock.
+        with self._lock:
+            return self._next_id()
+
+    def _next_id(self):
         now = int(time.time() * 1000)
 
         if now < self.timestamp:
@@ -46,16 +56,23 @@ class Snowflake:
             self.sequence = 0
 
         self.timestamp = now
+        worker_id = self.worker_id() if callable(self.worker_id) else self.worker_id
+        if worker_id > self.max_worker_id:
+            raise ValueError("Worker ID is greater than max")
 
         snowflake_id = (
             ((now - self.twepoch) << self.timestamp_shift)
             | (self.datacenter_id << self.datacenter_id_shift)
-            | (self.worker_id << self.worker_id_shift)
+            | (worker_id << self.worker_id_shift)
             | self.sequence
         )
 
         return snowflake_id
 
+    def first_id_at(self, unix_time):
+        """The smallest id any worker could generate at `unix_time` (seconds), e.g. to query ids by age."""
+        return (int(unix_time * 1000) - self.twepoch) << self.timestamp_shift
+
     def wait_next_millis(self, current_time):
         while current_time <= self.timestamp:
             current_time = int(time.time() * 1000)
@@ -0,0 +1,26 @@
+"""Media storage whose API calls count as the "storage" phase of the request making them."""
+
+from cloudinary_storage.storage import MediaCloudinaryStorage as CloudinaryStorage
+from .metrics import timed
+
+
+class MediaCloudinaryStorage(CloudinaryStorage):
+    @timed("storage")
+    def _open(self, name, mode="rb"):
+        return super()._open(name, mode)
+
+    @timed("storage")
+    def _save(self, name, content):
+        return super()._save(name, content)
+
+    @timed("storage")
+    def delete(self, name):
+        return super().delete(name)
+
+    @timed("storage")
+    def exists(self, name):
+        return super().exists(name)
+
+    @timed("storage")
+    def size(self, name):
+        return super().size(name)
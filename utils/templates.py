@@ -0,0 +1,22 @@
+"""Django template backend that times rendering as the "template" phase of the current request."""
+
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+from .metrics import timed
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        with timed("template"):
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from .tools import worker_id_lease
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Gives the tests the static snowflake worker id (SNOWFLAKE_WORKER_ID, 0 if unset) rather than a
+    lease, whose connection would keep the test database in use when it is dropped.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        worker_id_lease.static_worker_id = settings.SNOWFLAKE_WORKER_ID or 0
@@ -0,0 +1,339 @@
+import gzip
+import json
+import time
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from accounts.models import User
+from accounts.serializers import UserDetailValuesSerializer
+from banking.models import Account, Transaction
+from banking.operations import transfer_funds
+from banking.serializers import TransactionValuesSerializer
+from messaging.models import CustomerMessage, Picture
+from .background import run_in_background
+from .db_router import REPLICA_DB_ALIAS, replica_configured
+from .middleware import CompressionMiddleware, brotli
+from .metrics import end_request_timings, start_request_timings, timed
+from .tools import snowflake
+from .values import ValuesSerializer
+from .worker_ids import WorkerIdLease
+
+
+class WorkerIdLeaseTests(TestCase):
+    def lease(self, **kwargs):
+        lease = WorkerIdLease(1, range(30, 32), **kwargs)
+        self.addCleanup(lease.release)
+        return lease
+
+    def test_ids_are_only_generated_for_rows_being_saved(self):
+        with mock.patch.object(snowflake, "worker_id", mock.Mock(return_value=3)) as worker_id:
+            user = User(email="customer@example.com", full_name="Customer")
+            self.assertIsNone(user.pk)
+            worker_id.assert_not_called()
+
+            user.save()
+
+        worker_id.assert_called_once()
+        self.assertEqual(User.objects.get(email="customer@example.com").pk, user.pk)
+
+    def test_processes_lease_different_ids(self):
+        first, second, third = self.lease(), self.lease(), self.lease()
+
+        self.assertEqual(first.get(), 30)
+        self.assertEqual(second.get(), 31)
+        with self.assertRaisesMessage(RuntimeError, "No free snowflake worker id in 30-31"):
+            third.get()
+
+        first.release()
+        self.assertEqual(third.get(), 30)
+
+    def test_static_worker_id_leases_nothing(self):
+        lease = self.lease(static_worker_id=5)
+
+        self.assertEqual(lease.get(), 5)
+        self.assertIsNone(lease.connection)
+
+
+class BackgroundTaskTests(TestCase):
+    def test_task_does_not_count_towards_the_request(self):
+        def send_email():
+            with timed("email"):
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+
+        token = start_request_timings()
+        run_in_background(send_email).result()
+        timings = end_request_timings(token)
+
+        self.assertEqual(timings.phases, {})
+
+    def test_failure_is_logged_not_raised(self):
+        def send_email():
+            raise ConnectionError("e-mail API is down")
+
+        with self.assertLogs("utils.background", "ERROR") as logs:
+            self.assertIsNone(run_in_background(send_email).result())
+
+        self.assertIn("Background task send_email failed", logs.output[0])
+        self.assertIn("ConnectionError: e-mail API is down", logs.output[0])
+
+    def test_thread_connection_is_closed(self):
+        used = []
+
+        def query(fail):
+            # Each thread has its own connection.
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            used.append(connections["default"])
+            if fail:
+                raise RuntimeError("task failed")
+
+        with self.assertLogs("utils.background", "ERROR"):
+            for fail in (False, True):
+                run_in_background(query, fail).result()
+
+        self.assertEqual(len(used), 2)
+        for background_connection in used:
+            self.assertIsNot(background_connection, connections["default"])
+            self.assertIsNone(background_connection.connection)
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Reads of the replica views go to "replica", here the test database on a connection of its own,
+    as a real replica's would be. Rows are committed, so both connections see them.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # Added once the test database exists, so the runner neither checks nor creates the alias.
+        connections.settings[REPLICA_DB_ALIAS] = dict(connections["default"].settings_dict)
+        cls.databases = {"default", REPLICA_DB_ALIAS}
+        cls.addClassCleanup(cls.remove_replica)
+        super().setUpClass()
+
+    @classmethod
+    def remove_replica(cls):
+        connections[REPLICA_DB_ALIAS].close()
+        del connections[REPLICA_DB_ALIAS]
+        del connections.settings[REPLICA_DB_ALIAS]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="customer@example.com", full_name="Customer", password="pass12345")
+        self.account = Account.objects.create(user=self.user, current_balance=Decimal("20000.00"))
+        payee = User.objects.create_user(email="payee@example.com", full_name="Payee", password="pass12345")
+        self.payee_account = Account.objects.create(user=payee, current_balance=Decimal("0.00"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url, client=None):
+        """The response to a GET of `url` and the number of queries it ran on the replica."""
+        with CaptureQueriesContext(connections[REPLICA_DB_ALIAS]) as replica_queries:
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response, len(replica_queries)
+
+    def test_read_views_use_the_replica(self):
+        self.assertTrue(replica_configured())
+        credit = Transaction.objects.create(
+            transaction_type="CREDIT", to_account=self.account, from_account=self.payee_account, amount=Decimal("5.00")
+        )
+        CustomerMessage.objects.create(user=self.user, message="Hello")
+        admin_client = APIClient()
+        admin_client.force_authenticate(User.objects.create_superuser(email="admin@example.com", full_name="Admin"))
+
+        # The statement's logo is not in the repo; the stand-in still reads the ledger entries.
+        with mock.patch("banking.views.send_attachment_email", return_value="Success"), mock.patch(
+            "banking.views.generate_ledger_pdf", side_effect=lambda entries, *args: bytes(len(list(entries)))
+        ):
+            for url, client in (
+                ("/api/v1/transactions", None),
+                (f"/api/v1/transactions/{credit.transaction_id}", None),
+                ("/api/v1/statement-of-account", None),
+                ("/api/v1/user/messages", None),
+                ("/api/v1/admin/users", admin_client),
+            ):
+                _, replica_queries = self.get(url, client)
+                self.assertGreater(replica_queries, 0, url)
+
+    def test_users_read_their_writes_from_the_primary_for_a_while(self):
+        transfer_funds(self.user.pk, self.payee_account.account_number, Decimal("10.00"), "Rent")
+
+        response, replica_queries = self.get("/api/v1/transactions")
+        self.assertEqual(replica_queries, 0)
+        self.assertContains(response, "Rent")
+
+        # Once the stickiness window is over, reads go back to the replica.
+        later = time.time() + settings.REPLICA_STICKINESS_SECONDS + 1
+        with mock.patch("time.time", return_value=later):
+            _, replica_queries = self.get("/api/v1/transactions")
+        self.assertGreater(replica_queries, 0)
+
+    def test_writes_go_to_the_primary(self):
+        with CaptureQueriesContext(connections[REPLICA_DB_ALIAS]) as replica_queries:
+            response = self.client.post("/api/v1/user/messaging", {"message": "Hello"})
+        self.assertIn(response.status_code, (200, 201))
+        self.assertEqual(len(replica_queries), 0)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="customer@example.com", full_name="Customer", password="pass12345")
+        self.account = Account.objects.create(user=self.user, current_balance=Decimal("100.00"))
+        other = User.objects.create_user(email="payee@example.com", full_name="Payee", password="pass12345")
+        self.payee_account = Account.objects.create(user=other, current_balance=Decimal("0.00"))
+        Transaction.objects.create(
+            transaction_type="DEBIT", from_account=self.account, to_account=self.payee_account, amount=Decimal("5.00")
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_unrequested_fields_are_not_selected(self):
+        queryset = TransactionValuesSerializer.prepare(Transaction.objects.all(), fields=["amount", "timestamp"])
+
+        self.assertEqual(queryset.query.values_select, ("amount", "timestamp"))
+        self.assertNotIn("JOIN", str(queryset.query))
+
+    def test_collapsed_relations_are_not_joined(self):
+        collapsed = TransactionValuesSerializer.prepare(Transaction.objects.all(), fields=["from_account"], expand=[])
+        expanded = TransactionValuesSerializer.prepare(Transaction.objects.all(), fields=["from_account"])
+
+        self.assertEqual(collapsed.query.values_select, ("from_account_id",))
+        self.assertNotIn("JOIN", str(collapsed.query))
+        self.assertIn("JOIN", str(expanded.query))
+
+    def test_collapsed_many_relations_fetch_only_their_keys(self):
+        fields, expand = ["email", "accounts"], []
+        queryset = UserDetailValuesSerializer.prepare(User.objects.filter(pk=self.user.pk), fields, expand)
+        with self.assertNumQueries(2) as queries:
+            [user] = UserDetailValuesSerializer(queryset, many=True, fields=fields, expand=expand).data
+
+        self.assertEqual(user, {"email": "customer@example.com", "accounts": [self.account.pk]})
+        self.assertNotIn("current_balance", queries.captured_queries[1]["sql"])
+
+    def test_list_view_returns_only_the_requested_fields(self):
+        response = self.client.get("/api/v1/transactions", {"fields": "amount,from_account", "expand": ""})
+
+        self.assertEqual(response.status_code, 200)
+        [item] = json.loads(response.content)["results"]["data"]
+        self.assertEqual(item, {"from_account": self.account.pk, "amount": "5.00"})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get("/api/v1/transactions", {"fields": "amount,password"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("password", str(response.data))
+
+
+class CompressionTests(TestCase):
+    body = json.dumps([{"reference_id": f"{i:016d}", "message": "Card declined"} for i in range(100)]).encode()
+
+    def respond(self, accept_encoding, content=body, content_type="application/json"):
+        request = RequestFactory().get("/api/v1/user/messages", HTTP_ACCEPT_ENCODING=accept_encoding)
+        middleware = CompressionMiddleware(lambda request: HttpResponse(content, content_type=content_type))
+        return middleware(request)
+
+    def test_brotli_when_accepted(self):
+        for accept_encoding in ("br", "gzip, deflate, br", "br;q=0.5, gzip;q=1.0"):
+            with self.subTest(accept_encoding):
+                response = self.respond(accept_encoding)
+                self.assertEqual(response["Content-Encoding"], "br")
+                self.assertEqual(brotli.decompress(response.content), self.body)
+                self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_gzip_when_brotli_is_refused(self):
+        for accept_encoding in ("gzip, br;q=0", "br; q=0.000, gzip", "gzip"):
+            with self.subTest(accept_encoding):
+                response = self.respond(accept_encoding)
+                self.assertEqual(response["Content-Encoding"], "gzip")
+                self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_gzip_without_the_brotli_package(self):
+        with mock.patch("utils.middleware.brotli", None):
+            response = self.respond("br, gzip")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_small_and_binary_responses_are_untouched(self):
+        for content, content_type in ((b'{"ok": true}', "application/json"), (self.body, "image/png")):
+            with self.subTest(content_type):
+                response = self.respond("br, gzip", content, content_type)
+                self.assertFalse(response.has_header("Content-Encoding"))
+                self.assertEqual(response.content, content)
+
+
+@override_settings(
+    STORAGES={
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    },
+)
+class ValuesRenderingTests(TestCase):
+    """The fast list rendering mode must return byte-for-byte what the ModelSerializers return."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="customer@example.com",
+            full_name="Adé Customer",
+            password="pass12345",
+            phone_number="+2348012345678",
+            date_of_birth=date(1990, 2, 28),
+            address="Lagos \u2028 Ikeja",
+            profile_picture="profile_pictures/customer.png",
+        )
+        savings = Account.objects.create(user=self.user, current_balance=Decimal("1000.00"))
+        current = Account.objects.create(user=self.user, current_balance=Decimal("0.10"), account_type="CURRENT")
+        payee = User.objects.create_user(email="payee@example.com", full_name="Payee", password="pass12345")
+        payee_account = Account.objects.create(user=payee, current_balance=Decimal("0.00"))
+        Transaction.objects.create(
+            transaction_type="DEBIT", from_account=savings, to_account=payee_account,
+            amount=Decimal("1234.50"), description="Rent – June",
+        )
+        Transaction.objects.create(transaction_type="CREDIT", from_account=payee_account, to_account=current, amount=Decimal("0.10"))
+        # No recipient, so to_account renders as null.
+        Transaction.objects.create(transaction_type="DEBIT", from_account=current, amount=Decimal("7"))
+
+        message = CustomerMessage.objects.create(user=self.user, message="Two receipts attached")
+        message.pictures.set([
+            Picture.objects.create(
+                image="message_pictures/receipt.jpg", thumbnail="message_pictures/receipt-thumb.jpg",
+                caption="Receipt", status="UPLOADED",
+            ),
+            Picture.objects.create(status="PENDING"),
+        ])
+        CustomerMessage.objects.create(user=self.user, message="No pictures here")
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(User.objects.create_superuser(email="admin@example.com", full_name="Admin"))
+
+    def assertSameRendering(self, client, url):
+        with override_settings(FAST_LIST_RENDERING=False):
+            expected = client.get(url)
+        with override_settings(FAST_LIST_RENDERING=True), mock.patch.object(
+            ValuesSerializer, "to_representation_many", autospec=True, side_effect=ValuesSerializer.to_representation_many
+        ) as values_path:
+            response = client.get(url)
+
+        values_path.assert_called_once()
+        self.assertEqual(expected.status_code, 200)
+        self.assertTrue(json.loads(expected.content)["results"]["data"])
+        self.assertEqual(response.content, expected.content)
+
+    def test_transactions(self):
+        self.assertSameRendering(self.client, "/api/v1/transactions")
+
+    def test_messages(self):
+        self.assertSameRendering(self.client, "/api/v1/user/messages")
+
+    def test_users(self):
+        self.assertSameRendering(self.admin_client, "/api/v1/admin/users")
@@ -1,8 +1,10 @@
 import random
 import uuid
+from django.conf import settings
 from django.utils import timezone
 from django.db import models
 from utils.snowflake import Snowflake
+from utils.worker_ids import WorkerIdLease
 
 def generate_account_number():
     """Generates a 10-digit account number."""
@@ -40,12 +42,38 @@ def generate_reference_id():
     primary_key = '-'.join([unique_id[i:i+4] for i in range(0, 16, 4)])
     return primary_key.upper()
 
+# One generator per process. Processes inserting at the same time need different worker ids or
+# their ids can collide, so each leases its own; see SNOWFLAKE_WORKER_IDS in settings.
+worker_id_lease = WorkerIdLease(
+    settings.SNOWFLAKE_DATACENTER_ID, settings.SNOWFLAKE_WORKER_IDS, static_worker_id=settings.SNOWFLAKE_WORKER_ID
+)
+snowflake = Snowflake(worker_id_lease.get, settings.SNOWFLAKE_DATACENTER_ID)
+
+
+def use_batch_worker_ids():
+    """Makes this process lease its snowflake worker id from the batch range; call it at the start of batch commands."""
+    worker_id_lease.use(settings.SNOWFLAKE_BATCH_WORKER_IDS)
+
+class SnowflakeIdField(models.BigIntegerField):
+    """
+    Primary key whose default is only generated when the row is first saved or bulk created, not
+    when the instance is built: instances that are never saved, such as the ones system checks
+    build, don't make the process lease a worker id.
+    """
+
+    def get_default(self):
+        return None
+
+    def get_pk_value_on_save(self, instance):
+        return super().get_default()
+
+
 class BaseModel(models.Model):
     """Base model with id attribute for all models requiring a snowflake id"""
 
-    id = models.BigIntegerField(
+    id = SnowflakeIdField(
         primary_key=True,
-        default=Snowflake(1, 1).generate_id,
+        default=snowflake.generate_id,
         editable=False,
     )
 
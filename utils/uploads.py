@@ -0,0 +1,108 @@
+"""Upload handler that validates image uploads while they stream in, before they are fully received"""
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+from filetype import guess
+from rest_framework.exceptions import ValidationError
+
+ALLOWED_IMAGE_TYPES = ("image/jpeg", "image/png")
+
+# filetype only needs the first 261 bytes of a file to recognise it.
+HEADER_SIZE = 261
+
+
+def megabytes(size):
+    return f"{size / (1024 * 1024):g}MB"
+
+
+class ImageUploadGuardHandler(FileUploadHandler):
+    """
+    Runs ahead of Django's memory/temporary-file handlers. It sniffs each file's type from its
+    first bytes and counts bytes as they arrive, and stops reading the request as soon as a file
+    is not an allowed image or the per-file / per-request caps are exceeded. The reason is kept
+    in request.upload_rejection as (field_name, message).
+    """
+
+    def __init__(self, request, max_file_size, max_request_size, allowed_types=ALLOWED_IMAGE_TYPES):
+        super().__init__(request)
+        self.max_file_size = max_file_size
+        self.max_request_size = max_request_size
+        self.allowed_types = allowed_types
+        self.received = 0
+        self.request.upload_rejection = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length and content_length > self.max_request_size:
+            # Rejected on the Content-Length header alone, without reading any of the body.
+            self.request.upload_rejection = (
+                None,
+                f"Request body must not be larger than {megabytes(self.max_request_size)}",
+            )
+            return QueryDict(encoding=encoding), MultiValueDict()
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.header = b""
+        self.sniffed = False
+        if content_length and content_length > self.max_file_size:
+            self.reject_file_size()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if start + len(raw_data) > self.max_file_size:
+            self.reject_file_size()
+        if self.received > self.max_request_size:
+            self.reject(self.field_name, f"Uploads must not be larger than {megabytes(self.max_request_size)} in total")
+        if not self.sniffed:
+            self.header += raw_data[: HEADER_SIZE - len(self.header)]
+            if len(self.header) >= HEADER_SIZE:
+                self.sniff()
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not self.sniffed:
+            # The whole file was shorter than the header.
+            self.sniff()
+        return None
+
+    def sniff(self):
+        self.sniffed = True
+        file_type = guess(self.header)
+        if file_type is None or file_type.mime not in self.allowed_types:
+            self.reject(self.field_name, "Invalid file type. Only JPEG and PNG files are allowed")
+
+    def reject_file_size(self):
+        self.reject(self.field_name, f"Pictures must not be larger than {megabytes(self.max_file_size)}")
+
+    def reject(self, field_name, message):
+        self.request.upload_rejection = (field_name, message)
+        # connection_reset stops Django from draining the rest of the body.
+        raise StopUpload(connection_reset=True)
+
+
+class ImageUploadGuardMixin:
+    """
+    Installs ImageUploadGuardHandler on a DRF view, so oversize or non-image uploads are cut off
+    while streaming and reported as a 400 instead of being buffered and validated afterwards.
+    """
+
+    max_upload_file_size = settings.MAX_UPLOAD_FILE_SIZE
+    max_upload_request_size = settings.MAX_UPLOAD_REQUEST_SIZE
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers.insert(
+            0, ImageUploadGuardHandler(request, self.max_upload_file_size, self.max_upload_request_size)
+        )
+        return super().initialize_request(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication and permissions are checked first, so anonymous uploads are never read.
+        super().initial(request, *args, **kwargs)
+        if request.content_type.startswith("multipart/form-data"):
+            request.data
+            rejection = getattr(request, "upload_rejection", None)
+            if rejection:
+                field_name, message = rejection
+                raise ValidationError({field_name or "non_field_errors": [message]})
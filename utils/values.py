@@ -0,0 +1,318 @@
+"""values()-driven read serializers for the hot list endpoints"""
+
+from django.conf import settings
+from django.db.models import F
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from .renderers import ORJSONRenderer
+
+# DRF fields whose to_representation returns database values unchanged.
+PASSTHROUGH_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.ChoiceField,
+    serializers.ReadOnlyField,
+    serializers.SerializerMethodField,
+)
+
+
+# Query parameters understood by ValuesListMixin views, for their extend_schema parameters.
+SPARSE_FIELDSET_PARAMETERS = [
+    OpenApiParameter(name="fields", description="Comma-separated fields to return", required=False, type=str),
+    OpenApiParameter(
+        name="expand",
+        description="Comma-separated relations to return as nested objects; the others are returned as ids",
+        required=False,
+        type=str,
+    ),
+]
+
+
+class Nested:
+    """A to-one relation rendered as a nested object (None when the foreign key is null)."""
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+
+class Many:
+    """A to-many relation rendered as a list, fetched for the whole page in one extra query."""
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+
+class ValuesSerializer:
+    """
+    Read-only counterpart of a ModelSerializer that renders rows from QuerySet.values(), so no
+    model instances are built. Field order, names and formatting come from `serializer_class`,
+    and each value goes through that field's to_representation, so the output matches it.
+
+    Fields the ModelSerializer computes are mapped by the subclass: `lookups` gives the ORM lookup
+    for SerializerMethodFields and other sourced fields, `relations` maps nested serializers to
+    Nested / Many. A Nested serializer can't itself declare Many relations.
+    """
+
+    serializer_class = None
+    lookups = {}
+    relations = {}
+
+    _plans = {}
+
+    def __init__(self, instance=None, many=False, context=None, fields=None, expand=None):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        self.fields = fields
+        self.expand = expand
+
+    @classmethod
+    def get_plan(cls):
+        plan = cls._plans.get(cls)
+        if plan is None:
+            plan = cls._plans[cls] = cls.build_plan()
+        return plan
+
+    @classmethod
+    def build_plan(cls):
+        """Returns [(output name, kind, column or relation, field)] for the readable fields."""
+        model = cls.serializer_class.Meta.model
+        plan = []
+        for name, field in cls.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if name in cls.relations:
+                relation = cls.relations[name]
+                kind = "nested" if isinstance(relation, Nested) else "many"
+                plan.append((name, kind, relation, model._meta.get_field(field.source)))
+            elif name in cls.lookups:
+                plan.append((name, "value", cls.lookups[name], field))
+            elif isinstance(field, serializers.FileField):
+                plan.append((name, "file", field.source, field))
+            else:
+                plan.append((name, "value", field.source, field))
+        return plan
+
+    @classmethod
+    def field_names(cls):
+        return [name for name, _, _, _ in cls.get_plan()]
+
+    @classmethod
+    def select_plan(cls, fields=None, expand=None):
+        """
+        The plan narrowed to `fields` (all fields when None). Relations left out of `expand`
+        are collapsed to their primary keys; with expand=None every relation is expanded.
+        """
+        plan = []
+        for name, kind, target, field in cls.get_plan():
+            if fields is not None and name not in fields:
+                continue
+            if kind in ("nested", "many") and expand is not None and name not in expand:
+                kind = f"{kind}_pk"
+            plan.append((name, kind, target, field))
+        return plan
+
+    @classmethod
+    def get_columns(cls, prefix="", fields=None, expand=None):
+        columns = []
+        plan = cls.select_plan(fields, expand)
+        for name, kind, target, field in plan:
+            if kind == "nested":
+                columns.append(f"{prefix}{target_lookup(field)}")
+                columns += target.serializer_class.get_columns(f"{prefix}{field.name}__")
+            elif kind == "nested_pk":
+                columns.append(f"{prefix}{target_lookup(field)}")
+            elif kind not in ("many", "many_pk"):
+                columns.append(f"{prefix}{target}")
+        if any(kind in ("many", "many_pk") for _, kind, _, _ in plan):
+            columns.append(f"{prefix}{cls.pk_column()}")
+        # values() needs each column once.
+        return list(dict.fromkeys(columns))
+
+    @classmethod
+    def pk_column(cls):
+        return cls.serializer_class.Meta.model._meta.pk.attname
+
+    @classmethod
+    def prepare(cls, queryset, fields=None, expand=None, extra=()):
+        """
+        Narrows a queryset to the columns (and joins) this serializer renders, plus `extra`
+        columns the caller needs from each row but which aren't rendered.
+        """
+        columns = cls.get_columns(fields=fields, expand=expand) + list(extra)
+        return queryset.values(*dict.fromkeys(columns))
+
+    def get_converters(self, prefix=""):
+        request = self.context.get("request")
+        converters = []
+        for name, kind, target, field in self.select_plan(self.fields, self.expand):
+            if kind == "nested":
+                child = target.serializer_class(context=self.context)
+                converters.append(
+                    (name, kind, f"{prefix}{target_lookup(field)}", child.get_converters(f"{prefix}{field.name}__"))
+                )
+            elif kind == "nested_pk":
+                converters.append((name, "value", f"{prefix}{target_lookup(field)}", None))
+            elif kind == "many":
+                converters.append((name, kind, field, target.serializer_class))
+            elif kind == "many_pk":
+                converters.append((name, "many", field, None))
+            elif kind == "file":
+                model_field = self.serializer_class.Meta.model._meta.get_field(target)
+                converters.append((name, "value", f"{prefix}{target}", file_converter(model_field, field, request)))
+            elif isinstance(field, PASSTHROUGH_FIELDS):
+                converters.append((name, "value", f"{prefix}{target}", None))
+            else:
+                converters.append((name, "value", f"{prefix}{target}", field.to_representation))
+        return converters
+
+    def fetch_many(self, converters, rows):
+        """
+        Loads every to-many relation for the page with one query each, keyed by parent pk.
+        Collapsed relations (child_class None) only fetch the related primary keys.
+        """
+        related = {}
+        pk_column = self.pk_column()
+        parent_pks = [row[pk_column] for row in rows]
+        for name, kind, model_field, child_class in converters:
+            if kind != "many":
+                continue
+            if model_field.auto_created and not model_field.concrete:
+                # Reverse foreign key, e.g. User.accounts.
+                parent_lookup = model_field.field.name
+            else:
+                # Forward many-to-many, e.g. CustomerMessage.pictures.
+                parent_lookup = model_field.related_query_name()
+            child_model = model_field.related_model
+            child_rows = child_model.objects.filter(**{f"{parent_lookup}__in": parent_pks})
+            grouped = related[name] = {pk: [] for pk in parent_pks}
+            if child_class is None:
+                child_pk = child_model._meta.pk.attname
+                for child_row in child_rows.values(child_pk, parent_pk=F(parent_lookup)):
+                    grouped[child_row["parent_pk"]].append(child_row[child_pk])
+                continue
+            child = child_class(many=True, context=self.context)
+            child_converters = child.get_converters()
+            for child_row in child_rows.values(*child_class.get_columns(), parent_pk=F(parent_lookup)):
+                grouped[child_row["parent_pk"]].append(child.row_to_representation(child_converters, child_row, {}))
+        return related
+
+    def row_to_representation(self, converters, row, related):
+        ret = {}
+        for name, kind, column, convert in converters:
+            if kind == "many":
+                ret[name] = related[name][row[self.pk_column()]]
+            elif kind == "nested":
+                ret[name] = None if row[column] is None else self.row_to_representation(convert, row, related)
+            else:
+                value = row[column]
+                ret[name] = value if value is None or convert is None else convert(value)
+        return ret
+
+    def to_representation_many(self, rows):
+        rows = list(rows)
+        converters = self.get_converters()
+        has_many = any(kind == "many" for _, kind, _, _ in converters)
+        related = self.fetch_many(converters, rows) if rows and has_many else {}
+        return [self.row_to_representation(converters, row, related) for row in rows]
+
+    @property
+    def data(self):
+        if self.many:
+            return self.to_representation_many(self.instance)
+        return self.to_representation_many([self.instance])[0]
+
+
+def target_lookup(model_field):
+    """The column holding a foreign key's value, used to tell a null relation apart."""
+    return model_field.attname
+
+
+def file_converter(model_field, field, request):
+    """Mirrors FileField.to_representation for a stored file name."""
+    use_url = getattr(field, "use_url", api_settings.UPLOADED_FILES_USE_URL)
+
+    def convert(name):
+        file = model_field.attr_class(None, model_field, name)
+        if not file:
+            return None
+        if not use_url:
+            return file.name
+        url = file.url
+        return request.build_absolute_uri(url) if request is not None else url
+
+    return convert
+
+
+class ValuesListMixin:
+    """
+    values()-driven rendering for list views. It is used for every request when
+    FAST_LIST_RENDERING is on (JSON then goes through ORJSONRenderer), and for any request
+    that asks for a sparse fieldset:
+
+    - `?fields=a,b` returns only those fields; columns and joins for the rest are not queried.
+    - `?expand=x,y` renders only those relations as nested objects; the others are collapsed
+      to their primary keys. Without `expand` every relation is expanded, as before.
+    """
+
+    values_serializer_class = None
+
+    def fast_list_enabled(self):
+        return settings.FAST_LIST_RENDERING and self.values_serializer_class is not None
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.fast_list_enabled():
+            renderers = [ORJSONRenderer() if type(renderer) is JSONRenderer else renderer for renderer in renderers]
+        return renderers
+
+    def get_sparse_fieldset(self):
+        """Returns (fields, expand) from the query string; None means the parameter wasn't given."""
+        if self.values_serializer_class is None:
+            return None, None
+        known = self.values_serializer_class.field_names()
+        sparse = []
+        for param in ("fields", "expand"):
+            value = self.request.query_params.get(param)
+            if value is None:
+                sparse.append(None)
+                continue
+            names = [name.strip() for name in value.split(",") if name.strip()]
+            unknown = [name for name in names if name not in known]
+            if unknown:
+                raise ValidationError({param: [f"Unknown field(s): {', '.join(unknown)}"]})
+            sparse.append(names)
+        return tuple(sparse)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Validated up front so a bad ?fields= is a 400 before the view runs.
+        self.sparse_fieldset = self.get_sparse_fieldset()
+
+    def use_values_path(self):
+        return self.fast_list_enabled() or (
+            self.values_serializer_class is not None and self.sparse_fieldset != (None, None)
+        )
+
+    def get_extra_columns(self):
+        """Columns selected on the values path besides the rendered ones, e.g. a cursor's ordering field."""
+        return ()
+
+    def get_list_queryset(self):
+        queryset = self.get_queryset()
+        if self.use_values_path():
+            fields, expand = self.sparse_fieldset
+            return self.values_serializer_class.prepare(queryset, fields, expand, extra=self.get_extra_columns())
+        return queryset
+
+    def get_list_serializer(self, page):
+        if self.use_values_path():
+            fields, expand = self.sparse_fieldset
+            return self.values_serializer_class(
+                page, many=True, context=self.get_serializer_context(), fields=fields, expand=expand
+            )
+        return self.get_serializer(page, many=True)
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+from .metrics import render_metrics
+
+
+def health_check(request):
+    """Cheap response for load balancer and uptime checks on the site root."""
+    return JsonResponse({"status": 200, "message": "OK"})
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, for requests bearing METRICS_TOKEN; not found while no token is set."""
+    if not settings.METRICS_TOKEN:
+        return JsonResponse({"status": 404, "message": "Not found"}, status=404)
+    if not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"):
+        return JsonResponse({"status": 401, "message": "Invalid metrics token"}, status=401)
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,100 @@
+"""
+Snowflake worker ids leased per process through PostgreSQL advisory locks, so that no two live
+processes generate ids with the same worker id. The lock is held on a connection of the process's
+own and released by the server when that connection goes away, however the process ends. Other
+databases (e.g. SQLite) have no such locks; there, and wherever SNOWFLAKE_WORKER_ID is set, that
+static worker id is used instead.
+"""
+
+import logging
+import os
+import time
+import psycopg2
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# First key of the advisory locks, combined with the datacenter id; the second key is the worker id.
+LOCK_CLASS = 0x736E6F77
+
+
+class WorkerIdLease:
+    """
+    Leases the first free worker id of `worker_ids` the first time a process asks for one, i.e.
+    when it first saves a row, and again after a fork, as the child must not share its parent's.
+    Every `check_seconds` the lease connection is checked; if it was lost (say the database
+    restarted) another id is leased. With `static_worker_id` set, or a default database other than
+    PostgreSQL, nothing is leased and that id (0 if unset) is used.
+    """
+
+    def __init__(self, datacenter_id, worker_ids, static_worker_id=None, check_seconds=60):
+        self.datacenter_id = datacenter_id
+        self.worker_ids = worker_ids
+        self.static_worker_id = static_worker_id
+        self.check_seconds = check_seconds
+        self.connection = None
+        self.worker_id = None
+        self.checked = 0.0
+        os.register_at_fork(after_in_child=self.forget)
+
+    def forget(self):
+        """Drops the lease inherited from the parent process, which keeps it."""
+        if self.connection is not None:
+            # The child's copy of the socket is pointed at /dev/null first: closing the connection
+            # then says goodbye to nobody rather than ending the parent's session, and its lease.
+            devnull = os.open(os.devnull, os.O_RDWR)
+            try:
+                os.dup2(devnull, self.connection.fileno())
+            finally:
+                os.close(devnull)
+            self.connection.close()
+        self.connection = None
+        self.worker_id = None
+
+    def use(self, worker_ids):
+        """Leases from `worker_ids` from now on, e.g. the batch range for a management command."""
+        self.worker_ids = worker_ids
+        if self.worker_id is not None and self.worker_id not in worker_ids:
+            self.release()
+
+    def release(self):
+        if self.connection is not None:
+            self.connection.close()
+        self.connection = None
+        self.worker_id = None
+
+    def get(self):
+        """This process's worker id, leasing one first if it has none or lost it."""
+        if self.static_worker_id is not None or connections["default"].vendor != "postgresql":
+            return self.static_worker_id or 0
+        if self.worker_id is not None and time.monotonic() - self.checked < self.check_seconds:
+            return self.worker_id
+        if self.worker_id is None or not self.alive():
+            self.lease()
+        self.checked = time.monotonic()
+        return self.worker_id
+
+    def alive(self):
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            logger.warning("Lost the lease of snowflake worker id %s, leasing another", self.worker_id)
+            self.release()
+            return False
+
+    def lease(self):
+        connection = psycopg2.connect(**connections["default"].get_connection_params())
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            for worker_id in self.worker_ids:
+                cursor.execute("SELECT pg_try_advisory_lock(%s, %s)", [LOCK_CLASS + self.datacenter_id, worker_id])
+                if cursor.fetchone()[0]:
+                    self.connection, self.worker_id = connection, worker_id
+                    return worker_id
+        connection.close()
+        raise RuntimeError(
+            f"No free snowflake worker id in {self.worker_ids.start}-{self.worker_ids.stop - 1} of datacenter "
+            f"{self.datacenter_id}: more processes are running than the range has ids"
+        )